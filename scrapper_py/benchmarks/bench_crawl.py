@@ -0,0 +1,210 @@
+"""End-to-end crawl benchmark: scrape_state against a local stand-in server.
+
+Run from anywhere:  python scrapper_py/benchmarks/bench_crawl.py
+Check against the baseline:  python scrapper_py/benchmarks/bench_crawl.py --check
+Record a new baseline:  python scrapper_py/benchmarks/bench_crawl.py --save-baseline
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrapper
+from event_log import setup_event_log
+from rate_limiter import AdaptiveRateLimiter
+from standin_server import StandInServer
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_crawl.json')
+
+# Metrics compared with the baseline, and whether bigger is better
+CHECKED_METRICS = {
+    'pages_per_second': True,
+    'companies_per_second': True,
+    'p50_latency_ms': False,
+    'p99_latency_ms': False,
+    'peak_rss_mb': False,
+    'bytes_written': False,
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def record_latencies(client, latencies, counts):
+    """Wrap client.get to keep every response time and count list vs. detail requests."""
+    original_get = client.get
+    lock = threading.Lock()
+
+    def timed_get(url, *args, **kwargs):
+        response = original_get(url, *args, **kwargs)
+        kind = 'detail' if 'cmd=anzeige' in url else 'list'
+        with lock:
+            latencies.append(response.timing.total)
+            counts[kind] += 1
+        return response
+
+    client.get = timed_get
+    return original_get
+
+
+def run_crawl(base_url, states, workdir):
+    """Scrape states one after the other in workdir. Returns the number of companies saved."""
+    scrapper.BASE_URL = base_url
+    setup_event_log(console_level=None)
+    # No politeness delays: the stand-in is local and the benchmark measures the scraper itself
+    scrapper.RATE_LIMITER = AdaptiveRateLimiter(initial_rate=100000, max_rate=100000, jitter=0)
+
+    companies = 0
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for state in states:
+                companies += scrapper.scrape_state(state)
+    finally:
+        os.chdir(previous_dir)
+    return companies
+
+
+def run_benchmark(states=2, companies=200, per_page=10, latency=0.0):
+    state_names = scrapper.STATES[:states]
+    latencies = []
+    counts = {'list': 0, 'detail': 0}
+    original_get = record_latencies(scrapper.HTTP_CLIENT, latencies, counts)
+
+    try:
+        with StandInServer(companies, per_page, latency) as server, \
+                tempfile.TemporaryDirectory(prefix='bench_crawl_') as workdir:
+            start = time.perf_counter()
+            saved = run_crawl(server.base_url, state_names, workdir)
+            elapsed = time.perf_counter() - start
+
+            output_bytes = sum(
+                os.path.getsize(os.path.join(workdir, scrapper.get_state_filename(state)))
+                for state in state_names
+                if os.path.exists(os.path.join(workdir, scrapper.get_state_filename(state)))
+            )
+            disk_bytes = directory_size(workdir)
+    finally:
+        scrapper.HTTP_CLIENT.get = original_get
+
+    pages = counts['list'] + counts['detail']
+    return {
+        'config': {
+            'states': states,
+            'companies_per_state': companies,
+            'per_page': per_page,
+            'latency_ms': latency * 1000,
+            'detail_workers': scrapper.DETAIL_WORKERS,
+            'html_parser': scrapper.HTML_PARSER,
+            'output_format': scrapper.OUTPUT_FORMAT,
+        },
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'metrics': {
+            'elapsed_seconds': round(elapsed, 3),
+            'list_pages': counts['list'],
+            'detail_pages': counts['detail'],
+            'companies': saved,
+            'pages_per_second': round(pages / elapsed, 1),
+            'companies_per_second': round(saved / elapsed, 1),
+            'p50_latency_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p99_latency_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            # ru_maxrss is in KiB on Linux
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'bytes_written': output_bytes,
+            'disk_bytes': disk_bytes,
+        },
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of regressions beyond tolerance (a fraction, e.g. 0.25)."""
+    if result['config'] != baseline['config']:
+        print(f"WARNING: benchmark config differs from the baseline:\n"
+              f"  now:      {result['config']}\n  baseline: {baseline['config']}")
+
+    regressions = []
+    for metric, higher_is_better in CHECKED_METRICS.items():
+        now = result['metrics'][metric]
+        before = baseline['metrics'].get(metric)
+        if not before:
+            continue
+        if higher_is_better:
+            regressed = now < before * (1 - tolerance)
+        else:
+            regressed = now > before * (1 + tolerance)
+        if regressed:
+            regressions.append(f"{metric}: {now} vs. baseline {before}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--states', type=int, default=2, help="number of states to crawl")
+    parser.add_argument('--companies', type=int, default=200, help="companies per state")
+    parser.add_argument('--per-page', type=int, default=10, help="companies per list page")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the server waits per response")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    parser.add_argument('--save-baseline', action='store_true', help=f"write the result to {BASELINE_FILE}")
+    parser.add_argument('--check', action='store_true', help="exit with 1 if the result regressed from the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed regression (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.states, args.companies, args.per_page, args.latency)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        metrics = result['metrics']
+        print(f"States x companies:   {args.states} x {args.companies}")
+        print(f"Pages fetched:        {metrics['list_pages']} list + {metrics['detail_pages']} detail")
+        print(f"Companies saved:      {metrics['companies']}")
+        print(f"Elapsed:              {metrics['elapsed_seconds']:8.2f} s")
+        print(f"Throughput:           {metrics['pages_per_second']:8.1f} pages/s, "
+              f"{metrics['companies_per_second']:.1f} companies/s")
+        print(f"Latency p50 / p99:    {metrics['p50_latency_ms']:8.2f} / {metrics['p99_latency_ms']:.2f} ms")
+        print(f"Peak RSS:             {metrics['peak_rss_mb']:8.1f} MB")
+        print(f"Bytes written:        {metrics['bytes_written']:8d} output, {metrics['disk_bytes']} on disk")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {BASELINE_FILE}")
+
+    if args.check:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSION against baseline:\n  " + "\n  ".join(regressions))
+            return 1
+        print("No regression against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""Micro-benchmark: single-pass detail extractor vs. one selector per field.
+
+Run from anywhere:  python scrapper_py/benchmarks/bench_detail_extractor.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrapper
+from document import parse_document
+from event_log import setup_event_log
+from parser_corpus import DETAIL_PAGE
+
+
+def run(parse_fn, soups):
+    start = time.perf_counter()
+    results = [parse_fn(soup, '1', 'bayern') for soup in soups]
+    return (time.perf_counter() - start) / len(soups), results
+
+
+def main(iterations=300):
+    content = DETAIL_PAGE.encode('utf-8')
+
+    # Both extractors modify the tree (industry <br>s), so each call gets its own soup
+    selector_soups = [parse_document(content, scrapper.HTML_PARSER).soup for _ in range(iterations)]
+    index_soups = [parse_document(content, scrapper.HTML_PARSER).soup for _ in range(iterations)]
+
+    selector_time, selector_results = run(scrapper.parse_company_details_by_selectors, selector_soups)
+    index_time, index_results = run(scrapper.parse_company_details, index_soups)
+
+    for old, new in zip(selector_results, index_results):
+        old = {field: value for field, value in old.items() if field != 'scrape_date'}
+        new = {field: value for field, value in new.items() if field != 'scrape_date'}
+        assert old == new, f"Extractor output differs:\n{old}\n{new}"
+
+    print(f"Parser backend:       {scrapper.HTML_PARSER}")
+    print(f"Selectors per field:  {selector_time * 1e6:8.1f} µs/page")
+    print(f"Single-pass index:    {index_time * 1e6:8.1f} µs/page")
+    print(f"Speedup:              {selector_time / index_time:8.1f}x")
+    print(f"Unknown labels seen:  {dict(scrapper.UNKNOWN_DETAIL_LABELS)}")
+
+
+if __name__ == '__main__':
+    setup_event_log(console_level=None)
+    main()
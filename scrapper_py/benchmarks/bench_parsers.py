@@ -0,0 +1,255 @@
+"""Micro-benchmark and regression gate for the page parsing hot paths.
+
+Times get_companies_from_page, get_pagination_info, extract_company_id,
+parse_company_details and the HTML parse itself on every page of the
+corpus (parser_corpus.py), measures the peak memory allocated per page,
+and checks that every installed parser backend extracts the same data.
+
+Run from anywhere:  python scrapper_py/benchmarks/bench_parsers.py
+Check against the baseline:  python scrapper_py/benchmarks/bench_parsers.py --check
+Record a new baseline:  python scrapper_py/benchmarks/bench_parsers.py --save-baseline
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scrapper
+from document import available_backends, parse_document
+from event_log import setup_event_log
+from parser_corpus import load_corpus
+from records import Record
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_parsers.json')
+
+
+# Each benchmarked function as (name, page kind, call on a parsed document)
+def list_hrefs(document):
+    return [link.get('href', '') for link in document.select('a[href]')]
+
+
+BENCHMARKS = [
+    ('parse_document', 'list', lambda page, document, backend: parse_document(page.content, backend)),
+    ('get_companies_from_page', 'list',
+     lambda page, document, backend: scrapper.get_companies_from_page(document, 'bench')),
+    ('get_pagination_info', 'list',
+     lambda page, document, backend: scrapper.get_pagination_info(document, page.page_num, page.url)),
+    ('extract_company_id', 'list',
+     lambda page, hrefs, backend: [scrapper.extract_company_id(href) for href in hrefs]),
+    ('parse_document', 'detail', lambda page, document, backend: parse_document(page.content, backend)),
+    ('parse_company_details', 'detail',
+     lambda page, document, backend: scrapper.parse_company_details(document.soup, '1', 'bench')),
+]
+
+
+def calibrate(rounds=20):
+    """µs for a fixed pure-Python workload, used to factor out the speed of the machine."""
+    def workload():
+        counts = {}
+        for n in range(20000):
+            key = f"k{n % 97}"
+            counts[key] = counts.get(key, 0) + len(key)
+        return counts
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        workload()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1e6
+
+
+def prepare(name, page, backend):
+    """Input for one call; parse_company_details edits its tree, so every call gets a fresh one."""
+    document = parse_document(page.content, backend)
+    if name == 'extract_company_id':
+        return list_hrefs(document)
+    return document
+
+
+def measure(name, fn, page, backend, iterations):
+    """Fastest µs per call and peak KiB allocated by one call.
+
+    The minimum is the least noisy estimate on a busy machine; like timeit,
+    the garbage collector is off while timing.
+    """
+    inputs = [prepare(name, page, backend) for _ in range(iterations)]
+    timings = []
+    gc.disable()
+    try:
+        for data in inputs:
+            start = time.perf_counter()
+            fn(page, data, backend)
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    data = prepare(name, page, backend)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(page, data, backend)
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return min(timings) * 1e6, peak / 1024
+
+
+def comparable(result):
+    """Extraction output with the fields that legitimately vary between runs removed."""
+    if isinstance(result, (dict, Record)):
+        return {key: value for key, value in result.items() if key != 'scrape_date'}
+    if isinstance(result, list):
+        return [comparable(item) for item in result]
+    return result
+
+
+def check_backends(corpus):
+    """Compare every backend's extraction output with html.parser's. Returns the mismatches."""
+    backends = available_backends()
+    mismatches = []
+    for page in corpus:
+        for name, kind, fn in BENCHMARKS:
+            if kind != page.kind or name == 'parse_document':
+                continue
+            reference = comparable(fn(page, prepare(name, page, 'html.parser'), 'html.parser'))
+            for backend in backends:
+                if backend == 'html.parser':
+                    continue
+                output = comparable(fn(page, prepare(name, page, backend), backend))
+                if output != reference:
+                    mismatches.append(f"{name} on {page.name}: {backend} differs from html.parser")
+    return backends, mismatches
+
+
+def run_benchmarks(iterations=100, backend=None, compare_backends=True):
+    """Time every function on every page."""
+    backend = backend or scrapper.HTML_PARSER
+    corpus = load_corpus()
+    calibration = calibrate()
+    results = {}
+    for page in corpus:
+        for name, kind, fn in BENCHMARKS:
+            if kind != page.kind:
+                continue
+            us, kib = measure(name, fn, page, backend, iterations)
+            results[f"{name}/{page.name}"] = {'us_per_page': round(us, 1), 'peak_alloc_kib': round(kib, 1)}
+    # Calibrate on both sides of the run in case the machine got busier meanwhile
+    calibration = min(calibration, calibrate())
+    backends, mismatches = check_backends(corpus) if compare_backends else ([], [])
+    return {
+        'config': {'backend': backend, 'iterations': iterations},
+        'calibration_us': round(calibration, 1),
+        'backends_compared': backends,
+        'backend_mismatches': mismatches,
+        'results': results,
+    }
+
+
+def compare(result, baseline, time_tolerance, memory_tolerance, time_floor=0.0):
+    """Return {"function/page": message} for regressions beyond the tolerances.
+
+    The tolerances are fractions (e.g. 0.3); time_floor is an absolute
+    slowdown in µs that is always allowed.
+    """
+    if result['config']['backend'] != baseline['config']['backend']:
+        print(f"WARNING: baseline was recorded with {baseline['config']['backend']}, "
+              f"this run uses {result['config']['backend']}")
+
+    # Timings are compared relative to the calibration workload, so a slower
+    # (or busier) machine does not count as a regression. Scaling and timer
+    # noise are large next to sub-millisecond entries, hence the floor.
+    speed = result['calibration_us'] / baseline['calibration_us']
+    regressions = {}
+    for key, now in result['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            continue
+        if now['us_per_page'] > before['us_per_page'] * speed * (1 + time_tolerance) + time_floor:
+            regressions[key] = (f"{key}: {now['us_per_page']} µs/page vs. baseline {before['us_per_page']} "
+                                f"(x{speed:.2f} for machine speed)")
+        # Tiny allocations get a little slack, otherwise one extra object fails the gate
+        if now['peak_alloc_kib'] > before['peak_alloc_kib'] * (1 + memory_tolerance) + 1:
+            regressions[key] = f"{key}: {now['peak_alloc_kib']} KiB vs. baseline {before['peak_alloc_kib']}"
+    return regressions
+
+
+def quietly(fn, *args):
+    """Run fn in a scratch directory with its output discarded.
+
+    get_pagination_info saves debug copies of some pages, which must not end
+    up in the working tree.
+    """
+    with tempfile.TemporaryDirectory(prefix='bench_parsers_') as workdir:
+        previous_dir = os.getcwd()
+        os.chdir(workdir)
+        os.makedirs(scrapper.BLOCKED_PAGES_DIR)
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                return fn(*args)
+        finally:
+            os.chdir(previous_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100, help="timed calls per function and page")
+    parser.add_argument('--backend', help=f"parser backend to time (default: {scrapper.HTML_PARSER})")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    parser.add_argument('--save-baseline', action='store_true', help=f"write the result to {BASELINE_FILE}")
+    parser.add_argument('--check', action='store_true', help="exit with 1 on regressions or backend mismatches")
+    parser.add_argument('--time-tolerance', type=float, default=0.3, help="allowed slowdown (default: 0.3)")
+    parser.add_argument('--time-floor', type=float, default=100.0,
+                        help="slowdown in µs allowed on top of the tolerance (default: 100)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.1,
+                        help="allowed growth of allocations (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    setup_event_log(console_level=None)
+    result = quietly(run_benchmarks, args.iterations, args.backend)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Parser backend: {result['config']['backend']}, calibration {result['calibration_us']} µs")
+        print(f"{'function / page':50} {'µs/page':>10} {'peak KiB':>10}")
+        for key, values in result['results'].items():
+            print(f"{key:50} {values['us_per_page']:10.1f} {values['peak_alloc_kib']:10.1f}")
+        print(f"Backends compared: {', '.join(result['backends_compared'])}")
+        for mismatch in result['backend_mismatches']:
+            print(f"MISMATCH: {mismatch}")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Saved baseline to {BASELINE_FILE}")
+
+    if args.check:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.time_tolerance, args.memory_tolerance, args.time_floor)
+        if regressions:
+            # A busy moment can slow a single entry: only fail on entries that regress again
+            # in a full rerun, whose calibration reflects the machine at that time
+            rerun = quietly(run_benchmarks, args.iterations, args.backend, False)
+            confirmed = compare(rerun, baseline, args.time_tolerance, args.memory_tolerance, args.time_floor)
+            regressions = {key: message for key, message in confirmed.items() if key in regressions}
+        failures = result['backend_mismatches'] + list(regressions.values())
+        if failures:
+            print("FAILED:\n  " + "\n  ".join(failures))
+            return 1
+        print("No regression against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
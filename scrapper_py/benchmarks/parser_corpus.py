@@ -0,0 +1,111 @@
+"""Pages the parser benchmarks run on.
+
+The list pages start from the real list.html checked in at the top of the
+repository; the variants rewrite its pagination and rows to hit the edge
+cases scrape_state has special handling for. Detail pages are synthetic
+but laid out like firmenregister.de.
+"""
+import os
+import re
+
+LIST_HTML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'list.html')
+
+ROW_PATTERN = re.compile(r'<tr valign="top" bgcolor="#FFE8A9">.*?</tr>', re.S)
+PAGES_PATTERN = re.compile(r'(<tr bgcolor="#FFCC33"><td[^>]*><b>Seiten:</b>).*?(</td></tr>)', re.S)
+FR_PARAM = 'Ojo6Ojo6Ojo6Ojo6Ojo6OkJhZGVuLVf8cnR0ZW1iZXJnOjo6Ojo6Ojo%3D'
+LIST_URL = f"https://firmenregister.de/register.php?cmd=mysearch&fr={FR_PARAM}&auswahl=alle&ap={{page}}"
+
+# Detail page laid out like firmenregister.de: one label/value row per field,
+# wrapped in the page chrome that makes the per-field selectors expensive
+DETAIL_PAGE = '''<html><head><title>Firmenregister</title></head><body>
+<table width="100%"><tbody>
+<tr><td><a href="index.php">Startseite</a></td><td><a href="register.php">Suche</a></td></tr>
+<tr><td colspan="2">
+<table width="600"><tbody>
+<tr><td width="150">Firmenname:</td><td><h2>Muster &amp; Co. GmbH</h2></td></tr>
+<tr><td>Adresse:</td><td><a href="map.php?s=1">Hauptstr. 12</a></td></tr>
+<tr><td>PLZ / Ort:</td><td><a href="plz.php?p=70173">70173</a> <a href="ort.php?o=Stuttgart">Stuttgart</a></td></tr>
+<tr><td>Telefon:</td><td>0711 123456</td></tr>
+<tr><td>Fax:</td><td>0711 123457</td></tr>
+<tr><td>Mobil:</td><td>0171 1234567</td></tr>
+<tr><td>E-Mail:</td><td><a href="mailto:info@muster.de">info@muster.de</a></td></tr>
+<tr><td>Homepage:</td><td><a href="click.php?id=1">www.muster.de</a></td></tr>
+<tr><td>Kontakt:</td><td>Herr Max Muster</td></tr>
+<tr><td>Handelsregister:</td><td>HRB 12345</td></tr>
+<tr><td>Produkte / Infos:</td><td>Drehteile, Frästeile, Baugruppen</td></tr>
+<tr><td>Branchen:</td><td><h2>Metallbearbeitung<br>Maschinenbau<br>Zulieferer</h2></td></tr>
+</tbody></table>
+</td></tr>
+''' + ''.join(
+    f'<tr><td><a href="register.php?cmd=anzeige&amp;eid={n}">Weitere Firma {n}</a></td><td>{n} Ort</td></tr>\n'
+    for n in range(40)
+) + '''</tbody></table></body></html>'''
+
+# Only some fields filled in, no industries, no links around the address
+SPARSE_DETAIL_PAGE = '''<html><body><table><tbody>
+<tr><td>Firmenname:</td><td><h2>Kleinbetrieb Huber</h2></td></tr>
+<tr><td>Adresse:</td><td>Dorfstr. 1</td></tr>
+<tr><td>PLZ / Ort:</td><td>94032 Passau</td></tr>
+<tr><td>Telefon:</td><td></td></tr>
+</tbody></table></body></html>'''
+
+# What the site sends for a company ID that no longer exists
+MISSING_DETAIL_PAGE = '''<html><body><p>Eintrag nicht gefunden.</p></body></html>'''
+
+
+class CorpusPage:
+    __slots__ = ('name', 'kind', 'content', 'page_num', 'url')
+
+    def __init__(self, name, kind, content, page_num=0):
+        self.name = name
+        self.kind = kind
+        self.content = content
+        self.page_num = page_num
+        self.url = LIST_URL.format(page=page_num)
+
+
+def _pagination(pages, current):
+    return ' '.join(
+        f'<a href="register.php?cmd=mysearch&amp;fr={FR_PARAM}&amp;auswahl=alle&amp;ap={p}" target="_self">'
+        + (f'<b>[{p + 1}]</b>' if p == current else str(p + 1)) + '</a>'
+        for p in pages
+    )
+
+
+def _with_pagination(html, links):
+    return PAGES_PATTERN.sub(lambda m: f"{m.group(1)} {links} {m.group(2)}", html)
+
+
+def _with_rows(html, count, total):
+    rows = ROW_PATTERN.findall(html)
+    start = html.find(rows[0])
+    end = html.find(rows[-1]) + len(rows[-1])
+    html = html[:start] + '\n'.join(rows[:count]) + html[end:]
+    return html.replace('103176 Einträge', f'{total} Einträge')
+
+
+def load_corpus():
+    """All benchmark pages, list pages first."""
+    with open(LIST_HTML_PATH, encoding='utf-8') as f:
+        list_html = f.read()
+
+    # Page 6: the pagination stops at the current page although there are more
+    # entries, the case get_pagination_info and get_next_page work around
+    page_6 = _with_pagination(list_html, _pagination(range(6), 5))
+    # Last page of a small state: a few rows and no further pages
+    last_page = _with_pagination(_with_rows(list_html, 7, 47), _pagination(range(3), 2))
+    # Pagination row missing altogether, which is saved for inspection
+    no_pagination = PAGES_PATTERN.sub('', list_html)
+    # Search without results
+    empty = _with_pagination(_with_rows(list_html, 0, 0), '')
+
+    return [
+        CorpusPage('list_page_1', 'list', list_html.encode('utf-8'), 0),
+        CorpusPage('list_page_6', 'list', page_6.encode('utf-8'), 5),
+        CorpusPage('list_last_page', 'list', last_page.encode('utf-8'), 2),
+        CorpusPage('list_no_pagination', 'list', no_pagination.encode('utf-8'), 3),
+        CorpusPage('list_empty', 'list', empty.encode('utf-8'), 0),
+        CorpusPage('detail_full', 'detail', DETAIL_PAGE.encode('utf-8')),
+        CorpusPage('detail_sparse', 'detail', SPARSE_DETAIL_PAGE.encode('utf-8')),
+        CorpusPage('detail_missing', 'detail', MISSING_DETAIL_PAGE.encode('utf-8')),
+    ]
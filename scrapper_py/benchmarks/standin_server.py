@@ -0,0 +1,194 @@
+"""Local stand-in for firmenregister.de, serving synthetic list and detail pages.
+
+List pages are generated from the checked-in list.html: its company rows
+are repeated with new company IDs, the entry count and the "Seiten:" links
+are rewritten, and the fr= search parameter is a base64 token for the
+state, like on the real site. Detail pages use the label/value table the
+detail extractor expects.
+
+Run standalone:  python scrapper_py/benchmarks/standin_server.py --port 8765
+"""
+import argparse
+import base64
+import multiprocessing
+import os
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'list.html')
+
+ROW_PATTERN = re.compile(r'<tr valign="top" bgcolor="#FFE8A9">.*?</tr>', re.S)
+PAGES_PATTERN = re.compile(r'(<tr bgcolor="#FFCC33"><td[^>]*><b>Seiten:</b>).*?(</td></tr>)', re.S)
+
+
+def encode_fr(state):
+    """fr token for a state, the raw (still URL-encoded) bundesland value."""
+    return quote(base64.b64encode(f"::::::::{state}::::::::".encode('latin-1')).decode('ascii'), safe='')
+
+
+def decode_fr(fr):
+    try:
+        return base64.b64decode(unquote(fr)).decode('latin-1').strip(':')
+    except ValueError:
+        return None
+
+
+def query_params(path):
+    """Query parameters with their values left URL-encoded, as the scraper sends them."""
+    params = {}
+    for param in urlsplit(path).query.split('&'):
+        name, _, value = param.partition('=')
+        params[name] = value
+    return params
+
+
+class StandInSite:
+    """Synthetic register with companies_per_state companies in every state."""
+
+    def __init__(self, companies_per_state=200, per_page=10, template_path=TEMPLATE_PATH):
+        self.companies_per_state = companies_per_state
+        self.per_page = per_page
+        with open(template_path, encoding='utf-8') as f:
+            self.template = f.read()
+        rows = ROW_PATTERN.findall(self.template)
+        # All of the template's rows are replaced, however few a page repeats
+        self._rows_start = self.template.find(rows[0])
+        self._rows_end = self.template.find(rows[-1]) + len(rows[-1])
+        self.rows = rows[:per_page]
+        self._state_ids = {}
+
+    def state_number(self, state):
+        """Stable small number per state, used to keep company IDs apart."""
+        if state not in self._state_ids:
+            self._state_ids[state] = len(self._state_ids) + 1
+        return self._state_ids[state]
+
+    def company_id(self, state, index):
+        return self.state_number(state) * 1000000 + index
+
+    def list_page(self, state, page):
+        start = page * self.per_page
+        stop = min(start + self.per_page, self.companies_per_state)
+        rows = []
+        for n, index in enumerate(range(start, stop)):
+            row = self.rows[n % len(self.rows)]
+            rows.append(re.sub(r'eid=\d+', f'eid={self.company_id(state, index)}', row))
+
+        html = self.template[:self._rows_start] + '\n'.join(rows) + self.template[self._rows_end:]
+        html = html.replace('103176 Einträge', f'{self.companies_per_state} Einträge')
+
+        fr = encode_fr(state)
+        last = max(0, (self.companies_per_state - 1) // self.per_page)
+        pages = sorted(set(range(max(0, page - 5), min(last, page + 5) + 1)) | {last})
+        links = ' '.join(
+            f'<a href="register.php?cmd=mysearch&amp;fr={fr}&amp;auswahl=alle&amp;ap={p}" target="_self">'
+            + (f'<b>[{p + 1}]</b>' if p == page else str(p + 1)) + '</a>'
+            for p in pages
+        )
+        html = PAGES_PATTERN.sub(lambda m: f"{m.group(1)} {links} {m.group(2)}", html)
+        return html.encode('utf-8')
+
+    def detail_page(self, company_id):
+        return f'''<html><head><title>Firmenregister</title></head><body>
+<table width="600"><tbody>
+<tr><td width="150">Firmenname:</td><td><h2>Firma {company_id} GmbH</h2></td></tr>
+<tr><td>Adresse:</td><td><a href="map.php">Hauptstr. {company_id % 1000}</a></td></tr>
+<tr><td>PLZ / Ort:</td><td><a href="plz.php">{10000 + company_id % 89999}</a> <a href="ort.php">Stadt {company_id % 97}</a></td></tr>
+<tr><td>Telefon:</td><td>0711 {company_id}</td></tr>
+<tr><td>Fax:</td><td>0711 {company_id}9</td></tr>
+<tr><td>Mobil:</td><td></td></tr>
+<tr><td>E-Mail:</td><td><a href="mailto:info@firma{company_id}.de">info@firma{company_id}.de</a></td></tr>
+<tr><td>Homepage:</td><td><a href="click.php">www.firma{company_id}.de</a></td></tr>
+<tr><td>Kontakt:</td><td>Herr Muster {company_id}</td></tr>
+<tr><td>Produkte / Infos:</td><td>Drehteile, Frästeile</td></tr>
+<tr><td>Branchen:</td><td><h2>Metallbearbeitung<br>Maschinenbau</h2></td></tr>
+</tbody></table></body></html>'''.encode('utf-8')
+
+    def handle(self, path):
+        """Return (kind, body) for a request path."""
+        params = query_params(path)
+        if params.get('cmd') == 'anzeige':
+            return 'detail', self.detail_page(int(params.get('eid', 0)))
+        if 'fr' in params:
+            state = decode_fr(params['fr']) or params['fr']
+        else:
+            state = params.get('bundesland', '')
+        return 'list', self.list_page(state, int(params.get('ap', 0) or 0))
+
+
+def make_handler(site, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out as separate writes; without this, delayed ACKs add ~40ms each
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            _, body = site.handle(self.path)
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def serve(companies_per_state, per_page, latency, port=0, ready=None):
+    """Serve the stand-in site forever. The bound port is sent through ready (a Queue) if given."""
+    site = StandInSite(companies_per_state, per_page)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(site, latency))
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StandInServer:
+    """Runs the stand-in site in its own process so it does not compete with the crawler for the GIL."""
+
+    def __init__(self, companies_per_state=200, per_page=10, latency=0.0):
+        self.companies_per_state = companies_per_state
+        self.per_page = per_page
+        self.latency = latency
+        self.process = None
+        self.base_url = None
+
+    def start(self):
+        ready = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=serve, args=(self.companies_per_state, self.per_page, self.latency, 0, ready),
+            daemon=True
+        )
+        self.process.start()
+        self.base_url = f"http://127.0.0.1:{ready.get(timeout=30)}"
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--companies', type=int, default=200, help="companies per state")
+    parser.add_argument('--per-page', type=int, default=10, help="companies per list page, as on the real site")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+    print(f"Serving stand-in firmenregister on http://127.0.0.1:{args.port}")
+    serve(args.companies, args.per_page, args.latency, args.port)
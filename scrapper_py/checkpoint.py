@@ -0,0 +1,43 @@
+import time
+
+#############################################
+# CHECKPOINT SCHEDULING
+#############################################
+
+# Decides when buffered progress is worth committing to disk
+class CheckpointPolicy:
+    """Group checkpoint commits by time or by number of records.
+
+    Call add() for every record written and touch() whenever the crawl cursor
+    moves without writing records. due() turns True once there is something
+    to commit and either interval has been reached.
+    """
+
+    def __init__(self, interval_seconds=30.0, interval_records=50):
+        self.interval_seconds = interval_seconds
+        self.interval_records = interval_records
+        self.pending_records = 0
+        self.dirty = False
+        self.commits = 0
+        self.last_commit = time.monotonic()
+
+    def add(self, count=1):
+        self.pending_records += count
+        self.dirty = True
+
+    def touch(self):
+        self.dirty = True
+
+    def due(self):
+        if not self.dirty:
+            return False
+        if self.interval_records and self.pending_records >= self.interval_records:
+            return True
+        return time.monotonic() - self.last_commit >= self.interval_seconds
+
+    def committed(self):
+        """Reset the counters after a successful commit."""
+        self.pending_records = 0
+        self.dirty = False
+        self.commits += 1
+        self.last_commit = time.monotonic()
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+
+from event_log import log_event
+from freshness import record_digest
+from sinks import iter_records, open_sink
+
+#############################################
+# COMBINED NATIONAL OUTPUT
+#############################################
+
+# National output file merged from the state outputs, without duplicates
+class CombinedOutput:
+    """Append-only national file fed by streaming the state outputs into it.
+
+    Which company IDs the file already holds is kept in an SQLite index
+    next to it, so merging a state reads its records one at a time, appends
+    the new ones and skips the rest; neither file is ever loaded whole.
+    The index also keeps a digest and the scrape_date of the latest version
+    of each company, so a changed record that is newer than the one in the
+    file is appended as well. As in the state files, a company can then
+    appear more than once and the row with the latest scrape_date wins.
+    Every commit_every records the file is fsynced and its offset is
+    committed in the same transaction as the IDs written before it. After a
+    crash the file is truncated back to that offset, so file and index
+    always agree and merging the same state again is harmless.
+    """
+
+    def __init__(self, path, index_path, fieldnames, output_format='csv', batch_size=100, commit_every=5000):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.index_path = index_path
+        self.output_format = output_format
+        self.commit_every = commit_every
+        self._conn = sqlite3.connect(index_path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS ids (company_id TEXT PRIMARY KEY, state TEXT,'
+                           ' digest TEXT, scrape_date TEXT)')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(ids)')}
+        for column in ('digest', 'scrape_date'):
+            if column not in columns:
+                # An index from before versions were tracked; filled in by the next merge
+                self._conn.execute(f'ALTER TABLE ids ADD COLUMN {column} TEXT')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'offset'").fetchone()
+        if row is None and os.path.exists(path):
+            # A file written before there was an index (by the old read-concat-rewrite code)
+            self._index_existing_file()
+        self.sink = open_sink(output_format, path, fieldnames, row[0] if row else None, batch_size)
+        if row is None:
+            self._commit()
+
+    def _index_existing_file(self):
+        indexed = 0
+        for record in iter_records(self.output_format, self.path):
+            # The latest version of a company in the file is the one to compare with
+            self._conn.execute('INSERT INTO ids (company_id, state, digest, scrape_date) VALUES (?, ?, ?, ?)'
+                               ' ON CONFLICT (company_id) DO UPDATE SET'
+                               ' digest = excluded.digest, scrape_date = excluded.scrape_date'
+                               ' WHERE excluded.scrape_date >= ids.scrape_date',
+                               (str(record['company_id']), record.get('state'),
+                                record_digest(record, self.fieldnames), record.get('scrape_date') or ''))
+            indexed += 1
+        self._conn.commit()
+        log_event('info', 'combined_indexed', f"Indexed {indexed} records of the existing {self.path}",
+                  path=self.path, records=indexed)
+
+    def _commit(self):
+        offset = self.sink.commit()
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('offset', ?)", (offset,))
+        self._conn.commit()
+
+    def __contains__(self, company_id):
+        row = self._conn.execute('SELECT 1 FROM ids WHERE company_id = ?', (str(company_id),)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM ids').fetchone()[0]
+
+    def merge(self, records):
+        """Append new companies and newer versions of changed ones. Returns (added, skipped)."""
+        added = skipped = 0
+        for record in records:
+            company_id = str(record['company_id'])
+            digest = record_digest(record, self.fieldnames)
+            scrape_date = record.get('scrape_date') or ''
+            row = self._conn.execute('SELECT digest, scrape_date FROM ids WHERE company_id = ?',
+                                     (company_id,)).fetchone()
+            if row is None:
+                self._conn.execute('INSERT INTO ids (company_id, state, digest, scrape_date) VALUES (?, ?, ?, ?)',
+                                   (company_id, record.get('state'), digest, scrape_date))
+            else:
+                known_digest, known_date = row
+                newer = known_digest is not None and digest != known_digest and scrape_date > (known_date or '')
+                if known_digest is None or newer:
+                    # The version in the file if it predates the digests, else the one to append
+                    self._conn.execute('UPDATE ids SET digest = ?, scrape_date = ? WHERE company_id = ?',
+                                       (digest, scrape_date, company_id))
+                if not newer:
+                    skipped += 1
+                    continue
+            self.sink.write(record)
+            added += 1
+            if added % self.commit_every == 0:
+                self._commit()
+        self._commit()
+        return added, skipped
+
+    def merge_files(self, output_format, paths):
+        """Stream the records of output files written in output_format into the file."""
+        added = skipped = 0
+        for path in paths:
+            if os.path.exists(path):
+                file_added, file_skipped = self.merge(iter_records(output_format, path))
+                added += file_added
+                skipped += file_skipped
+        return added, skipped
+
+    def close(self):
+        self._commit()
+        self.sink.close()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+#############################################
+# CONCURRENT DETAIL PAGE FETCHING
+#############################################
+
+# Bounded thread pool that fetches company details concurrently
+class DetailFetcher:
+    """Fetch company detail pages with a concurrency limit.
+
+    fetch_fn is called with a company ID on a worker thread. A company ID that
+    is submitted again while its request is still in flight shares the
+    existing future instead of triggering a second request.
+    """
+
+    def __init__(self, fetch_fn, max_workers=4):
+        self.fetch_fn = fetch_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detail')
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def _forget(self, company_id, future):
+        with self._lock:
+            if self._in_flight.get(company_id) is future:
+                del self._in_flight[company_id]
+
+    def submit(self, company_id):
+        """Schedule a company for fetching, reusing an in-flight request if any."""
+        with self._lock:
+            future = self._in_flight.get(company_id)
+            if future is not None:
+                return future
+            future = self._executor.submit(self.fetch_fn, company_id)
+            self._in_flight[company_id] = future
+
+        # Registered outside the lock since it runs immediately if already done
+        future.add_done_callback(lambda f: self._forget(company_id, f))
+        return future
+
+    def in_flight(self):
+        """Number of company IDs currently queued or being fetched."""
+        with self._lock:
+            return len(self._in_flight)
+
+    def fetch_many(self, company_ids):
+        """Fetch several companies, yielding (company_id, result) as each finishes."""
+        futures = {}
+        for company_id in company_ids:
+            if company_id in futures:
+                continue
+            futures[company_id] = self.submit(company_id)
+
+        ids_by_future = {future: company_id for company_id, future in futures.items()}
+        for future in as_completed(ids_by_future):
+            yield ids_by_future[future], future.result()
+
+    def shutdown(self, wait=False):
+        """Stop the pool, dropping anything that has not started yet."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,82 @@
+from event_log import log_event
+
+#############################################
+# PARSE-ONCE HTML DOCUMENTS
+#############################################
+
+# bs4 takes longer to import than everything else before the first request,
+# so it is imported when the first response is parsed
+BeautifulSoup = FeatureNotFound = None
+
+# Parser backends BeautifulSoup can build the tree with. lxml is a C parser
+# and several times faster than the pure-Python html.parser; all of them
+# feed the same soupsieve CSS selectors, so extraction code stays the same.
+PARSER_BACKENDS = ('html.parser', 'lxml', 'html5lib')
+
+_unavailable_backends = set()
+
+
+def _import_bs4():
+    global BeautifulSoup, FeatureNotFound
+    if BeautifulSoup is None:
+        from bs4 import BeautifulSoup, FeatureNotFound
+
+
+# Parsed response shared by every extractor
+class Document:
+    """A response body together with its parsed tree.
+
+    The raw bytes are kept for the code paths that save pages for debugging.
+    """
+
+    __slots__ = ('content', 'soup', 'parser')
+
+    def __init__(self, content, soup, parser):
+        self.content = content
+        self.soup = soup
+        self.parser = parser
+
+    def select(self, selector):
+        return self.soup.select(selector)
+
+    def select_one(self, selector):
+        return self.soup.select_one(selector)
+
+
+# Check which parser backends are installed
+def available_backends():
+    """Parser backends that can be used in this environment."""
+    _import_bs4()
+    available = []
+    for backend in PARSER_BACKENDS:
+        try:
+            BeautifulSoup('', backend)
+            available.append(backend)
+        except FeatureNotFound:
+            pass
+    return available
+
+
+# Parse a response body once
+def parse_document(content, parser='html.parser'):
+    """Parse HTML into a Document, falling back to html.parser if the backend is missing."""
+    _import_bs4()
+    if parser in _unavailable_backends:
+        parser = 'html.parser'
+    try:
+        soup = BeautifulSoup(content, parser)
+    except FeatureNotFound:
+        log_event('warning', 'parser_unavailable',
+                  f"HTML parser '{parser}' is not installed, falling back to html.parser", parser=parser)
+        _unavailable_backends.add(parser)
+        parser = 'html.parser'
+        soup = BeautifulSoup(content, parser)
+    return Document(content, soup, parser)
+
+
+# Accept either raw HTML or an already parsed document
+def as_document(content_or_document, parser='html.parser'):
+    """Return a Document, parsing raw HTML only if it has not been parsed yet."""
+    if isinstance(content_or_document, Document):
+        return content_or_document
+    return parse_document(content_or_document, parser)
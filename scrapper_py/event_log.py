@@ -0,0 +1,182 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+#############################################
+# STRUCTURED EVENT LOG
+#############################################
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
+logger = logging.getLogger('scraper')
+
+# Queue listener of this process, as (pid, listener)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+# Log one event
+def log_event(level, event, message, exc_info=False, **fields):
+    """Log message as event ('page_fetched', 'company_skipped', ...) with filterable fields.
+
+    Fields such as state, page, company_id or url become top-level keys of
+    the JSON line. exc_info=True adds the traceback of the exception being
+    handled. Disabled levels return before a record is even created.
+    """
+    levelno = LEVELS[level]
+    if logger.isEnabledFor(levelno):
+        logger.log(levelno, message, exc_info=exc_info, extra={'event': event, 'fields': fields})
+
+
+# One JSON object per line
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': getattr(record, 'event', None),
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# Plain messages for the terminal, with the level in front of anything unusual
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        message = record.getMessage()
+        suppressed = getattr(record, 'fields', {}).get('suppressed')
+        if suppressed:
+            message += f" (+{suppressed} similar)"
+        if record.levelno != logging.INFO:
+            message = f"{record.levelname}: {message}"
+        if record.exc_text:
+            message += '\n' + record.exc_text
+        return message
+
+
+# Queue records with the traceback kept out of the message
+class EventQueueHandler(QueueHandler):
+    """QueueHandler that formats the traceback into exc_text instead of the message.
+
+    The stock prepare() appends it to msg, which would put it inside the
+    JSON 'msg' key; the formatters write exc_text out on its own.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+# Rate sampling for chatty events
+class RateSampler(logging.Filter):
+    """Let at most limits[event] records of an event through per second.
+
+    Events without a limit always pass. The first record let through in a
+    new second carries the number dropped in the seconds before as its
+    'suppressed' field, so the totals can still be reconstructed.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits)
+        self._windows = {}  # event -> [second, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        limit = self.limits.get(event)
+        if limit is None:
+            return True
+        second = int(time.monotonic())
+        with self._lock:
+            window = self._windows.setdefault(event, [second, 0, 0])
+            if window[0] != second:
+                window[0], window[1] = second, 0
+            if window[1] >= limit:
+                window[2] += 1
+                return False
+            window[1] += 1
+            suppressed, window[2] = window[2], 0
+        if suppressed:
+            record.fields = dict(record.fields, suppressed=suppressed)
+        return True
+
+
+# Route the event log through a background writer
+def setup_event_log(path=None, level='info', console_level='info', sample_limits=None):
+    """Send events through a queue to a thread that writes them out.
+
+    Events at level and above go to path as JSON lines (if given), and those
+    at console_level and above to stdout as plain text (None for no console
+    output). The logging call itself only puts the record on the queue.
+    Call again in a forked worker: the parent's writer thread does not
+    survive the fork.
+    """
+    global _listener
+    handlers = []
+    if path:
+        file_handler = logging.FileHandler(path, encoding='utf-8')
+        file_handler.setLevel(LEVELS[level])
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    if console_level:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(LEVELS[console_level])
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    with _listener_lock:
+        if _listener is not None and _listener[0] == os.getpid():
+            _listener[1].stop()
+        records = queue.SimpleQueue()
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        _listener = (os.getpid(), listener)
+
+    logger.handlers = [EventQueueHandler(records)]
+    logger.filters = [RateSampler(sample_limits)] if sample_limits else []
+    # Nothing below the lowest handler level needs to be formatted at all
+    levels = [LEVELS[level]] if path else []
+    if console_level:
+        levels.append(LEVELS[console_level])
+    logger.setLevel(min(levels) if levels else logging.CRITICAL + 1)
+    logger.propagate = False
+
+
+# Wait until everything logged so far is written
+def flush_event_log():
+    """Drain the queue and flush the handlers. Needed before a pool worker exits."""
+    with _listener_lock:
+        if _listener is None or _listener[0] != os.getpid():
+            return
+        listener = _listener[1]
+        # stop() writes out what is queued and joins the thread; start a fresh one after
+        listener.stop()
+        for handler in listener.handlers:
+            handler.flush()
+        listener.start()
+
+
+atexit.register(flush_event_log)
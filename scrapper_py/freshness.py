@@ -0,0 +1,153 @@
+import hashlib
+import heapq
+import json
+import math
+import sqlite3
+import time
+from datetime import date
+
+#############################################
+# FRESHNESS-DRIVEN RE-CRAWL SCHEDULING
+#############################################
+
+DAY = 24 * 3600
+
+
+# Fingerprint of a company record, ignoring when it was scraped
+def record_digest(company_data, fields):
+    """Hash of every field except scrape_date, used to tell whether a record changed."""
+    values = [str(company_data.get(field) or '') for field in fields if field != 'scrape_date']
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+# Per-company change history and the daily request budget
+class FreshnessStore:
+    """Tracks when each company was last checked and how often it changed.
+
+    Changes are modelled as a Poisson process. The change rate of a company
+    is estimated from its history, (changes + prior_changes) / (observed
+    days + prior_days), so a company that was never seen changing starts at
+    the prior of prior_changes per prior_days. The chance that a record is
+    stale after age days is 1 - exp(-rate * age), and the scheduler revisits
+    the companies where it is highest.
+    """
+
+    def __init__(self, path, prior_changes=1.0, prior_days=365.0):
+        self.path = path
+        self.prior_changes = prior_changes
+        self.prior_days = prior_days
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS freshness ('
+            ' company_id TEXT PRIMARY KEY,'
+            ' state TEXT,'
+            ' first_seen REAL NOT NULL,'
+            ' last_checked REAL NOT NULL,'
+            ' checks INTEGER NOT NULL DEFAULT 1,'
+            ' changes INTEGER NOT NULL DEFAULT 0,'
+            ' digest TEXT'
+            ')'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS request_budget ('
+            ' day TEXT PRIMARY KEY,'
+            ' used INTEGER NOT NULL'
+            ')'
+        )
+        self._conn.commit()
+
+    def __contains__(self, company_id):
+        row = self._conn.execute('SELECT 1 FROM freshness WHERE company_id = ?', (company_id,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM freshness').fetchone()[0]
+
+    def backfill(self, observations):
+        """Record first observations for companies not tracked yet.
+
+        observations yields (company_id, state, checked_at, digest) tuples.
+        Returns the number of companies added.
+        """
+        before = self._conn.total_changes
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO freshness (company_id, state, first_seen, last_checked, digest)'
+            ' VALUES (?, ?, ?, ?, ?)',
+            ((company_id, state, checked_at, checked_at, digest)
+             for company_id, state, checked_at, digest in observations)
+        )
+        self._conn.commit()
+        return self._conn.total_changes - before
+
+    def observe(self, company_id, state, digest, checked_at=None):
+        """Record a fresh check of a company. Returns True if its record changed (or is new)."""
+        checked_at = checked_at or time.time()
+        row = self._conn.execute(
+            'SELECT digest FROM freshness WHERE company_id = ?', (company_id,)
+        ).fetchone()
+        if row is None:
+            self._conn.execute(
+                'INSERT INTO freshness (company_id, state, first_seen, last_checked, digest)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (company_id, state, checked_at, checked_at, digest)
+            )
+            return True
+
+        changed = row[0] != digest
+        self._conn.execute(
+            'UPDATE freshness SET state = COALESCE(?, state), last_checked = ?, checks = checks + 1,'
+            ' changes = changes + ?, digest = ? WHERE company_id = ?',
+            (state, checked_at, int(changed), digest, company_id)
+        )
+        return changed
+
+    def change_rate(self, first_seen, last_checked, changes):
+        """Estimated changes per day."""
+        observed_days = max(0.0, last_checked - first_seen) / DAY
+        return (changes + self.prior_changes) / (observed_days + self.prior_days)
+
+    def most_stale(self, limit, min_age_days=0.0, now=None):
+        """The limit companies most likely to have changed since their last check.
+
+        Returns (company_id, state, probability_stale) tuples, most stale first.
+        Companies checked less than min_age_days ago are left alone. This
+        scores every row, so callers rank once and work through the list.
+        """
+        if limit <= 0:
+            return []
+        now = now or time.time()
+        rows = self._conn.execute(
+            'SELECT company_id, state, first_seen, last_checked, changes FROM freshness'
+            ' WHERE last_checked <= ?',
+            (now - min_age_days * DAY,)
+        )
+        # rate * age orders companies the same way as the staleness probability
+        scored = ((self.change_rate(first_seen, last_checked, changes) * (now - last_checked) / DAY,
+                   company_id, state)
+                  for company_id, state, first_seen, last_checked, changes in rows)
+        return [(company_id, state, 1.0 - math.exp(-expected_changes))
+                for expected_changes, company_id, state in heapq.nlargest(limit, scored)]
+
+    def requests_used(self, day=None):
+        """Requests already spent from the budget of a day (today by default)."""
+        row = self._conn.execute(
+            'SELECT used FROM request_budget WHERE day = ?', ((day or date.today()).isoformat(),)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add_requests(self, count, day=None):
+        """Charge requests to a day's budget."""
+        if count:
+            self._conn.execute(
+                'INSERT INTO request_budget (day, used) VALUES (?, ?)'
+                ' ON CONFLICT (day) DO UPDATE SET used = used + excluded.used',
+                ((day or date.today()).isoformat(), count)
+            )
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self.commit()
+        self._conn.close()
@@ -0,0 +1,179 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+#############################################
+# SHARED POOLED HTTP CLIENT
+#############################################
+
+# Connection timings are collected per thread, since each request runs
+# entirely on the thread that issued it
+_local = threading.local()
+
+
+def _timing_slot():
+    slot = getattr(_local, 'timing', None)
+    if slot is None:
+        slot = _local.timing = {'tcp': 0.0, 'connect': 0.0, 'new_connections': 0}
+    return slot
+
+
+# Connection mixin that records how long TCP connect and the full connect
+# (TCP plus TLS for HTTPS) take whenever urllib3 opens a new socket
+class _TimedConnectionMixin:
+    def _new_conn(self):
+        start = time.perf_counter()
+        sock = super()._new_conn()
+        _timing_slot()['tcp'] += time.perf_counter() - start
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        slot = _timing_slot()
+        slot['connect'] += time.perf_counter() - start
+        slot['new_connections'] += 1
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+TIMED_POOL_CLASSES = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+# Transport adapter whose pools use the timed connection classes
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS managers bring their own pool classes
+        if not proxy.lower().startswith('socks'):
+            manager.pool_classes_by_scheme = TIMED_POOL_CLASSES
+        return manager
+
+
+# Timing breakdown for a single request
+class RequestTiming:
+    """Seconds spent in each phase of one request."""
+
+    __slots__ = ('connect', 'tls', 'ttfb', 'body', 'total', 'reused')
+
+    def __init__(self, connect=0.0, tls=0.0, ttfb=0.0, body=0.0, total=0.0, reused=True):
+        self.connect = connect
+        self.tls = tls
+        self.ttfb = ttfb
+        self.body = body
+        self.total = total
+        self.reused = reused
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"RequestTiming(connect={self.connect * 1000:.1f}ms, tls={self.tls * 1000:.1f}ms, "
+                f"ttfb={self.ttfb * 1000:.1f}ms, body={self.body * 1000:.1f}ms, reused={self.reused})")
+
+
+# One HTTP client shared by list pages, detail pages and any other fetches
+class HttpClient:
+    """requests.Session with a tunable keep-alive pool and per-request timings.
+
+    Every response gets a ``timing`` attribute (RequestTiming), and the client
+    keeps running totals, including how many TCP/TLS handshakes were saved by
+    reusing pooled connections.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=8, pool_block=True, timeout=15):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'connections_opened': 0,
+            'tls_handshakes': 0,
+            'handshakes_saved': 0,
+            'connect_seconds': 0.0,
+            'tls_seconds': 0.0,
+            'ttfb_seconds': 0.0,
+            'body_seconds': 0.0,
+        }
+
+    def get(self, url, headers=None, timeout=None, **kwargs):
+        """GET a URL over the shared pool and attach its timing breakdown."""
+        slot = _timing_slot()
+        slot['tcp'] = slot['connect'] = 0.0
+        slot['new_connections'] = 0
+
+        start = time.perf_counter()
+        # Stream so the time to the first byte and the body download can be told apart
+        response = self.session.get(url, headers=headers, timeout=timeout or self.timeout,
+                                    stream=True, **kwargs)
+        headers_done = time.perf_counter()
+        try:
+            response.content  # Read the whole body so the connection returns to the pool
+        finally:
+            response.close()
+        end = time.perf_counter()
+
+        new_connections = slot['new_connections']
+        is_https = url.startswith('https://')
+        connect = slot['tcp']
+        tls = max(0.0, slot['connect'] - slot['tcp']) if is_https else 0.0
+        timing = RequestTiming(
+            connect=connect,
+            tls=tls,
+            ttfb=max(0.0, headers_done - start - slot['connect']),
+            body=end - headers_done,
+            total=end - start,
+            reused=new_connections == 0
+        )
+        response.timing = timing
+
+        with self._lock:
+            stats = self._stats
+            stats['requests'] += 1
+            stats['connections_opened'] += new_connections
+            if is_https:
+                stats['tls_handshakes'] += new_connections
+            if timing.reused:
+                stats['handshakes_saved'] += 1
+            stats['connect_seconds'] += timing.connect
+            stats['tls_seconds'] += timing.tls
+            stats['ttfb_seconds'] += timing.ttfb
+            stats['body_seconds'] += timing.body
+
+        return response
+
+    def stats(self):
+        """Snapshot of the running counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,306 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from event_log import log_event
+
+#############################################
+# METRICS
+#############################################
+
+# Latency buckets in seconds, from cache-speed parses to slow page loads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + list(extra or [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    """Sample value in the text format, at full precision."""
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+# Base class with the bookkeeping shared by all metric types
+class Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _samples(self):
+        """(suffix, label key, extra labels, value) tuples for the text format."""
+        with self._lock:
+            return [('', key, None, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+    def snapshot(self):
+        with self._lock:
+            return {','.join(key) or '': value for key, value in self._values.items()}
+
+
+# Value that only goes up
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+
+# Value that can go up and down
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+
+# Distribution of observed values in fixed buckets
+class Histogram(Metric):
+    """Bucketed distribution, one bisect and a lock per observation.
+
+    Each label set keeps per-bucket counts (the last one for values above
+    every bound), the sum and the count, like a Prometheus histogram.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        # The +Inf bucket is always there, as the count
+        self.buckets = tuple(sorted(bound for bound in buckets if bound != math.inf))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager that observes how long its block took."""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, [('le', _format_value(bound))], cumulative))
+            samples.append(('_bucket', key, [('le', '+Inf')], count))
+            samples.append(('_sum', key, None, total))
+            samples.append(('_count', key, None, count))
+        return samples
+
+    def snapshot(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        return {
+            ','.join(key) or '': {
+                'count': count,
+                'sum': round(total, 6),
+                'p50': self._quantile(counts, count, 0.50),
+                'p99': self._quantile(counts, count, 0.99),
+            }
+            for key, counts, total, count in items
+        }
+
+    def _quantile(self, counts, count, fraction):
+        """Upper bound of the bucket holding the quantile (None if it is above every bucket)."""
+        if not count:
+            return None
+        rank = fraction * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+# Time left for a crawl, from the pace since the first update
+class EtaTracker:
+    """Estimate the seconds left to reach total from how fast done has grown so far.
+
+    The pace is measured from the first update on, so entries done by an
+    earlier run do not make a resumed crawl look faster than it is.
+    """
+
+    def __init__(self):
+        self._start = None
+
+    def update(self, done, total):
+        """Return the estimated seconds left, or None until there is a pace to go by."""
+        now = time.monotonic()
+        if self._start is None:
+            self._start = (now, done)
+            return None
+        started_at, done_at_start = self._start
+        progressed = done - done_at_start
+        if progressed <= 0 or not total:
+            return None
+        return max(0, total - done) * (now - started_at) / progressed
+
+
+# All metrics of a process
+class MetricsRegistry:
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, documentation, labelnames, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, documentation, labelnames, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+    def snapshot(self):
+        """All metrics as a JSON-friendly dict."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            'timestamp': time.time(),
+            'pid': os.getpid(),
+            'metrics': {metric.name: metric.snapshot() for metric in metrics},
+        }
+
+
+# Serve /metrics for Prometheus to scrape
+def start_metrics_server(registry, port, host='127.0.0.1'):
+    """Serve the registry on http://host:port/metrics from a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+# Periodically dump the registry to a JSON file
+class SnapshotWriter(threading.Thread):
+    """Write registry.snapshot() to path every interval seconds (atomically) until stopped."""
+
+    def __init__(self, registry, path, interval=30.0):
+        super().__init__(name='metrics-snapshot', daemon=True)
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def write(self):
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.registry.snapshot(), f, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            log_event('error', 'metrics_snapshot_error', f"Error writing metrics snapshot: {str(e)}", path=self.path)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        """Stop the thread and write one last snapshot."""
+        self._stopped.set()
+        self.write()
@@ -0,0 +1,68 @@
+import queue
+import threading
+
+#############################################
+# PIPELINE STAGES
+#############################################
+
+_END = object()
+
+
+# Runs a producer ahead of its consumer on a background thread
+class Prefetcher:
+    """Iterate over items that a background thread produces ahead of time.
+
+    items is consumed on the thread, which starts on the next item as soon
+    as there is a free slot: at most depth items are produced (or being
+    produced) that the consumer has not taken yet. That bound is the
+    backpressure, so memory stays flat however slow the consumer is. An
+    exception raised by the producer is raised again in the consumer at
+    the point it happened. close() stops the producer before its next item.
+    """
+
+    def __init__(self, items, depth=1, name='prefetch'):
+        self._items = iter(items)
+        self._queue = queue.SimpleQueue()
+        self._slots = threading.Semaphore(depth)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _wait_for_slot(self):
+        """Block until an item may be produced. Returns False once closed."""
+        while not self._stopped.is_set():
+            # Time out now and then to notice close()
+            if self._slots.acquire(timeout=0.1):
+                return not self._stopped.is_set()
+        return False
+
+    def _run(self):
+        while self._wait_for_slot():
+            try:
+                item = next(self._items)
+            except StopIteration:
+                self._queue.put((_END, None))
+                return
+            except BaseException as e:
+                self._queue.put((_END, e))
+                return
+            self._queue.put((item, None))
+
+    def __iter__(self):
+        while True:
+            item, error = self._queue.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            # Taking an item frees its slot, so the producer starts on the next one
+            self._slots.release()
+            yield item
+
+    def waiting(self):
+        """Number of items produced but not taken yet."""
+        return self._queue.qsize()
+
+    def close(self):
+        """Stop the producer; an item it is working on is finished and dropped."""
+        self._stopped.set()
@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from event_log import log_event
+
+#############################################
+# PROCESSED COMPANY STORE
+#############################################
+
+# Set-like store of processed company IDs backed by an SQLite table
+class ProcessedStore:
+    """Persistent set of processed company IDs with their processing time.
+
+    add() only records the ID in memory; commit() inserts the pending IDs in
+    one transaction, so a checkpoint costs O(new IDs) instead of rewriting
+    everything seen so far. Membership checks hit the pending IDs first and
+    then the table's primary key index, so nothing has to be loaded at startup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS processed ('
+            ' company_id TEXT PRIMARY KEY,'
+            ' processed_at TEXT NOT NULL'
+            ')'
+        )
+        self._conn.commit()
+        self._pending = {}
+
+    def __contains__(self, company_id):
+        if company_id in self._pending:
+            return True
+        row = self._conn.execute(
+            'SELECT 1 FROM processed WHERE company_id = ?', (company_id,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        committed = self._conn.execute('SELECT COUNT(*) FROM processed').fetchone()[0]
+        return committed + len(self._pending)
+
+    def is_empty(self):
+        """True if no ID was ever added. Unlike len(), this does not scan the table."""
+        if self._pending:
+            return False
+        return self._conn.execute('SELECT 1 FROM processed LIMIT 1').fetchone() is None
+
+    def add(self, company_id, processed_at=None):
+        """Mark a company as processed, keeping the time it was processed."""
+        if company_id not in self._pending:
+            self._pending[company_id] = processed_at or datetime.now().isoformat()
+
+    def update(self, company_ids):
+        for company_id in company_ids:
+            self.add(company_id)
+
+    def processed_at(self, company_id):
+        """When the company was processed, or None if it has not been."""
+        if company_id in self._pending:
+            return self._pending[company_id]
+        row = self._conn.execute(
+            'SELECT processed_at FROM processed WHERE company_id = ?', (company_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def commit(self):
+        """Write pending IDs to disk. Returns how many were written."""
+        pending = self._pending
+        if pending:
+            # The first recorded time wins if another run already stored the ID
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO processed (company_id, processed_at) VALUES (?, ?)',
+                pending.items()
+            )
+        self._conn.commit()
+        self._pending = {}
+        return len(pending)
+
+    def import_legacy(self, ids_file=None, progress_data=None):
+        """Copy IDs from the old processed_companies.json / progress formats.
+
+        Returns the number of IDs imported.
+        """
+        imported = {}
+
+        if ids_file and os.path.exists(ids_file):
+            try:
+                with open(ids_file, 'r') as f:
+                    data = json.load(f)
+                saved_at = data.get('timestamp') or datetime.now().isoformat()
+                for company_id in data.get('ids', []):
+                    imported[company_id] = saved_at
+            except Exception as e:
+                log_event('error', 'legacy_cache_error', f"Error reading legacy company cache {ids_file}: {str(e)}",
+                          path=ids_file)
+
+        if progress_data:
+            legacy = progress_data.get('processed_companies')
+            if isinstance(legacy, dict):
+                # This format stored a timestamp per company
+                imported.update(legacy)
+            elif isinstance(legacy, list):
+                saved_at = progress_data.get('timestamp') or datetime.now().isoformat()
+                for company_id in legacy:
+                    imported.setdefault(company_id, saved_at)
+
+        for company_id, processed_at in imported.items():
+            self.add(str(company_id), processed_at)
+        self.commit()
+        return len(imported)
+
+    def close(self):
+        self.commit()
+        self._conn.close()
@@ -0,0 +1,230 @@
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+#############################################
+# PROFILING
+#############################################
+
+# Crawl stage of the innermost matching function on a stack
+STAGE_FUNCTIONS = {
+    'AdaptiveRateLimiter.wait': 'politeness',
+    'SharedRequestBudget.wait': 'politeness',
+    'fetch_page': 'fetch',
+    'parse_document': 'parse',
+    'get_companies_from_page': 'extract',
+    'get_pagination_info': 'extract',
+    'extract_fr_param': 'extract',
+    'parse_company_details': 'extract',
+    'write_company': 'serialise',
+    'archive_page': 'serialise',
+    'commit_checkpoint': 'checkpoint',
+    'commit_output': 'checkpoint',
+    'save_processed_companies': 'checkpoint',
+    'save_and_exit': 'checkpoint',
+    'QueueListener.handle': 'logging',
+    # The profiler's own memory snapshots, kept apart from the checkpoint they run in
+    'CrawlProfiler.checkpoint': 'profiler',
+}
+
+# Stacks ending in these files or functions without a stage are threads waiting for work
+IDLE_FILES = ('threading.py', 'queue.py', 'thread.py', 'selectors.py', '_base.py')
+IDLE_FUNCTIONS = {'QueueListener.dequeue'}
+
+
+def _qualname(code):
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{_qualname(code)}"
+
+
+def _thread_group(name):
+    """Pool threads share a label, so 'ThreadPoolExecutor-0_3' counts as 'ThreadPoolExecutor-0'."""
+    return re.sub(r'_\d+$', '', name)
+
+
+# Background thread that samples the stacks of all other threads
+class StackSampler(threading.Thread):
+    """Record every thread's stack each interval seconds.
+
+    Each sample is counted once for its full stack (for the collapsed-stack
+    file) and once for its crawl stage. Counts times interval are
+    thread-seconds of wall time, so blocking on the network or on a lock
+    shows up too, not only CPU.
+    """
+
+    def __init__(self, interval=0.01):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()  # (thread group, codes root first) -> samples
+        self.stages = Counter()  # stage -> samples
+        self.samples = 0
+        self._stage_of_code = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _stage(self, codes):
+        for code in codes:
+            stage = self._stage_of_code.get(code)
+            if stage is None:
+                stage = self._stage_of_code[code] = STAGE_FUNCTIONS.get(_qualname(code), '')
+            if stage:
+                return stage
+        if codes and (codes[0].co_filename.endswith(IDLE_FILES) or _qualname(codes[0]) in IDLE_FUNCTIONS):
+            return 'idle'
+        return 'other'
+
+    def sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                self.stages[self._stage(codes)] += 1
+                group = _thread_group(names.get(ident, 'thread'))
+                self.stacks[(group, tuple(reversed(codes)))] += 1
+            self.samples += 1
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stopped.set()
+        if self.is_alive():
+            self.join()
+
+    def collapsed(self):
+        """Lines in the collapsed-stack format read by flamegraph.pl and speedscope."""
+        merged = Counter()
+        with self._lock:
+            for (group, codes), count in self.stacks.items():
+                merged[';'.join([group] + [_frame_label(code) for code in codes])] += count
+        return [f"{stack} {count}" for stack, count in sorted(merged.items())]
+
+    def stage_breakdown(self):
+        """{stage: {'samples', 'thread_seconds', 'share'}}, the share excluding idle threads."""
+        with self._lock:
+            stages = dict(self.stages)
+        busy = sum(count for stage, count in stages.items() if stage != 'idle') or 1
+        return {
+            stage: {
+                'samples': count,
+                'thread_seconds': round(count * self.interval, 2),
+                'share': None if stage == 'idle' else round(count / busy, 4),
+            }
+            for stage, count in sorted(stages.items(), key=lambda item: -item[1])
+        }
+
+
+# Profiler for a whole crawl run
+class CrawlProfiler:
+    """Stack sampling, optional cProfile, and tracemalloc snapshots for a crawl.
+
+    mode 'sample' only samples stacks; 'cprofile' also runs the deterministic
+    profiler on the thread that started it (the crawl loop). Memory is
+    snapshotted when checkpoint() is called, at most every memory_interval
+    seconds. write() can be called any number of times and rewrites the
+    files in output_dir with everything gathered so far.
+    """
+
+    def __init__(self, output_dir, mode='sample', interval=0.01, memory_interval=60.0, top=20):
+        if mode not in ('sample', 'cprofile'):
+            raise ValueError(f"Unknown profile mode {mode!r}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.memory_interval = memory_interval
+        self.top = top
+        self.sampler = StackSampler(interval)
+        self._cprofile = cProfile.Profile() if mode == 'cprofile' else None
+        self._first_snapshot = None
+        self._last_snapshot_at = None
+        self._started_at = None
+        self._stopped = False
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        # memory.txt is appended to during the run; start it fresh
+        open(os.path.join(self.output_dir, 'memory.txt'), 'w').close()
+        self._started_at = time.monotonic()
+        tracemalloc.start()
+        self.sampler.start()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def checkpoint(self, label='checkpoint', force=False):
+        """Append a tracemalloc snapshot summary to memory.txt if one is due."""
+        if not tracemalloc.is_tracing():
+            return
+        now = time.monotonic()
+        if not force and self._last_snapshot_at is not None and now - self._last_snapshot_at < self.memory_interval:
+            return
+        self._last_snapshot_at = now
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        if self._first_snapshot is None:
+            self._first_snapshot = snapshot
+            title, stats = "largest allocations", snapshot.statistics('lineno')
+        else:
+            title, stats = "growth since the first snapshot", snapshot.compare_to(self._first_snapshot, 'lineno')
+
+        with open(os.path.join(self.output_dir, 'memory.txt'), 'a', encoding='utf-8') as f:
+            f.write(f"=== {label} at {now - self._started_at:.1f}s: "
+                    f"{current / 1048576:.1f} MiB traced, peak {peak / 1048576:.1f} MiB, {title}\n")
+            for stat in stats[:self.top]:
+                f.write(f"{stat}\n")
+            f.write("\n")
+
+    def write(self):
+        """Write the collapsed stacks, the stage breakdown and the cProfile stats. Returns the breakdown."""
+        with open(os.path.join(self.output_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+            for line in self.sampler.collapsed():
+                f.write(line + '\n')
+
+        breakdown = self.sampler.stage_breakdown()
+        with open(os.path.join(self.output_dir, 'stages.json'), 'w') as f:
+            json.dump({
+                'mode': self.mode,
+                'interval': self.sampler.interval,
+                'samples': self.sampler.samples,
+                'elapsed_seconds': round(time.monotonic() - self._started_at, 1),
+                'stages': breakdown,
+            }, f, indent=2)
+
+        if self._cprofile is not None:
+            # dump_stats disables the profiler, so a mid-run write turns it back on
+            self._cprofile.dump_stats(os.path.join(self.output_dir, 'cprofile.pstats'))
+            if not self._stopped:
+                self._cprofile.enable()
+        return breakdown
+
+    def stop(self):
+        """Stop profiling, take a last memory snapshot and write everything. Safe to call twice."""
+        if self._stopped:
+            return None
+        self._stopped = True
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.sampler.stop()
+        self.checkpoint('exit', force=True)
+        tracemalloc.stop()
+        return self.write()
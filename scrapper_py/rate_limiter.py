@@ -0,0 +1,202 @@
+import multiprocessing
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+#############################################
+# ADAPTIVE RATE LIMITING
+#############################################
+
+# Parse a Retry-After header value into a number of seconds
+def parse_retry_after(value):
+    """Return the delay requested by a Retry-After header, or None."""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    # Otherwise it should be an HTTP date
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Token bucket for a single host
+class TokenBucket:
+    """Token bucket whose refill rate can be changed while it is in use."""
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.consecutive_throttles = 0
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def reserve(self, now):
+        """Take one token and return how long the caller must wait for it."""
+        self._refill(now)
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def set_rate(self, rate, now):
+        # Settle the tokens earned at the old rate before switching
+        self._refill(now)
+        self.rate = rate
+
+
+# Request budget shared by several worker processes
+class SharedRequestBudget:
+    """Cap on the combined request rate of every process sharing the budget.
+
+    The next free request slot lives in shared memory, so the budget must be
+    handed to worker processes when they are created (e.g. as a pool
+    initializer argument).
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next_slot = multiprocessing.Value('d', 0.0, lock=False)
+        self._lock = multiprocessing.Lock()
+
+    def wait(self):
+        """Block until the combined budget allows another request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.value)
+            self._next_slot.value = slot + 1.0 / self.rate
+
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return max(delay, 0.0)
+
+
+# Key of the bucket for a host, or for a host reached through a proxy
+def _host_key(url_or_host, via=None):
+    host = urlparse(url_or_host).netloc or url_or_host
+    return host if via is None else f"{host} via {via}"
+
+
+# Per-host rate limiter that adapts to how the server responds
+class AdaptiveRateLimiter:
+    """Pace requests per host and adjust the pace from server feedback.
+
+    The rate grows additively while responses stay healthy and is cut
+    multiplicatively on 429s, 5xx errors, slow responses or CAPTCHA pages.
+    A Retry-After header pauses the host for at least the requested time.
+    Requests sent through a proxy pass via (the proxy's label), which gives
+    every proxy its own pace per host, as the server sees it as another client.
+    An optional SharedRequestBudget caps the total across processes on top.
+    """
+
+    def __init__(self, initial_rate=1.0, min_rate=0.1, max_rate=5.0,
+                 increase_step=0.05, decrease_factor=0.5, slow_response=5.0,
+                 throttle_cooldown=30.0, jitter=0.25, shared_budget=None):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.slow_response = slow_response
+        self.throttle_cooldown = throttle_cooldown
+        self.jitter = jitter
+        self.shared_budget = shared_budget
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.initial_rate)
+            self._buckets[host] = bucket
+        return bucket
+
+    def wait(self, url, via=None):
+        """Block until a request to the URL's host is allowed."""
+        host = _host_key(url, via)
+        with self._lock:
+            bucket = self._bucket(host)
+            delay = bucket.reserve(time.monotonic())
+            # A little randomness so the request pattern does not look scripted
+            delay += random.uniform(0, self.jitter / bucket.rate)
+
+        if delay > 0:
+            time.sleep(delay)
+        if self.shared_budget is not None:
+            delay += self.shared_budget.wait()
+        return delay
+
+    def record_response(self, url, status_code=None, elapsed=None, blocked=False, retry_after=None, via=None):
+        """Feed the outcome of a request back into the host's rate.
+
+        Returns the host's new rate in requests per second.
+        """
+        host = _host_key(url, via)
+        retry_delay = parse_retry_after(retry_after)
+        throttled = status_code == 429 or status_code == 403
+
+        with self._lock:
+            bucket = self._bucket(host)
+            now = time.monotonic()
+
+            unhealthy = (
+                throttled
+                or blocked
+                or status_code is None
+                or status_code >= 500
+                or (elapsed is not None and elapsed > self.slow_response)
+            )
+
+            if unhealthy:
+                bucket.set_rate(max(self.min_rate, bucket.rate * self.decrease_factor), now)
+            elif status_code < 400:
+                bucket.set_rate(min(self.max_rate, bucket.rate + self.increase_step), now)
+
+            if throttled:
+                bucket.consecutive_throttles += 1
+                if retry_delay is None:
+                    retry_delay = self.throttle_cooldown * bucket.consecutive_throttles
+            elif not unhealthy:
+                bucket.consecutive_throttles = 0
+
+            if retry_delay:
+                bucket.blocked_until = max(bucket.blocked_until, now + retry_delay)
+
+            return bucket.rate
+
+    def current_rate(self, url_or_host, via=None):
+        """Current rate in requests per second for a host (or a URL on it)."""
+        host = _host_key(url_or_host, via)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            return bucket.rate if bucket else self.initial_rate
+
+    def rates(self):
+        """Snapshot of the current rate for every host seen so far."""
+        with self._lock:
+            return {host: bucket.rate for host, bucket in self._buckets.items()}
+
+    def paused_for(self, url_or_host, via=None):
+        """Seconds until the host accepts requests again after a Retry-After."""
+        host = _host_key(url_or_host, via)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                return 0.0
+            return max(0.0, bucket.blocked_until - time.monotonic())
@@ -0,0 +1,137 @@
+import glob
+import gzip
+import os
+import socket
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+from event_log import log_event
+
+#############################################
+# RAW HTML ARCHIVE
+#############################################
+
+ARCHIVE_SUFFIX = '.warc.gz'
+
+
+# One archived page
+class ArchiveRecord:
+    __slots__ = ('url', 'kind', 'state', 'company_id', 'fetched_at', 'body')
+
+    def __init__(self, url, kind, state, company_id, fetched_at, body):
+        self.url = url
+        self.kind = kind
+        self.state = state
+        self.company_id = company_id
+        self.fetched_at = fetched_at
+        self.body = body
+
+
+# Appends fetched pages to sharded, gzip-compressed WARC files
+class RawArchiveWriter:
+    """Write raw HTML as WARC/1.1 'resource' records.
+
+    Every record is its own gzip member, the usual .warc.gz layout, so shards
+    can be read with standard WARC tools and a torn write at the end of a
+    shard only loses that last record. Each process writes its own shards
+    and starts a new one once max_shard_bytes is reached, which also gives
+    the re-parser independent units of work.
+    """
+
+    def __init__(self, directory, max_shard_bytes=256 * 1024 * 1024, compress_level=6):
+        self.directory = directory
+        self.max_shard_bytes = max_shard_bytes
+        self.compress_level = compress_level
+        self.prefix = f"pages-{datetime.now().strftime('%Y%m%d%H%M%S')}-{socket.gethostname()}-{os.getpid()}"
+        self._shard = 0
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _open_shard(self):
+        path = os.path.join(self.directory, f"{self.prefix}-{self._shard:05d}{ARCHIVE_SUFFIX}")
+        self._file = open(path, 'ab')
+
+    def write(self, url, body, kind, state=None, company_id=None):
+        """Append one page to the current shard."""
+        fetched_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        headers = [
+            'WARC/1.1',
+            'WARC-Type: resource',
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+            f"WARC-Date: {fetched_at}",
+            f"WARC-Target-URI: {url}",
+            'Content-Type: text/html',
+            f"X-Crawl-Kind: {kind}",
+        ]
+        if state:
+            headers.append(f"X-Crawl-State: {state}")
+        if company_id:
+            headers.append(f"X-Company-Id: {company_id}")
+        headers.append(f"Content-Length: {len(body)}")
+        record = ('\r\n'.join(headers) + '\r\n\r\n').encode('utf-8') + body + b'\r\n\r\n'
+        data = gzip.compress(record, self.compress_level)
+
+        with self._lock:
+            if self._file is None:
+                self._open_shard()
+            self._file.write(data)
+            self._file.flush()
+            if self._file.tell() >= self.max_shard_bytes:
+                self._file.close()
+                self._file = None
+                self._shard += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Shards in an archive directory
+def list_archive_shards(directory):
+    """All shard files under directory, oldest first (names start with the creation time)."""
+    return sorted(glob.glob(os.path.join(directory, f"*{ARCHIVE_SUFFIX}")))
+
+
+# Read the records of one shard back
+def iter_archive_records(path):
+    """Yield the ArchiveRecords in a shard, stopping quietly at a truncated tail."""
+    with open(path, 'rb') as raw, gzip.GzipFile(fileobj=raw) as f:
+        while True:
+            try:
+                line = f.readline()
+                if not line:
+                    return
+                if not line.startswith(b'WARC/'):
+                    raise ValueError(f"not a WARC record header: {line[:40]!r}")
+
+                headers = {}
+                while True:
+                    line = f.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('utf-8').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                body = f.read(length)
+                if len(body) < length:
+                    raise EOFError("record body cut short")
+                f.read(4)  # Record separator
+            except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+                log_event('warning', 'archive_truncated',
+                          f"{path} ends with an incomplete record ({str(e)}), skipping it", path=path)
+                return
+
+            yield ArchiveRecord(
+                headers.get('warc-target-uri'),
+                headers.get('x-crawl-kind'),
+                headers.get('x-crawl-state'),
+                headers.get('x-company-id'),
+                headers.get('warc-date'),
+                body
+            )
@@ -0,0 +1,81 @@
+import sys
+
+#############################################
+# COMPACT RECORDS
+#############################################
+
+# Base class for fixed-field records, one slot per field
+class Record:
+    """Record with dict-style access, stored in __slots__ instead of a dict.
+
+    Subclasses set __slots__ to their field names. A 15-field record takes
+    about a fifth of the memory of the equivalent dict, and the values of
+    the interned fields (repeated ones like state or city) are shared
+    between records instead of being held once per record. Sinks, digests
+    and extractors only use get(), [] and items(), so a record can stand in
+    for the dict it replaces.
+    """
+
+    __slots__ = ()
+    interned = frozenset()
+    _fields = frozenset()
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, '')
+        for field, value in values.items():
+            self[field] = value
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.__slots__)
+
+    def __setitem__(self, field, value):
+        if field in self.interned and type(value) is str:
+            value = sys.intern(value)
+        try:
+            setattr(self, field, value)
+        except AttributeError:
+            raise KeyError(field)
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in self._fields else default
+
+    def __contains__(self, field):
+        return field in self._fields
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self.__slots__]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            self[field] = value
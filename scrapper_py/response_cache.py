@@ -0,0 +1,287 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+#############################################
+# ON-DISK RESPONSE CACHE
+#############################################
+
+# How long a cached response is used without asking the server, per URL class
+DEFAULT_TTLS = {
+    'detail': 30 * 24 * 3600,  # Company records rarely change
+    'list': 6 * 3600,  # New companies show up on the list pages first
+}
+
+
+# Canonical form of a URL used as the cache key
+def normalize_url(url):
+    """Lower-case scheme and host, sort the query parameters, drop the fragment.
+
+    Parameter values are kept exactly as they were encoded, since the site
+    mixes latin-1 and UTF-8 escapes in the state names.
+    """
+    parts = urlsplit(url)
+    query = '&'.join(sorted(param for param in parts.query.split('&') if param))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+# Which TTL applies to a URL
+def classify_url(url):
+    """'detail' for company detail pages (cmd=anzeige), 'list' for everything else."""
+    cmd = parse_qs(urlsplit(url).query).get('cmd', [''])[0]
+    return 'detail' if cmd == 'anzeige' else 'list'
+
+
+# A response found in the cache
+class CachedResponse:
+    __slots__ = ('url', 'body', 'etag', 'last_modified', 'stored_at', 'fresh')
+
+    def __init__(self, url, body, etag, last_modified, stored_at, fresh):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.fresh = fresh
+
+    def conditional_headers(self):
+        """Headers that turn a refetch into a conditional GET."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+# Compressed response bodies on disk with an SQLite index
+class ResponseCache:
+    """Cache of response bodies keyed by normalised URL.
+
+    Bodies are stored zlib-compressed under the SHA-256 of their content, so
+    identical pages reached through different URLs take the space once. The
+    index keeps the validators (ETag / Last-Modified) for conditional GETs and
+    the last access time used to evict the least recently used entries once
+    the blobs grow past max_bytes. The total size is kept in the index too,
+    updated in the same transaction as the blobs, so every process sharing
+    the directory sees the same total. Access times are written in batches
+    of access_batch hits rather than on every hit.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, ttls=None, compress_level=6, access_batch=256):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.compress_level = compress_level
+        self.access_batch = access_batch
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Detail pages are fetched on worker threads, so the connection is shared under the lock
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.db'), timeout=30,
+                                     check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' url_key TEXT PRIMARY KEY,'
+            ' digest TEXT NOT NULL,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' stored_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL'
+            ')'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            ' digest TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL'
+            ')'
+        )
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        # A cache from before the total was kept starts from the blob sizes
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM blobs"
+        )
+        self._conn.commit()
+        self._accessed = {}  # url_key -> access time not written to the index yet
+        self._stats = {'hits': 0, 'stale': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _read_blob(self, digest):
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                return zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+
+    def _write_blob(self, digest, body):
+        path = self._blob_path(digest)
+        data = zlib.compress(body, self.compress_level)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so a crash never leaves half a blob
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return len(data)
+
+    def _total_bytes(self):
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def _add_bytes(self, size):
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE key = 'total_bytes'", (size,))
+
+    def _flush_accessed(self):
+        """Write the buffered access times. Caller holds the lock and commits."""
+        if self._accessed:
+            self._conn.executemany('UPDATE entries SET accessed_at = ? WHERE url_key = ?',
+                                   ((accessed_at, url_key) for url_key, accessed_at in self._accessed.items()))
+            self._accessed = {}
+
+    def lookup(self, url, max_age=None):
+        """Return the CachedResponse for a URL, or None if it is not cached.
+
+        fresh is False once the entry is older than its URL class TTL (or
+        max_age seconds, if given); the body can still be used if the server
+        answers 304 Not Modified.
+        """
+        url_key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT digest, etag, last_modified, stored_at FROM entries WHERE url_key = ?',
+                (url_key,)
+            ).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            digest, etag, last_modified, stored_at = row
+            body = self._read_blob(digest)
+            if body is None:
+                # Blob went missing (e.g. deleted by hand), forget the entry
+                self._conn.execute('DELETE FROM entries WHERE url_key = ?', (url_key,))
+                self._conn.commit()
+                self._stats['misses'] += 1
+                return None
+            # The LRU order only needs to be roughly right, so hits are not a write each
+            self._accessed[url_key] = now
+            if len(self._accessed) >= self.access_batch:
+                self._flush_accessed()
+                self._conn.commit()
+
+            ttl = self.ttls.get(classify_url(url), 0) if max_age is None else max_age
+            fresh = now - stored_at < ttl
+            self._stats['hits' if fresh else 'stale'] += 1
+        return CachedResponse(url, body, etag, last_modified, stored_at, fresh)
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """Cache a response body with its validators."""
+        url_key = normalize_url(url)
+        digest = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            # Other processes share the index: take the write lock before reading the total
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._store(url_key, digest, body, etag, last_modified, now)
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+            self._stats['stored'] += 1
+
+    def _store(self, url_key, digest, body, etag, last_modified, now):
+        """Body of store(), run inside its transaction."""
+        self._flush_accessed()
+        known = self._conn.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone()
+        if known is None or not os.path.exists(self._blob_path(digest)):
+            size = self._write_blob(digest, body)
+            self._conn.execute('INSERT OR REPLACE INTO blobs (digest, size) VALUES (?, ?)', (digest, size))
+            if known is None:
+                self._add_bytes(size)
+        old = self._conn.execute('SELECT digest FROM entries WHERE url_key = ?', (url_key,)).fetchone()
+        self._conn.execute(
+            'INSERT OR REPLACE INTO entries (url_key, digest, etag, last_modified, stored_at, accessed_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (url_key, digest, etag, last_modified, now, now)
+        )
+        if old is not None and old[0] != digest:
+            self._drop_orphans([old[0]])
+        if self.max_bytes and self._total_bytes() > self.max_bytes:
+            self._evict()
+
+    def revalidated(self, url, etag=None, last_modified=None):
+        """Restart the TTL of an entry after the server answered 304 Not Modified."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'UPDATE entries SET stored_at = ?, accessed_at = ?,'
+                ' etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)'
+                ' WHERE url_key = ?',
+                (now, now, etag, last_modified, normalize_url(url))
+            )
+            self._conn.commit()
+            self._stats['revalidated'] += 1
+
+    def _drop_orphans(self, digests):
+        """Delete blobs no entry points at any more. Caller holds the lock."""
+        for digest in digests:
+            if self._conn.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+                continue
+            row = self._conn.execute('SELECT size FROM blobs WHERE digest = ?', (digest,)).fetchone()
+            if row is None:
+                continue
+            self._conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+            self._add_bytes(-row[0])
+            try:
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes.
+
+        Caller holds the lock and commits.
+        """
+        target = self.max_bytes * 0.9
+        while self._total_bytes() > target:
+            rows = self._conn.execute(
+                'SELECT url_key, digest FROM entries ORDER BY accessed_at LIMIT 100'
+            ).fetchall()
+            if not rows:
+                break
+            for url_key, digest in rows:
+                self._conn.execute('DELETE FROM entries WHERE url_key = ?', (url_key,))
+                self._drop_orphans([digest])
+                self._stats['evicted'] += 1
+                if self._total_bytes() <= target:
+                    break
+
+    def size(self):
+        """Compressed bytes on disk."""
+        with self._lock:
+            return self._total_bytes()
+
+    def stats(self):
+        """Snapshot of the hit/miss counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def flush(self):
+        """Write the access times of recent hits to the index."""
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+#############################################
+# RETRIES, CIRCUIT BREAKER AND DEAD LETTERS
+#############################################
+
+# Delay before a retry, growing exponentially with some randomness
+def backoff_delay(attempt, base=5.0, cap=300.0, jitter=0.5):
+    """Seconds to wait before retry number attempt (0 for the first retry).
+
+    The delay doubles with every attempt up to cap, and up to jitter of it
+    is taken off at random so that requests failing together do not all
+    come back at the same moment.
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return delay * (1.0 - jitter * random.random())
+
+
+# Items waiting for another attempt, in the order they become due
+class RetryQueue:
+    """Delayed-retry queue with jittered exponential backoff.
+
+    schedule() puts an item back with a delay that grows with the number of
+    times it failed, and due() hands back the items whose delay is over, so
+    the caller gets on with other work in the meantime. An item that has
+    failed max_attempts times is not scheduled again. Not thread-safe: the
+    thread that collects the results owns the queue.
+    """
+
+    def __init__(self, base=5.0, cap=300.0, max_attempts=4, jitter=0.5):
+        self.base = base
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+        self._heap = []
+        self._counter = itertools.count()
+        self._failures = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, item, retry_after=None):
+        """Count a failure of item and queue it again.
+
+        Returns the delay in seconds, or None if the item is out of attempts.
+        A Retry-After from the server is honoured if it is longer.
+        """
+        failures = self._failures.get(item, 0) + 1
+        if failures >= self.max_attempts:
+            self._failures.pop(item, None)
+            return None
+        self._failures[item] = failures
+        delay = max(backoff_delay(failures - 1, self.base, self.cap, self.jitter), retry_after or 0.0)
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+        return delay
+
+    def succeeded(self, item):
+        """Forget the failures of an item that got through."""
+        self._failures.pop(item, None)
+
+    def due(self):
+        """Take the items whose delay is over, earliest first."""
+        now = time.monotonic()
+        items = []
+        while self._heap and self._heap[0][0] <= now:
+            items.append(heapq.heappop(self._heap)[2])
+        return items
+
+    def next_due(self):
+        """Seconds until the next item is due, or None if the queue is empty."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+# Breaker state of one host
+class _Circuit:
+    __slots__ = ('state', 'failures', 'open_seconds', 'open_until')
+
+    def __init__(self, open_seconds):
+        self.state = 'closed'
+        self.failures = 0
+        self.open_seconds = open_seconds
+        self.open_until = 0.0
+
+
+# Per-host circuit breaker that pauses a failing host and probes it
+class CircuitBreaker:
+    """Stop sending requests to a host that keeps failing, then probe it.
+
+    After failure_threshold failures in a row the host's circuit opens and
+    wait() holds every request to it back for open_seconds. Then a single
+    request goes out as a probe while the others keep waiting: if it gets
+    through the circuit closes again, if not it reopens for twice as long,
+    up to max_open_seconds. A failing host pauses the crawl instead of
+    ending it.
+    """
+
+    def __init__(self, failure_threshold=5, open_seconds=30.0, max_open_seconds=900.0):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._circuits = {}
+        self._cond = threading.Condition()
+
+    def _circuit(self, url_or_host):
+        host = urlparse(url_or_host).netloc or url_or_host
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = _Circuit(self.open_seconds)
+        return circuit
+
+    def wait(self, url):
+        """Block until a request to the URL's host may go out. Returns the seconds waited."""
+        start = time.monotonic()
+        with self._cond:
+            circuit = self._circuit(url)
+            while circuit.state != 'closed':
+                now = time.monotonic()
+                if circuit.state == 'open' and now >= circuit.open_until:
+                    # This request is the probe
+                    circuit.state = 'half_open'
+                    break
+                # While the probe is out, check back now and then
+                self._cond.wait(circuit.open_until - now if circuit.state == 'open' else 1.0)
+        return time.monotonic() - start
+
+    def record(self, url, ok):
+        """Report whether a request to the URL's host got through.
+
+        Returns 'opened' or 'closed' when this changed the circuit, else None.
+        """
+        with self._cond:
+            circuit = self._circuit(url)
+            if ok:
+                circuit.failures = 0
+                circuit.open_seconds = self.open_seconds
+                if circuit.state == 'closed':
+                    return None
+                circuit.state = 'closed'
+                self._cond.notify_all()
+                return 'closed'
+
+            circuit.failures += 1
+            if circuit.state == 'half_open':
+                # The probe failed: back off for longer
+                circuit.open_seconds = min(self.max_open_seconds, circuit.open_seconds * 2)
+            elif circuit.state == 'open' or circuit.failures < self.failure_threshold:
+                return None
+            circuit.state = 'open'
+            circuit.open_until = time.monotonic() + circuit.open_seconds
+            self._cond.notify_all()
+            return 'opened'
+
+    def state(self, url_or_host):
+        """'closed', 'open' or 'half_open'."""
+        with self._cond:
+            return self._circuit(url_or_host).state
+
+    def paused_for(self, url_or_host):
+        """Seconds until the host's open circuit lets a probe through."""
+        with self._cond:
+            circuit = self._circuit(url_or_host)
+            if circuit.state != 'open':
+                return 0.0
+            return max(0.0, circuit.open_until - time.monotonic())
+
+
+# Persistent list of companies whose details could not be fetched
+class DeadLetterStore:
+    """Company IDs whose detail fetch failed, kept in an SQLite table.
+
+    add() writes straight away, so a company is never lost once the crawl
+    cursor has moved past it, even if the process dies before it is
+    retried. resolve() marks a company as fetched after all and commit()
+    takes the resolved ones off the list, meant to run once the record and
+    the processed ID are committed. Whatever is left after a run is its
+    dead letters, which a later run can drain with entries().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letters ('
+            ' company_id TEXT PRIMARY KEY,'
+            ' state TEXT,'
+            ' attempts INTEGER NOT NULL,'
+            ' last_error TEXT,'
+            ' failed_at TEXT NOT NULL'
+            ')'
+        )
+        self._conn.commit()
+        self._resolved = set()
+
+    def __contains__(self, company_id):
+        row = self._conn.execute(
+            'SELECT 1 FROM dead_letters WHERE company_id = ?', (company_id,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM dead_letters').fetchone()[0]
+
+    def add(self, company_id, state, error=None):
+        """Record a failed attempt for a company."""
+        self._resolved.discard(company_id)
+        self._conn.execute(
+            'INSERT INTO dead_letters (company_id, state, attempts, last_error, failed_at)'
+            ' VALUES (?, ?, 1, ?, ?)'
+            ' ON CONFLICT (company_id) DO UPDATE SET'
+            ' attempts = attempts + 1, state = excluded.state,'
+            ' last_error = excluded.last_error, failed_at = excluded.failed_at',
+            (company_id, state, error, datetime.now().isoformat())
+        )
+        self._conn.commit()
+
+    def resolve(self, company_id):
+        """Take a company off the list at the next commit()."""
+        self._resolved.add(company_id)
+
+    def commit(self):
+        """Remove the resolved companies. Returns how many were removed."""
+        resolved = self._resolved
+        if not resolved:
+            return 0
+        cursor = self._conn.executemany('DELETE FROM dead_letters WHERE company_id = ?',
+                                        ((company_id,) for company_id in resolved))
+        self._conn.commit()
+        self._resolved = set()
+        return cursor.rowcount
+
+    def entries(self, state=None):
+        """(company_id, state, attempts, last_error) of every listed company, oldest failure first."""
+        query = 'SELECT company_id, state, attempts, last_error FROM dead_letters'
+        params = ()
+        if state is not None:
+            query += ' WHERE state = ?'
+            params = (state,)
+        return self._conn.execute(query + ' ORDER BY failed_at', params).fetchall()
+
+    def close(self):
+        self.commit()
+        self._conn.close()
@@ -1,20 +1,57 @@
 import time
+import atexit
 import requests
-import pandas as pd
 import json
-from bs4 import BeautifulSoup
 from datetime import datetime
 import os
 import sys
 import re
 import random
+import argparse
+import glob
+import socket
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from urllib.parse import urljoin, urlparse, parse_qs
 
+from checkpoint import CheckpointPolicy
+from combined_output import CombinedOutput
+from detail_fetcher import DetailFetcher
+from document import as_document, parse_document
+from event_log import flush_event_log, log_event, setup_event_log
+from freshness import FreshnessStore, record_digest
+from http_client import HttpClient
+from metrics import EtaTracker, MetricsRegistry, SnapshotWriter, start_metrics_server
+from pipeline import Prefetcher
+from processed_store import ProcessedStore
+from profiling import CrawlProfiler
+from proxy_pool import ProxyPool
+from raw_archive import RawArchiveWriter, iter_archive_records, list_archive_shards
+from rate_limiter import AdaptiveRateLimiter, SharedRequestBudget, parse_retry_after
+from records import Record
+from response_cache import ResponseCache, classify_url
+from retry import CircuitBreaker, DeadLetterStore, RetryQueue, backoff_delay
+from sinks import committed_offset, iter_records, open_sink, remove_output
+from work_queue import LeaseHeartbeat, SqliteWorkQueue
+
 # Custom exception for handling errors
 class ScraperError(Exception):
     """Exception raised when the scraper encounters an error."""
     pass
 
+# Raised by fetch_page for a page it could not fetch
+class FetchFailed(Exception):
+    """A failed fetch, with whether trying again later may help."""
+    
+    def __init__(self, url, reason, status_code=None, retryable=True, retry_after=None):
+        super().__init__(f"Failed to fetch {url}: {reason}")
+        self.url = url
+        self.reason = reason
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+
 #############################################
 # CONFIGURATION VARIABLES - EDIT AS NEEDED
 #############################################
@@ -65,23 +102,216 @@ STATE_DISPLAY_NAMES = {
 # Starting point configuration (can be adjusted to resume from a particular state)
 START_STATE_INDEX = 0  # 0 is Baden-Württemberg (first in STATES list)
 
+# Run-all mode (--all-states): states are crawled in parallel worker processes
+STATE_WORKERS = 4
+STATE_PROGRESS_DIR = 'state_progress'  # One progress cursor per state in run-all mode
+
+# Work queue mode (--queue-worker): list pages and companies are leased from a shared queue
+WORK_QUEUE_DB = 'work_queue.db'
+QUEUE_PROGRESS_DIR = 'queue_progress'  # One progress file (output offsets) per queue worker
+QUEUE_LEASE_SECONDS = 120  # A task goes back to the queue if its worker is silent this long
+QUEUE_POLL_SECONDS = 5  # Wait before asking again when only other workers' leases are left
+QUEUE_MAX_ATTEMPTS = 3  # Tasks failing this often are marked failed instead of retried
+
+# Incremental mode (--incremental): find new companies and revisit the ones most likely to be stale
+RECRAWL_DAILY_BUDGET = 5000  # Requests per day, list pages included
+RECRAWL_DISCOVERY_SHARE = 0.3  # Part of the budget spent walking list pages for new companies
+RECRAWL_MIN_AGE_DAYS = 7  # Companies checked more recently than this are never revisited
+RECRAWL_PRIOR_CHANGES = 1.0  # Assumed changes per RECRAWL_PRIOR_DAYS for a company never seen changing
+RECRAWL_PRIOR_DAYS = 365.0
+FRESHNESS_DB = 'freshness.db'  # Check history per company and requests spent per day
+
+# Rough relative state sizes (population in thousands), used to start the
+# largest states first until a run has recorded their real entry counts
+STATE_SIZE_HINTS = {
+    "Baden-W%FCrttemberg": 11280,
+    "Bayern": 13370,
+    "Berlin": 3760,
+    "Brandenburg": 2570,
+    "Bremen": 680,
+    "Hamburg": 1890,
+    "Hessen": 6390,
+    "Mecklenburg-Vorpommern": 1630,
+    "Niedersachsen": 8140,
+    "Nordrhein-Westfalen": 18140,
+    "Rheinland-Pfalz": 4160,
+    "Saarland": 990,
+    "Sachsen": 4090,
+    "Sachsen-Anhalt": 2190,
+    "Schleswig-Holstein": 2960,
+    "Th%FCringen": 2130
+}
+
 # Output configuration
 ONE_FILE_PER_STATE = True  # True to create one file per state, False for one big file
+COMBINED_OUTPUT_FILE = 'all_companies.csv'  # National file the states are merged into when that is False
+COMBINED_INDEX_DB = 'all_companies.index.db'  # Company IDs already in the national file
+OUTPUT_FORMAT = 'csv'  # 'csv', 'jsonl' or 'parquet' - records are appended, never rewritten
+SINK_BATCH_SIZE = 10  # Records buffered before they are written to the output file
+PARQUET_DATASET_DIR = 'companies_parquet'  # Parquet output is one dataset with a directory per state
+PARQUET_ROW_GROUP_SIZE = 10000  # Committed records gathered before they are written out as a row group
+
+# Checkpoint settings - output, cursor and processed IDs are committed together
+# once either interval is reached, instead of on every event
+CHECKPOINT_INTERVAL_SECONDS = 30
+CHECKPOINT_INTERVAL_RECORDS = 50
+
+# Output columns, in the order they are written
+COMPANY_FIELDS = [
+    'company_id', 'state', 'name', 'street', 'zipcode', 'city', 'phone', 'fax',
+    'mobile', 'email', 'website', 'contact_person', 'products_info', 'industry',
+    'scrape_date'
+]
+
+# Columns whose values repeat across companies; records share one copy of each value
+INTERNED_FIELDS = ['state', 'city', 'industry']
+
+# Column types in the Parquet output, strings unless listed here
+COMPANY_FIELD_TYPES = {'company_id': 'int64', 'scrape_date': 'timestamp'}
+# Repetitive columns, dictionary-encoded in the Parquet output (state is the partition directory)
+PARQUET_DICTIONARY_FIELDS = ['zipcode', 'city', 'industry']
 
-# Delay settings (seconds) - slightly reduced to be faster
-MIN_PAGE_DELAY = 0.8
-MAX_PAGE_DELAY = 2.5
-MIN_COMPANY_DELAY = 0.3
-MAX_COMPANY_DELAY = 1.0
+# Rate limiting (requests per second per host) - adjusted automatically from server responses
+INITIAL_REQUEST_RATE = 1.0
+MIN_REQUEST_RATE = 0.1
+MAX_REQUEST_RATE = 5.0
+RATE_INCREASE_STEP = 0.05  # Added to the rate after every healthy response
+RATE_DECREASE_FACTOR = 0.5  # Applied to the rate on 429s, 5xx, slow responses or CAPTCHA pages
+SLOW_RESPONSE_SECONDS = 5.0  # Responses slower than this count as the server struggling
+THROTTLE_COOLDOWN = 30  # Seconds to pause after a 429 without a Retry-After header
+GLOBAL_MAX_REQUEST_RATE = MAX_REQUEST_RATE  # Combined cap for all worker processes in run-all mode
+
+# Concurrency settings
+DETAIL_WORKERS = 4  # Number of company detail pages fetched in parallel
+LIST_PREFETCH_PAGES = 1  # List pages fetched and parsed ahead of the page whose details are being fetched
+
+# HTTP connection pool settings
+HTTP_POOL_CONNECTIONS = 4  # Number of hosts to keep connection pools for
+HTTP_POOL_MAXSIZE = DETAIL_WORKERS + 2  # Keep-alive connections kept open per host
+REQUEST_TIMEOUT = 15  # Seconds
+
+# Proxy pool - requests are spread over the proxies by health, each with its own pace
+PROXY_FILE = None  # e.g. 'proxies.txt' (a URL or host:port per line) or the Node scraper's working_proxies.json
+PROXY_MAX_AGE = 24 * 3600  # Entries of a JSON proxy file last checked longer ago than this are skipped
+PROXY_MAX_CONCURRENCY = 2  # Requests in flight through one proxy at a time
+PROXY_QUARANTINE_SECONDS = 300  # Quarantine after a 403/429, doubled for every further ban in a row
+PROXY_MAX_QUARANTINE_SECONDS = 3600
+
+# Retries - a failed detail page waits on a delayed-retry queue while the crawl goes on
+RETRY_BASE_SECONDS = 5  # Delay before the first retry, doubled for every further one
+RETRY_MAX_SECONDS = 300
+RETRY_JITTER = 0.5  # Up to this share of each delay is taken off at random
+DETAIL_MAX_ATTEMPTS = 4  # Fetches of a company per run before it is left on the dead-letter list
+
+# Circuit breaker - a host that keeps failing is paused and probed instead of ending the run
+CIRCUIT_FAILURE_THRESHOLD = 5  # Failures in a row that pause all requests to a host
+CIRCUIT_OPEN_SECONDS = 30  # Pause before a probe request, doubled after every failed probe
+CIRCUIT_MAX_OPEN_SECONDS = 900
 
 # Files
 PROGRESS_FILE = 'scraping_progress.json'
 PROGRESS_BACKUP_FILE = 'scraping_progress.backup.json'
-PROCESSED_COMPANIES_FILE = 'processed_companies.json'
+PROCESSED_COMPANIES_DB = 'processed_companies.db'
+PROCESSED_COMPANIES_FILE = 'processed_companies.json'  # Legacy format, imported into the DB once
+DEAD_LETTER_DB = 'dead_letters.db'  # Companies whose details could not be fetched, for --drain-failed
 BLOCKED_PAGES_DIR = 'blocked_pages'  # Directory to save blocked page responses
 
-# Debug mode - prints more information
-DEBUG = True
+# Response cache: reruns are served from disk, stale pages are revalidated with conditional GETs
+USE_RESPONSE_CACHE = True
+RESPONSE_CACHE_DIR = 'response_cache'
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used pages are evicted past this size
+RESPONSE_CACHE_TTLS = {
+    'list': 6 * 3600,  # Search result pages, where new companies appear
+    'detail': 30 * 24 * 3600,  # Company detail pages (cmd=anzeige)
+}
+
+# Shared rate limiter - every request goes through it
+RATE_LIMITER = AdaptiveRateLimiter(
+    initial_rate=INITIAL_REQUEST_RATE,
+    min_rate=MIN_REQUEST_RATE,
+    max_rate=MAX_REQUEST_RATE,
+    increase_step=RATE_INCREASE_STEP,
+    decrease_factor=RATE_DECREASE_FACTOR,
+    slow_response=SLOW_RESPONSE_SECONDS,
+    throttle_cooldown=THROTTLE_COOLDOWN
+)
+
+# Shared circuit breaker - a host that keeps failing is paused instead of ending the run
+CIRCUIT_BREAKER = CircuitBreaker(
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    open_seconds=CIRCUIT_OPEN_SECONDS,
+    max_open_seconds=CIRCUIT_MAX_OPEN_SECONDS
+)
+
+# Shared HTTP client - list pages, detail pages and any other fetches reuse its connections
+HTTP_CLIENT = HttpClient(
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    timeout=REQUEST_TIMEOUT
+)
+
+# Raw HTML archive: every fetched page is kept so the dataset can be rebuilt with --reparse
+ARCHIVE_RAW_HTML = True
+ARCHIVE_DIR = 'raw_archive'
+ARCHIVE_SHARD_BYTES = 256 * 1024 * 1024  # A new shard file is started past this size
+REPARSE_OUTPUT_DIR = 'reparsed'  # Where --reparse writes the rebuilt state files
+REPARSE_WORKERS = os.cpu_count() or 4
+
+# Metrics: counters and histograms cheap enough to leave on in production
+METRICS_PORT = None  # e.g. 9108 to serve Prometheus text on http://127.0.0.1:9108/metrics
+METRICS_SNAPSHOT_FILE = 'metrics.json'  # JSON dump of all metrics, None to disable; workers add their pid
+METRICS_SNAPSHOT_SECONDS = 30
+
+METRICS = MetricsRegistry(prefix='scraper_')
+REQUEST_LATENCY = METRICS.histogram('request_seconds', "HTTP response time by URL class", ['url_class'])
+RESPONSES = METRICS.counter('responses_total', "HTTP responses (or request errors) by URL class and status",
+                            ['url_class', 'status'])
+RETRIES = METRICS.counter('retries_total', "Requests retried by URL class and reason", ['url_class', 'reason'])
+CACHE_LOOKUPS = METRICS.counter('cache_lookups_total', "Response cache lookups by result (hit, stale, miss)",
+                                ['result'])
+SLEEP_SECONDS = METRICS.counter('sleep_seconds_total', "Time spent sleeping before requests, by reason",
+                                ['reason'])
+PARSE_LATENCY = METRICS.histogram('parse_seconds', "HTML parse and extraction time by page type", ['page_type'])
+ROWS_WRITTEN = METRICS.counter('rows_written_total', "Company records written to the output sinks", ['state'])
+CHECKPOINT_LATENCY = METRICS.histogram('checkpoint_seconds', "Time spent committing checkpoints")
+QUEUE_DEPTH = METRICS.gauge('queue_depth', "Work waiting in the detail fetcher and the work queue", ['queue'])
+STATE_ENTRIES = METRICS.gauge('state_entries', "Entries of the state being crawled, total and done so far",
+                              ['state', 'kind'])
+STATE_ETA = METRICS.gauge('state_eta_seconds', "Estimated seconds until the state being crawled is done",
+                          ['state'])
+PROXY_RESPONSES = METRICS.counter('proxy_responses_total', "HTTP responses (or request errors) by proxy and status",
+                                  ['proxy', 'status'])
+PROXIES_QUARANTINED = METRICS.gauge('proxies_quarantined', "Proxies in quarantine after a 403 or 429")
+CIRCUITS_OPEN = METRICS.gauge('circuit_open', "1 while the circuit breaker pauses requests to a host", ['host'])
+DEAD_LETTERS = METRICS.counter('dead_letters_total', "Companies left on the dead-letter list by state", ['state'])
+
+# Profiling (--profile): stack samples, per-stage breakdown and memory snapshots, written at exit
+PROFILE_MODE = None  # 'sample' or 'cprofile' to profile every run, like --profile
+PROFILE_DIR = 'profile'  # Worker processes write to worker-<pid> subdirectories
+PROFILE_SAMPLE_INTERVAL = 0.01  # Seconds between stack samples
+PROFILE_MEMORY_INTERVAL = 60  # Least seconds between tracemalloc snapshots at checkpoints
+
+# Opened on first use in each process, since SQLite connections must not cross a fork
+_response_cache = None
+_response_cache_lock = threading.Lock()
+_raw_archive = None
+_proxy_pool = None
+_metrics_writer = None
+_profiler = None
+
+# HTML parser backend: 'lxml' (fast, C-based) or 'html.parser' (pure Python)
+# Falls back to html.parser automatically if lxml is not installed
+HTML_PARSER = 'lxml'
+
+# Event log: every event as a JSON line, filterable by state, page and company_id
+LOG_LEVEL = 'info'  # 'debug' adds every request, cache hit and skipped company
+CONSOLE_LOG_LEVEL = 'info'  # What is also shown on the terminal, None for nothing
+EVENT_LOG_FILE = 'scraper_events.jsonl'  # None to log to the terminal only; workers add their pid
+LOG_SAMPLE_LIMITS = {  # Most events per second logged for the chattiest events
+    'company_skipped': 5,
+    'cache_hit': 5,
+    'request': 20,
+}
 
 # User agent list to rotate and avoid blocking
 USER_AGENTS = [
@@ -129,6 +359,17 @@ SELECTORS = {
     'company_industry': 'td:-soup-contains("Branchen") + td',
 }
 
+# Label text of each company details field, taken from the selectors above
+# so the single-pass extractor and the selectors never disagree
+DETAIL_LABELS = {
+    key: re.search(r'-soup-contains\("([^"]+)"\)', selector).group(1)
+    for key, selector in SELECTORS.items()
+    if '-soup-contains' in selector
+}
+
+# Label cells on detail pages that matched none of DETAIL_LABELS (schema drift)
+UNKNOWN_DETAIL_LABELS = Counter()
+
 #############################################
 # HELPER FUNCTIONS
 #############################################
@@ -151,11 +392,6 @@ def get_headers():
         'Sec-Fetch-Dest': 'document',
     }
 
-# Debug print function
-def debug_print(message):
-    if DEBUG:
-        print(f"[DEBUG] {message}")
-
 # Simplified function to save blocked page responses - only save important errors
 def save_blocked_page(url, content=None, status_code=None, headers=None, error_message=None, force_save=False):
     """Save the HTML content of a blocked page for debugging - optimized to save only important errors."""
@@ -176,8 +412,8 @@ def save_blocked_page(url, content=None, status_code=None, headers=None, error_m
     
     if not should_save:
         # Just log but don't save the file
-        if DEBUG:
-            print(f"Skipping saving response for URL: {url} (status: {status_code})")
+        log_event('debug', 'blocked_page_skipped', f"Skipping saving response for URL: {url} (status: {status_code})",
+                  url=url, status=status_code)
         return None
         
     # Create a filename with timestamp
@@ -207,14 +443,16 @@ def save_blocked_page(url, content=None, status_code=None, headers=None, error_m
                     f.write(content.encode('utf-8'))
                 else:
                     f.write(content)
-                print(f"Saved content to {filename} ({len(content)} bytes)")
+                log_event('info', 'blocked_page_saved', f"Saved content to {filename} ({len(content)} bytes)",
+                          url=url, status=status_code, file=filename)
         else:
             # If no content, create a file with error info
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write(f"No content received from {url}\n")
                 if error_message:
                     f.write(f"Error: {error_message}\n")
-                print(f"Saved error note to {filename}")
+                log_event('info', 'blocked_page_saved', f"Saved error note to {filename}",
+                          url=url, status=status_code, file=filename)
         
         # Save additional request information
         info_filename = f"{filename}.info.txt"
@@ -232,55 +470,299 @@ def save_blocked_page(url, content=None, status_code=None, headers=None, error_m
             
         return filename
     except Exception as e:
-        print(f"Error saving blocked page: {str(e)}")
+        log_event('error', 'blocked_page_error', f"Error saving blocked page: {str(e)}", url=url)
+        return None
+
+# Get this process's response cache
+def get_response_cache():
+    """Open the response cache on first use, or return None if caching is off."""
+    global _response_cache
+    if not USE_RESPONSE_CACHE:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None or _response_cache[0] != os.getpid():
+            cache = ResponseCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTLS)
+            _response_cache = (os.getpid(), cache)
+            atexit.register(flush_response_cache)
+        return _response_cache[1]
+
+# Write the access times the response cache buffers for its LRU order
+def flush_response_cache():
+    if _response_cache is not None and _response_cache[0] == os.getpid():
+        _response_cache[1].flush()
+
+# Get this process's raw HTML archive writer
+def get_raw_archive():
+    """Open the archive writer on first use, or return None if archiving is off."""
+    global _raw_archive
+    if not ARCHIVE_RAW_HTML:
+        return None
+    with _response_cache_lock:
+        if _raw_archive is None or _raw_archive[0] != os.getpid():
+            _raw_archive = (os.getpid(), RawArchiveWriter(ARCHIVE_DIR, ARCHIVE_SHARD_BYTES))
+        return _raw_archive[1]
+
+# Get this process's proxy pool
+def get_proxy_pool():
+    """Load the proxy pool on first use, or return None if no proxy file is set."""
+    global _proxy_pool
+    if not PROXY_FILE:
+        return None
+    with _response_cache_lock:
+        if _proxy_pool is None or _proxy_pool[0] != os.getpid():
+            pool = ProxyPool.from_file(PROXY_FILE, PROXY_MAX_AGE,
+                                       max_concurrency=PROXY_MAX_CONCURRENCY,
+                                       quarantine_seconds=PROXY_QUARANTINE_SECONDS,
+                                       max_quarantine_seconds=PROXY_MAX_QUARANTINE_SECONDS)
+            log_event('info', 'proxy_pool', f"Loaded {len(pool)} proxies from {PROXY_FILE}",
+                      proxies=len(pool), file=PROXY_FILE)
+            _proxy_pool = (os.getpid(), pool)
+        return _proxy_pool[1]
+
+# Keep the raw HTML of a page for offline re-parsing
+def archive_page(url, content, kind, state, company_id=None):
+    """Append a fetched list ('list') or detail ('detail') page to the raw archive."""
+    archive = get_raw_archive()
+    if archive is None:
+        return
+    try:
+        archive.write(url, content, kind, state, company_id)
+    except Exception as e:
+        log_event('error', 'archive_error', f"Error archiving {url}: {str(e)}", url=url, state=state)
+
+# Per-process variant of a file name, for worker processes
+def get_process_filename(filename):
+    """filename with this process's pid before the extension, or None if filename is empty."""
+    if not filename:
         return None
+    base, extension = os.path.splitext(filename)
+    return f"{base}.{os.getpid()}{extension}"
+
+# Start exporting this process's metrics
+def start_metrics_export(port=None, snapshot_file=None):
+    """Serve the metrics for Prometheus on port and/or dump them to snapshot_file periodically."""
+    global _metrics_writer
+    if port:
+        start_metrics_server(METRICS, port)
+        log_event('info', 'metrics_server', f"Serving metrics on http://127.0.0.1:{port}/metrics", port=port)
+    # A forked worker inherits the parent's writer, but not its thread
+    if snapshot_file and (_metrics_writer is None or _metrics_writer[0] != os.getpid()):
+        writer = SnapshotWriter(METRICS, snapshot_file, METRICS_SNAPSHOT_SECONDS)
+        writer.start()
+        _metrics_writer = (os.getpid(), writer)
+        # Also covers the sys.exit in save_and_exit
+        atexit.register(flush_metrics)
+
+# Write the metrics snapshot now instead of at the next interval
+def flush_metrics():
+    if _metrics_writer is not None and _metrics_writer[0] == os.getpid():
+        _metrics_writer[1].write()
 
-# More efficient fetch_page function that uses requests.Session for connection pooling
-def fetch_page(url, max_retries=3, session=None):
-    """Fetch a page with proper error handling and logging."""
+# Profile the rest of this process's run
+def start_profiling(mode='sample', output_dir=PROFILE_DIR):
+    """Start a CrawlProfiler that writes its results when the process exits, also through save_and_exit."""
+    global _profiler
+    _profiler = CrawlProfiler(output_dir, mode, PROFILE_SAMPLE_INTERVAL, PROFILE_MEMORY_INTERVAL).start()
+    atexit.register(stop_profiling)
+    log_event('info', 'profiling', f"Profiling ({mode}) into {output_dir}", mode=mode, dir=output_dir)
+
+# Memory snapshot at a checkpoint, when profiling
+def profile_checkpoint():
+    if _profiler is not None:
+        _profiler.checkpoint()
+
+# Write the profile gathered so far, without stopping
+def write_profile():
+    if _profiler is not None:
+        _profiler.write()
+
+# Stop profiling and report where the time went
+def stop_profiling():
+    breakdown = _profiler.stop() if _profiler is not None else None
+    if not breakdown:
+        return
+    busy = ', '.join(f"{stage} {values['share']:.0%}" for stage, values in breakdown.items()
+                     if values['share'] is not None)
+    log_event('info', 'profile_written', f"Time by stage (busy thread samples): {busy}. "
+              f"Profile written to {_profiler.output_dir}", dir=_profiler.output_dir, stages=breakdown)
+
+# Hand a company record to its output sink
+def write_company(sink, company_data):
+    sink.write(company_data)
+    ROWS_WRITTEN.inc(state=company_data.get('state'))
+
+# Publish how far the crawl of a state has got
+def update_eta(state_display, eta, done, total):
+    """Set the progress gauges and return the estimated seconds left (None if unknown)."""
+    STATE_ENTRIES.set(total, state=state_display, kind='total')
+    STATE_ENTRIES.set(done, state=state_display, kind='done')
+    seconds = eta.update(done, total)
+    if seconds is not None:
+        STATE_ETA.set(round(seconds), state=state_display)
+    return seconds
+
+# Hand a proxy back to the pool with the outcome of its request
+def release_proxy(pool, proxy, url, status_code=None, elapsed=None, retry_after=None):
+    """Update the proxy's health, quarantining it after a 403 or 429."""
+    quarantine = pool.release(proxy, status_code, elapsed, parse_retry_after(retry_after))
+    PROXY_RESPONSES.inc(proxy=proxy.label, status='error' if status_code is None else status_code)
+    PROXIES_QUARANTINED.set(pool.quarantined())
+    if quarantine:
+        log_event('warning', 'proxy_quarantined', f"Quarantined proxy {proxy.label} for {quarantine:.0f} seconds "
+                  f"after a {status_code} from {url}", url=url, proxy=proxy.label, status=status_code,
+                  seconds=round(quarantine))
+
+# Feed the outcome of a request into the host's circuit breaker
+def record_host_outcome(url, ok):
+    """Report a request to the circuit breaker and log when the host is paused or back."""
+    change = CIRCUIT_BREAKER.record(url, ok)
+    if change is None:
+        return
+    host = urlparse(url).netloc
+    if change == 'opened':
+        CIRCUITS_OPEN.set(1, host=host)
+        seconds = CIRCUIT_BREAKER.paused_for(url)
+        log_event('warning', 'circuit_opened', f"Pausing requests to {host} for {seconds:.0f} seconds after "
+                  "repeated failures, then probing it", host=host, seconds=round(seconds))
+    else:
+        CIRCUITS_OPEN.set(0, host=host)
+        log_event('info', 'circuit_closed', f"{host} is answering again, resuming requests", host=host)
+
+# Fetch a page through the response cache and the shared pooled HTTP client
+def fetch_page(url, max_retries=3, client=None, max_age=None):
+    """Fetch a page with proper error handling and logging.
+    
+    max_age overrides the cache TTL; 0 always asks the server (conditionally).
+    Raises FetchFailed once max_retries attempts failed, or straight away
+    for a client error that another attempt would not fix.
+    """
     headers = get_headers()
     
-    # Use an existing session or create a new one for connection pooling
-    if session is None:
-        session = requests.Session()
+    # Reuse pooled keep-alive connections instead of a new handshake per request
+    if client is None:
+        client = HTTP_CLIENT
+    
+    url_class = classify_url(url)
+    
+    # Fresh cached pages skip the network and the rate limiter entirely
+    cache = get_response_cache()
+    cached = cache.lookup(url, max_age) if cache is not None else None
+    if cached is not None:
+        if cached.fresh:
+            CACHE_LOOKUPS.inc(result='hit')
+            log_event('debug', 'cache_hit', f"Cache hit: {url}", url=url)
+            return cached.body
+        # Stale: ask the server whether it changed
+        CACHE_LOOKUPS.inc(result='stale')
+        headers.update(cached.conditional_headers())
+    elif cache is not None:
+        CACHE_LOOKUPS.inc(result='miss')
+    
+    pool = get_proxy_pool()
+    failure = None
     
     for attempt in range(max_retries):
+        # Jittered exponential backoff between attempts; another proxy is tried straight away
+        if failure is not None and failure.reason != 'proxy_banned':
+            wait_time = backoff_delay(attempt - 1, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, RETRY_JITTER)
+            log_event('info', 'retry_wait', f"Waiting {wait_time:.1f} seconds before retrying...",
+                      url=url, seconds=round(wait_time, 1))
+            time.sleep(wait_time)
+            SLEEP_SECONDS.inc(wait_time, reason='retry_backoff')
+        
+        # A host that keeps failing is paused until a probe request gets through
+        SLEEP_SECONDS.inc(CIRCUIT_BREAKER.wait(url), reason='circuit_open')
+        
+        # Every attempt goes out through a healthy proxy when there is a pool
+        proxy = pool.acquire() if pool is not None else None
+        via = proxy.label if proxy is not None else None
+        status_code = elapsed = retry_after = None
+        host_ok = False  # Whether the host answered the way a healthy host does
         try:
-            print(f"Fetching: {url} (attempt {attempt+1}/{max_retries})")
+            # Wait for the rate limiter before every attempt
+            SLEEP_SECONDS.inc(RATE_LIMITER.wait(url, via=via), reason='politeness')
+            response = client.get(url, headers=headers, proxies=proxy.proxies() if proxy is not None else None)
+            status_code = response.status_code
+            retry_after = response.headers.get('Retry-After')
+            elapsed = response.timing.total
+            REQUEST_LATENCY.observe(elapsed, url_class=url_class)
+            RESPONSES.inc(url_class=url_class, status=response.status_code)
+            log_event('debug', 'request', f"Fetched {url} (attempt {attempt+1}/{max_retries}): "
+                      f"{response.status_code} in {elapsed:.3f}s", url=url, attempt=attempt + 1,
+                      status=response.status_code, elapsed=round(elapsed, 4), timing=str(response.timing), proxy=via)
+            
+            # Check for CAPTCHA or other blocking indicators in content
+            lower_content = response.content.lower()
+            blocked = b'captcha' in lower_content or b'blocked' in lower_content or b'rate limit' in lower_content
+            
+            # Let the rate limiter adapt to how the server is coping
+            rate = RATE_LIMITER.record_response(url, response.status_code, elapsed, blocked, retry_after, via=via)
             
-            response = session.get(url, headers=headers, timeout=15)
+            # Not modified since we cached it
+            if response.status_code == 304 and cached is not None:
+                host_ok = True
+                log_event('debug', 'not_modified', f"Not modified: {url}", url=url)
+                cache.revalidated(url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                return cached.body
+            
+            # A banned proxy is quarantined and the request moves on to another one
+            if response.status_code == 403 and proxy is not None:
+                host_ok = True
+                log_event('warning', 'proxy_banned', f"Received 403 Forbidden from {url} through proxy {via}, "
+                          "retrying through another proxy", url=url, status=403, proxy=via)
+                save_blocked_page(url, response.content, response.status_code, headers, force_save=True)
+                failure = FetchFailed(url, 'proxy_banned', 403)
+                if attempt < max_retries - 1:
+                    RETRIES.inc(url_class=url_class, reason='403')
+                continue
             
-            # Check for blocking responses
+            # Check for blocking responses; the circuit breaker pauses the host if they keep coming
             if response.status_code == 403:
-                print(f"CRITICAL: Received 403 Forbidden response from {url}")
-                print("The scraper appears to be banned or rate-limited.")
+                log_event('critical', 'forbidden', f"Received 403 Forbidden response from {url}. "
+                          "The scraper appears to be banned or rate-limited.", url=url, status=403)
                 # Save the blocked page content
                 save_blocked_page(url, response.content, response.status_code, headers, force_save=True)
-                raise ScraperError("Received 403 Forbidden error. Progress saved for resuming in a new session.")
+                failure = FetchFailed(url, 'forbidden', 403)
+                if attempt < max_retries - 1:
+                    RETRIES.inc(url_class=url_class, reason='403')
+                continue
             
             # Check for rate limiting
             if response.status_code == 429:
-                print(f"CRITICAL: Rate limited on {url}")
+                host_ok = proxy is not None
+                log_event('critical', 'rate_limited', f"Rate limited on {url}", url=url, status=429, proxy=via)
                 save_blocked_page(url, response.content, response.status_code, headers, force_save=True)
-                # Wait longer before retrying
-                wait_time = 30 * (attempt + 1)
-                print(f"Waiting {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
+                # The rate limiter holds the next attempt back (honouring Retry-After)
+                log_event('warning', 'backoff', f"Backing off to {rate:.2f} requests/s, pausing "
+                          f"{RATE_LIMITER.paused_for(url, via=via):.0f} seconds before retrying...",
+                          url=url, rate=round(rate, 3), proxy=via)
+                failure = FetchFailed(url, 'rate_limited', 429, retry_after=parse_retry_after(retry_after))
+                if attempt < max_retries - 1:
+                    RETRIES.inc(url_class=url_class, reason='429')
                 continue
                 
             # Also check for other non-200 responses
             if response.status_code != 200:
-                print(f"WARNING: Received non-200 status code: {response.status_code} from {url}")
+                log_event('warning', 'bad_status', f"Received non-200 status code: {response.status_code} from {url}",
+                          url=url, status=response.status_code)
                 save_blocked_page(url, response.content, response.status_code, headers)
                 
-                # For severe errors, treat as blocking
-                if response.status_code >= 400:  # Client or Server errors
-                    raise ScraperError(f"Received error status code: {response.status_code}. Progress saved.")
+                # Server errors may pass, so they are retried
+                if response.status_code >= 500:
+                    failure = FetchFailed(url, f"status_{response.status_code}", response.status_code)
+                    if attempt < max_retries - 1:
+                        RETRIES.inc(url_class=url_class, reason=str(response.status_code))
+                    continue
+                # Another attempt will not change a 404 or other client error
+                if response.status_code >= 400:
+                    host_ok = True
+                    failure = FetchFailed(url, f"status_{response.status_code}", response.status_code,
+                                          retryable=False)
+                    break
             
-            # Check for CAPTCHA or other blocking indicators in content
-            lower_content = response.content.lower()
-            if b'captcha' in lower_content or b'blocked' in lower_content or b'rate limit' in lower_content:
-                print(f"WARNING: Possible CAPTCHA or blocking detected in response content")
+            host_ok = True
+            if blocked:
+                log_event('warning', 'captcha', "Possible CAPTCHA or blocking detected in response content", url=url)
                 save_blocked_page(url, response.content, response.status_code, headers, force_save=True)
             
             # Success path - save HTML for debugging pagination only when there's a failure
@@ -289,13 +771,16 @@ def fetch_page(url, max_retries=3, session=None):
                 save_blocked_page(url, response.content, response.status_code, headers, 
                               "Page 6 debug content (successful response)", force_save=True)
             
+            if cache is not None and response.status_code == 200 and not blocked:
+                cache.store(url, response.content, response.headers.get('ETag'),
+                            response.headers.get('Last-Modified'))
+            
             return response.content
                 
         except requests.exceptions.RequestException as e:
-            print(f"Request error (attempt {attempt+1}/{max_retries}): {str(e)}")
-            
-            # For connection errors, retry after waiting
-            wait_time = 5 * (attempt + 1)
+            log_event('warning', 'request_error', f"Request error (attempt {attempt+1}/{max_retries}): {str(e)}",
+                      url=url, attempt=attempt + 1, proxy=via)
+            RATE_LIMITER.record_response(url, via=via)
             
             if isinstance(e, requests.exceptions.Timeout):
                 error_type = "TIMEOUT"
@@ -305,6 +790,8 @@ def fetch_page(url, max_retries=3, session=None):
                 error_type = "TOO_MANY_REDIRECTS"
             else:
                 error_type = "REQUEST_EXCEPTION"
+            RESPONSES.inc(url_class=url_class, status=error_type.lower())
+            failure = FetchFailed(url, error_type.lower())
                 
             # Save error info for the last attempt
             if attempt == max_retries - 1:
@@ -317,49 +804,57 @@ def fetch_page(url, max_retries=3, session=None):
                 else:
                     # No response available, just save error info
                     save_blocked_page(url, None, None, headers, error_message, force_save=True)
-            
-            # Sleep before retrying
-            print(f"Waiting {wait_time} seconds before retrying...")
-            time.sleep(wait_time)
+            else:
+                RETRIES.inc(url_class=url_class, reason=error_type.lower())
             
         except Exception as e:
-            print(f"Unexpected error fetching URL: {str(e)}")
+            log_event('error', 'fetch_error', f"Unexpected error fetching URL: {str(e)}", url=url, exc_info=True)
+            failure = FetchFailed(url, 'unexpected')
             # On the last attempt, save the error
             if attempt == max_retries - 1:
                 save_blocked_page(url, None, None, headers, f"UNEXPECTED: {str(e)}", force_save=True)
+        
+        finally:
+            record_host_outcome(url, host_ok)
+            if proxy is not None:
+                release_proxy(pool, proxy, url, status_code, elapsed, retry_after)
             
     # If we get here, all retries failed
-    print(f"Failed to fetch {url} after {max_retries} attempts")
-    return None
+    log_event('error', 'fetch_failed', f"Failed to fetch {url} after {attempt + 1} attempts ({failure.reason})",
+              url=url, attempts=attempt + 1, reason=failure.reason)
+    raise failure
 
 # Load progress data
-def load_progress():
+def load_progress(progress_file=None, backup_file=None):
     """Load progress data with improved error handling and backup restoration."""
+    progress_file = progress_file or PROGRESS_FILE
+    backup_file = backup_file or PROGRESS_BACKUP_FILE
+    
     progress_data = {
         'current_state_index': START_STATE_INDEX,
         'current_page': 0,
-        'timestamp': datetime.now().isoformat(),
-        'processed_companies': {}
+        'timestamp': datetime.now().isoformat()
     }
     
     # Try to load the main progress file
     try:
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
+        if os.path.exists(progress_file):
+            with open(progress_file, 'r') as f:
                 progress_data = json.load(f)
-                debug_print(f"Loaded progress data from {PROGRESS_FILE}")
+                log_event('debug', 'progress_loaded', f"Loaded progress data from {progress_file}", file=progress_file)
                 return progress_data
     except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
-        print(f"Error loading progress file: {str(e)}")
+        log_event('error', 'progress_error', f"Error loading progress file: {str(e)}", file=progress_file)
         # If main file failed, try to load from backup
-        if os.path.exists(PROGRESS_BACKUP_FILE):
+        if os.path.exists(backup_file):
             try:
-                with open(PROGRESS_BACKUP_FILE, 'r') as f:
+                with open(backup_file, 'r') as f:
                     progress_data = json.load(f)
-                    print(f"Restored progress from backup file {PROGRESS_BACKUP_FILE}")
+                    log_event('warning', 'progress_restored', f"Restored progress from backup file {backup_file}",
+                              file=backup_file)
                     return progress_data
             except Exception as e2:
-                print(f"Error loading backup progress file: {str(e2)}")
+                log_event('error', 'progress_error', f"Error loading backup progress file: {str(e2)}", file=backup_file)
     
     return progress_data
 
@@ -385,117 +880,121 @@ def save_progress(progress_data, atomic=True):
             
             # Rename temp file to the actual progress file
             os.rename(temp_file, PROGRESS_FILE)
-            debug_print(f"Progress saved successfully to {PROGRESS_FILE}")
+            log_event('debug', 'progress_saved', f"Progress saved successfully to {PROGRESS_FILE}", file=PROGRESS_FILE)
             
         except Exception as e:
-            print(f"Error during atomic progress save: {str(e)}")
+            log_event('error', 'progress_error', f"Error during atomic progress save: {str(e)}", file=PROGRESS_FILE)
             # Fall back to direct save if atomic save fails
             try:
                 with open(PROGRESS_FILE, 'w') as f:
                     json.dump(progress_data, f, indent=2)
             except Exception as e2:
-                print(f"Critical error: Could not save progress: {str(e2)}")
+                log_event('critical', 'progress_error', f"Could not save progress: {str(e2)}", file=PROGRESS_FILE)
     else:
         # Direct save without atomic pattern
         try:
             with open(PROGRESS_FILE, 'w') as f:
                 json.dump(progress_data, f, indent=2)
         except Exception as e:
-            print(f"Error saving progress: {str(e)}")
+            log_event('error', 'progress_error', f"Error saving progress: {str(e)}", file=PROGRESS_FILE)
 
 # Load processed companies
 def load_processed_companies():
-    """Load the set of already processed company IDs."""
-    processed = set()
-    
-    if os.path.exists(PROCESSED_COMPANIES_FILE):
-        try:
-            with open(PROCESSED_COMPANIES_FILE, 'r') as f:
-                company_data = json.load(f)
-                processed = set(company_data.get('ids', []))
-                debug_print(f"Loaded {len(processed)} processed companies from cache file")
-        except Exception as e:
-            print(f"Error loading company cache: {str(e)}")
+    """Open the store of already processed company IDs."""
+    store = ProcessedStore(PROCESSED_COMPANIES_DB)
     
-    # Also check the main progress file for company IDs
-    progress = load_progress()
-    if 'processed_companies' in progress:
-        if isinstance(progress['processed_companies'], dict):
-            # New format where we store timestamps
-            for company_id in progress['processed_companies']:
-                processed.add(company_id)
-        elif isinstance(progress['processed_companies'], list):
-            # Old format was just a list
-            processed.update(set(progress['processed_companies']))
+    # One-time import of IDs saved by older versions of the scraper; the
+    # progress file is only read for that while the store is still empty
+    if store.is_empty():
+        progress = load_progress()
+        if os.path.exists(PROCESSED_COMPANIES_FILE) or progress.get('processed_companies'):
+            imported = store.import_legacy(PROCESSED_COMPANIES_FILE, progress)
+            log_event('info', 'processed_imported', f"Imported {imported} processed companies into {PROCESSED_COMPANIES_DB}",
+                      count=imported)
     
-    return processed
+    log_event('debug', 'processed_opened', f"Opened processed company store {PROCESSED_COMPANIES_DB}")
+    return store
+
+# Open the list of companies whose details could not be fetched
+def open_dead_letters():
+    """Open the dead-letter store."""
+    return DeadLetterStore(DEAD_LETTER_DB)
 
 # Save processed companies
 def save_processed_companies(processed_companies, progress_data=None):
-    """Save the set of processed company IDs with timestamps."""
+    """Commit newly processed company IDs, then the progress data if given."""
     try:
-        # Ensure we have a JSON-serializable format
-        if isinstance(processed_companies, set):
-            # Convert set to dict with timestamps
-            now = datetime.now().isoformat()
-            companies_dict = {company_id: now for company_id in processed_companies}
-        elif isinstance(processed_companies, list):
-            # Convert list to dict with timestamps
-            now = datetime.now().isoformat()
-            companies_dict = {company_id: now for company_id in processed_companies}
-        else:
-            # Assume it's already a dict
-            companies_dict = processed_companies
-        
-        # Update the main progress data
+        # Progress goes first: if we crash in between, the output offset is
+        # already durable and the uncommitted companies are simply fetched again
         if progress_data is not None:
-            progress_data['processed_companies'] = companies_dict
+            # IDs live in the processed store now, not in the progress file
+            progress_data.pop('processed_companies', None)
             save_progress(progress_data)
         
-        # Also save to dedicated cache file for faster loading
-        with open(PROCESSED_COMPANIES_FILE, 'w') as f:
-            json.dump({'ids': list(companies_dict.keys()), 
-                      'timestamp': datetime.now().isoformat()}, 
-                     f, indent=2)
+        processed_companies.commit()
     except Exception as e:
-        print(f"Error saving company cache: {str(e)}")
+        log_event('error', 'processed_error', f"Error saving processed companies: {str(e)}")
+
+# Commit the output sink and remember how far it is durable
+def commit_output(sink, progress_data):
+    """Fsync the output sink, recording its committed offset next to the file."""
+    offset = sink.commit()
+    # The offset used to be kept in each mode's progress file; the file's own record replaces it
+    offsets = progress_data.get('output_offsets')
+    if offsets:
+        offsets.pop(sink.path, None)
+        if not offsets:
+            del progress_data['output_offsets']
+    return offset
+
+# Commit output, crawl cursor and processed IDs as one checkpoint
+def commit_checkpoint(sink, processed_companies, progress_data, policy=None, dead_letters=None):
+    """Make everything handled so far durable and record where to resume."""
+    with CHECKPOINT_LATENCY.time():
+        offset = commit_output(sink, progress_data)
+        save_processed_companies(processed_companies, progress_data)
+        # Companies saved after all come off the list only once their records are durable
+        if dead_letters is not None:
+            dead_letters.commit()
+    profile_checkpoint()
+    if policy is not None:
+        policy.committed()
+    log_event('debug', 'checkpoint', f"Checkpoint: page {progress_data.get('current_page')}, "
+              f"position {progress_data.get('current_position', 0)}, offset {offset}",
+              page=progress_data.get('current_page'), position=progress_data.get('current_position', 0),
+              offset=offset)
 
 # Function to perform a clean shutdown, saving all progress
-def save_and_exit(progress_data, processed_companies, exit_code=0, message="Scraper stopped"):
+def save_and_exit(progress_data, processed_companies, exit_code=0, message="Scraper stopped", sink=None):
     """Save all progress and exit cleanly."""
-    print(f"\n{message}")
+    log_event('warning' if exit_code else 'info', 'shutdown', message, exit_code=exit_code)
     
     try:
-        # Convert processed_companies to a serializable format if it's a set
-        if isinstance(processed_companies, set):
-            now = datetime.now().isoformat()
-            processed_companies_dict = {company_id: now for company_id in processed_companies}
-            processed_companies = processed_companies_dict
-        
-        # Update processed companies in the progress data
-        progress_data['processed_companies'] = processed_companies
-        
-        # Save progress one last time
-        save_progress(progress_data)
+        # Make buffered output durable first so the saved offset covers it
+        if sink is not None:
+            commit_output(sink, progress_data)
+            sink.close()
         
-        # Save processed companies separately
-        save_processed_companies(processed_companies)
+        # Save progress and processed companies one last time
+        save_processed_companies(processed_companies, progress_data)
     except Exception as e:
-        print(f"Error during shutdown: {e}")
+        log_event('error', 'shutdown_error', f"Error during shutdown: {e}")
         try:
             # Try a simpler save with minimal data
             minimal_progress = {
                 'timestamp': datetime.now().isoformat(),
                 'error_during_shutdown': str(e),
                 'current_state_index': progress_data.get('current_state_index'),
-                'current_page': progress_data.get('current_page')
+                'current_page': progress_data.get('current_page'),
+                'current_position': progress_data.get('current_position', 0)
             }
             with open(PROGRESS_FILE, 'w') as f:
                 json.dump(minimal_progress, f)
         except:
-            print("Critical failure: Could not save even minimal progress")
+            log_event('critical', 'shutdown_error', "Could not save even minimal progress")
     
-    print(f"Progress saved. Exiting with code {exit_code}.")
+    log_event('info', 'shutdown', f"Progress saved. Exiting with code {exit_code}.", exit_code=exit_code)
+    flush_event_log()
     sys.exit(exit_code)
 
 # Extract company ID from URL
@@ -510,133 +1009,202 @@ def extract_company_id(url):
         return match.group(1)
     return None
 
+# Build a label -> value cell index for the company details table
+def index_detail_cells(details_section):
+    """Walk the details table once and map each field to its value cell.
+
+    Mirrors the 'td:-soup-contains("Label") + td' selectors: a value cell is
+    a td whose previous sibling element is a td containing the label, and the
+    first such cell in document order wins. Label-like cells that match no
+    known label are counted in UNKNOWN_DETAIL_LABELS.
+    """
+    cells = {}
+    remaining = dict(DETAIL_LABELS)
+    
+    for td in details_section.find_all('td'):
+        # Previous sibling element (skipping whitespace between tags)
+        label_cell = None
+        for sibling in td.previous_siblings:
+            if getattr(sibling, 'name', None):
+                label_cell = sibling if sibling.name == 'td' else None
+                break
+        if label_cell is None:
+            continue
+        
+        label_text = label_cell.get_text()
+        matched = False
+        for key, label in DETAIL_LABELS.items():
+            if label in label_text:
+                matched = True
+                if key in remaining:
+                    cells[key] = td
+                    del remaining[key]
+        
+        # Short 'Something:' cells followed by a value are labels we do not know yet
+        if not matched:
+            label_text = label_text.strip()
+            if label_text.endswith(':') and len(label_text) <= 40:
+                if label_text not in UNKNOWN_DETAIL_LABELS:
+                    log_event('debug', 'unknown_label', f"Unknown label on company details page: {label_text!r}",
+                              label=label_text)
+                UNKNOWN_DETAIL_LABELS[label_text] += 1
+    
+    return cells
+
+# Fill company_data from the value cells of the details table
+def fill_company_fields(company_data, cells):
+    """Extract every field from its value cell (cells maps selector key -> td)."""
+    # Extract company name
+    name_field = cells.get('company_name')
+    if name_field:
+        h2_tag = name_field.select_one('h2')
+        if h2_tag:
+            company_data['name'] = h2_tag.text.strip()
+        else:
+            company_data['name'] = name_field.text.strip()
+    
+    # Extract address details
+    street_field = cells.get('company_street')
+    if street_field:
+        a_tag = street_field.select_one('a')
+        if a_tag:
+            company_data['street'] = a_tag.text.strip()
+        else:
+            company_data['street'] = street_field.text.strip()
+    
+    # Extract zipcode and city
+    zipcode_field = cells.get('company_zipcode')
+    if zipcode_field:
+        # The HTML structure has two links: one for zipcode and one for city
+        plz_link = zipcode_field.select_one('a')
+        city_link = zipcode_field.select_one('a:nth-of-type(2)')
+        
+        if plz_link:
+            company_data['zipcode'] = plz_link.text.strip()
+        
+        if city_link:
+            company_data['city'] = city_link.text.strip()
+        
+        # If structured extraction fails, try basic regex
+        if not company_data['zipcode'] or not company_data['city']:
+            zipcode_text = zipcode_field.text.strip()
+            match = re.match(r'(\d{5})\s+(.*)', zipcode_text)
+            if match:
+                company_data['zipcode'] = match.group(1)
+                company_data['city'] = match.group(2)
+    
+    # Extract phone
+    phone_field = cells.get('company_phone')
+    if phone_field:
+        company_data['phone'] = phone_field.text.strip()
+    
+    # Extract fax
+    fax_field = cells.get('company_fax')
+    if fax_field:
+        company_data['fax'] = fax_field.text.strip()
+    
+    # Extract mobile
+    mobile_field = cells.get('company_mobile')
+    if mobile_field:
+        company_data['mobile'] = mobile_field.text.strip()
+    
+    # Extract email
+    email_field = cells.get('company_email_detail')
+    if email_field:
+        email_link = email_field.select_one('a')
+        if email_link:
+            company_data['email'] = email_link.text.strip()
+        else:
+            company_data['email'] = email_field.text.strip()
+    
+    # Extract website
+    website_field = cells.get('company_website_detail')
+    if website_field:
+        website_link = website_field.select_one('a')
+        if website_link:
+            company_data['website'] = website_link.text.strip()
+        else:
+            company_data['website'] = website_field.text.strip()
+    
+    # Extract contact person
+    contact_field = cells.get('company_contact')
+    if contact_field:
+        company_data['contact_person'] = contact_field.text.strip()
+    
+    # Extract products/info
+    products_field = cells.get('company_products_info')
+    if products_field:
+        company_data['products_info'] = products_field.text.strip()
+    
+    # Extract industry
+    industry_field = cells.get('company_industry')
+    if industry_field:
+        h2_tag = industry_field.select_one('h2')
+        if h2_tag:
+            # Replace <br> with newlines for better formatting
+            for br in h2_tag.find_all('br'):
+                br.replace_with('\n')
+            company_data['industry'] = h2_tag.text.strip()
+        else:
+            company_data['industry'] = industry_field.text.strip()
+    
+    return company_data
+
+# Company record with one slot per output column
+class CompanyRecord(Record):
+    __slots__ = tuple(COMPANY_FIELDS)
+    interned = frozenset(INTERNED_FIELDS)
+
+# Empty record for a company
+def new_company_data(company_id, state):
+    """Company record with every field present and empty."""
+    company_data = CompanyRecord()
+    company_data['company_id'] = company_id
+    company_data['state'] = state
+    company_data['scrape_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return company_data
+
 # Parse company details from the details page
 def parse_company_details(soup, company_id, state):
-    """Extract company details from the company details page."""
-    company_data = {
-        'company_id': company_id,
-        'state': state,
-        'name': '',
-        'street': '',
-        'zipcode': '',
-        'city': '',
-        'phone': '',
-        'fax': '',
-        'mobile': '',
-        'email': '',
-        'website': '',
-        'contact_person': '',
-        'products_info': '',
-        'industry': '',
-        'scrape_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+    """Extract company details from the company details page in a single pass."""
+    company_data = new_company_data(company_id, state)
     
     try:
         # Find the company details section (tbody containing all company info)
         details_section = soup.select_one(SELECTORS['company_details'])
         
         if not details_section:
-            debug_print(f"Company details section not found for company ID {company_id}")
+            log_event('debug', 'details_missing', f"Company details section not found for company ID {company_id}",
+                      company_id=company_id, state=state)
             return None
         
-        # Extract company name
-        name_field = details_section.select_one(SELECTORS['company_name'])
-        if name_field:
-            h2_tag = name_field.select_one('h2')
-            if h2_tag:
-                company_data['name'] = h2_tag.text.strip()
-            else:
-                company_data['name'] = name_field.text.strip()
-        
-        # Extract address details
-        street_field = details_section.select_one(SELECTORS['company_street'])
-        if street_field:
-            a_tag = street_field.select_one('a')
-            if a_tag:
-                company_data['street'] = a_tag.text.strip()
-            else:
-                company_data['street'] = street_field.text.strip()
-        
-        # Extract zipcode and city
-        zipcode_field = details_section.select_one(SELECTORS['company_zipcode'])
-        if zipcode_field:
-            # The HTML structure has two links: one for zipcode and one for city
-            plz_link = zipcode_field.select_one('a')
-            city_link = zipcode_field.select_one('a:nth-of-type(2)')
-            
-            if plz_link:
-                company_data['zipcode'] = plz_link.text.strip()
-            
-            if city_link:
-                company_data['city'] = city_link.text.strip()
-            
-            # If structured extraction fails, try basic regex
-            if not company_data['zipcode'] or not company_data['city']:
-                zipcode_text = zipcode_field.text.strip()
-                match = re.match(r'(\d{5})\s+(.*)', zipcode_text)
-                if match:
-                    company_data['zipcode'] = match.group(1)
-                    company_data['city'] = match.group(2)
-        
-        # Extract phone
-        phone_field = details_section.select_one(SELECTORS['company_phone'])
-        if phone_field:
-            company_data['phone'] = phone_field.text.strip()
-        
-        # Extract fax
-        fax_field = details_section.select_one(SELECTORS['company_fax'])
-        if fax_field:
-            company_data['fax'] = fax_field.text.strip()
-        
-        # Extract mobile
-        mobile_field = details_section.select_one(SELECTORS['company_mobile'])
-        if mobile_field:
-            company_data['mobile'] = mobile_field.text.strip()
-        
-        # Extract email
-        email_field = details_section.select_one(SELECTORS['company_email_detail'])
-        if email_field:
-            email_link = email_field.select_one('a')
-            if email_link:
-                company_data['email'] = email_link.text.strip()
-            else:
-                company_data['email'] = email_field.text.strip()
-        
-        # Extract website
-        website_field = details_section.select_one(SELECTORS['company_website_detail'])
-        if website_field:
-            website_link = website_field.select_one('a')
-            if website_link:
-                company_data['website'] = website_link.text.strip()
-            else:
-                company_data['website'] = website_field.text.strip()
-        
-        # Extract contact person
-        contact_field = details_section.select_one(SELECTORS['company_contact'])
-        if contact_field:
-            company_data['contact_person'] = contact_field.text.strip()
-        
-        # Extract products/info
-        products_field = details_section.select_one(SELECTORS['company_products_info'])
-        if products_field:
-            company_data['products_info'] = products_field.text.strip()
+        return fill_company_fields(company_data, index_detail_cells(details_section))
+    
+    except Exception as e:
+        log_event('error', 'parse_error', f"Error parsing company details for {company_id}: {str(e)}",
+                  company_id=company_id, state=state)
+        return None
+
+# Selector-based version of parse_company_details, kept as the reference
+# implementation for benchmarks and output comparisons
+def parse_company_details_by_selectors(soup, company_id, state):
+    """Extract company details using one CSS selector per field."""
+    company_data = new_company_data(company_id, state)
+    
+    try:
+        details_section = soup.select_one(SELECTORS['company_details'])
         
-        # Extract industry
-        industry_field = details_section.select_one(SELECTORS['company_industry'])
-        if industry_field:
-            h2_tag = industry_field.select_one('h2')
-            if h2_tag:
-                # Replace <br> with newlines for better formatting
-                for br in h2_tag.find_all('br'):
-                    br.replace_with('\n')
-                company_data['industry'] = h2_tag.text.strip()
-            else:
-                company_data['industry'] = industry_field.text.strip()
+        if not details_section:
+            log_event('debug', 'details_missing', f"Company details section not found for company ID {company_id}",
+                      company_id=company_id, state=state)
+            return None
         
-        return company_data
+        cells = {key: details_section.select_one(SELECTORS[key]) for key in DETAIL_LABELS}
+        return fill_company_fields(company_data, cells)
     
     except Exception as e:
-        print(f"Error parsing company details for {company_id}: {str(e)}")
+        log_event('error', 'parse_error', f"Error parsing company details for {company_id}: {str(e)}",
+                  company_id=company_id, state=state)
         return None
 
 #############################################
@@ -645,7 +1213,7 @@ def parse_company_details(soup, company_id, state):
 
 def get_companies_from_page(html_content, state):
     """Extract company links and basic info from a search results page."""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = as_document(html_content, HTML_PARSER).soup
     companies = []
     
     # Find all company rows
@@ -714,14 +1282,17 @@ def get_companies_from_page(html_content, state):
 # Completely rewritten pagination detection function that focuses on solving page 6 issue
 def get_pagination_info(html_content, page_num, url):
     """Extract pagination information with improved detection of next page links."""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    document = as_document(html_content, HTML_PARSER)
+    soup = document.soup
+    html_content = document.content
     
     # Always save page 5 HTML for debugging
     if page_num == 5:
         debug_file = f"{BLOCKED_PAGES_DIR}/page6_pagination_debug_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
         with open(debug_file, 'wb') as f:
             f.write(html_content)
-        print(f"Saved page 6 HTML for pagination debugging to {debug_file}")
+        log_event('debug', 'pagination_debug_saved', f"Saved page 6 HTML for pagination debugging to {debug_file}",
+                  url=url, page=page_num, file=debug_file)
     
     # Check for total entries information
     total_entries = 0
@@ -730,7 +1301,8 @@ def get_pagination_info(html_content, page_num, url):
         entries_match = re.search(r'(\d+)\s+Einträge gefunden', entries_info.text)
         if entries_match:
             total_entries = int(entries_match.group(1))
-            print(f"Found {total_entries} total entries")
+            log_event('debug', 'total_entries', f"Found {total_entries} total entries",
+                      url=url, page=page_num, total_entries=total_entries)
     
     # Get next page link - FIXED APPROACH checking all pagination links
     next_page_url = None
@@ -740,7 +1312,9 @@ def get_pagination_info(html_content, page_num, url):
     pagination_links = soup.select(SELECTORS['pagination'])
     
     if not pagination_links and page_num > 0:
-        print(f"WARNING: No pagination links found on page {page_num+1}. Saving HTML for inspection.")
+        log_event('warning', 'pagination_missing',
+                  f"No pagination links found on page {page_num+1}. Saving HTML for inspection.",
+                  url=url, page=page_num)
         save_blocked_page(url, html_content, 200, None, f"No pagination links on page {page_num+1}", force_save=True)
         
     # Get all page numbers from pagination
@@ -767,7 +1341,8 @@ def get_pagination_info(html_content, page_num, url):
     if page_numbers:
         # Sort page numbers and find the next one after current page
         page_numbers = sorted(set(page_numbers))
-        print(f"Found page numbers in pagination: {page_numbers}")
+        log_event('debug', 'pagination', f"Found page numbers in pagination: {page_numbers}",
+                  url=url, page=page_num, pages=page_numbers)
         
         # Find the next page number after current_page
         for p in page_numbers:
@@ -775,7 +1350,8 @@ def get_pagination_info(html_content, page_num, url):
                 next_page = p
                 # Construct the next page URL
                 next_page_url = re.sub(r'ap=\d+', f'ap={next_page}', url)
-                print(f"Found next page: {next_page+1}, URL: {next_page_url}")
+                log_event('debug', 'next_page', f"Found next page: {next_page+1}, URL: {next_page_url}",
+                          page=page_num, next_page=next_page, url=next_page_url)
                 break
     
     # If we couldn't find the next page but know there should be more pages
@@ -783,7 +1359,8 @@ def get_pagination_info(html_content, page_num, url):
         # Try constructing the next page URL directly
         next_page = current_page + 1
         next_page_url = re.sub(r'ap=\d+', f'ap={next_page}', url)
-        print(f"Constructed next page URL: {next_page_url}")
+        log_event('debug', 'next_page', f"Constructed next page URL: {next_page_url}",
+                  page=page_num, next_page=next_page, url=next_page_url, constructed=True)
         
     return {
         'total_entries': total_entries,
@@ -791,43 +1368,181 @@ def get_pagination_info(html_content, page_num, url):
         'next_page_url': next_page_url
     }
 
-def scrape_company_details(company_id, state, processed_companies):
-    """Fetch and parse details for a single company."""
-    if company_id in processed_companies:
-        debug_print(f"Company {company_id} already processed, skipping")
-        return None
-        
+# Fetch and parse a company details page without touching the processed set
+def fetch_company_details(company_id, state, max_age=None, max_retries=3):
+    """Fetch and parse details for a single company.
+
+    Returns a (fetched, company_data, error) tuple. fetched is True once the
+    page was downloaded, which is when the company counts as processed;
+    otherwise error is the exception, a FetchFailed if the fetch failed.
+    """
     # Construct URL to company details page
     detail_url = f"{BASE_URL}/register.php?cmd=anzeige&eid={company_id}"
     
     try:
         # Fetch company details page
-        content = fetch_page(detail_url)
-        if not content:
-            return None
+        content = fetch_page(detail_url, max_retries, max_age=max_age)
+        archive_page(detail_url, content, 'detail', state, company_id)
             
         # Parse company details
-        soup = BeautifulSoup(content, 'html.parser')
-        company_data = parse_company_details(soup, company_id, state)
-        
-        # Mark as processed
-        processed_companies.add(company_id)
-        
-        return company_data
+        with PARSE_LATENCY.time(page_type='detail'):
+            soup = parse_document(content, HTML_PARSER).soup
+            return True, parse_company_details(soup, company_id, state), None
     
     except Exception as e:
-        print(f"Error scraping company {company_id}: {str(e)}")
+        log_event('error', 'company_error', f"Error scraping company {company_id}: {str(e)}",
+                  company_id=company_id, state=state)
+        return False, None, e
+
+# Extract the fr search parameter from the pagination links
+def extract_fr_param(html_content):
+    """Get the fr parameter used by the pagination links, or None."""
+    soup = as_document(html_content, HTML_PARSER).soup
+    for link in soup.select(SELECTORS['pagination']):
+        href = link.get('href', '')
+        fr_match = re.search(r'fr=([^&]+)', href)
+        if fr_match:
+            return fr_match.group(1)
+    return None
+
+# Build the URL of a search results page
+def get_list_page_url(state, page, fr_param=None):
+    """URL of list page number page (0-based) for a state."""
+    if page == 0:
+        # First page URL
+        return f"{BASE_URL}/register.php?cmd=search&stichwort=&firma=&branche=&vonplz=&ort=&strasse=&vorwahl=&bundesland={state}&Suchen=Suchen"
+    if fr_param is None:
+        fr_param = get_fr_param_for_state(state)
+    return f"{BASE_URL}/register.php?cmd=mysearch&fr={fr_param}&auswahl=alle&ap={page}"
+
+# Fetch a search results page, with the fallback URL for page 6
+def fetch_list_page(url, page, state_display):
+    """Fetch a list page and return its content.
+    
+    Raises FetchFailed if it could not be fetched: a missing list page is a
+    failure to stop on, never the end of the state.
+    """
+    try:
+        return fetch_page(url)
+    except FetchFailed as e:
+        log_event('error', 'page_failed', f"Failed to fetch page {page+1} for state {state_display} ({e.reason})",
+                  state=state_display, page=page, url=url, reason=e.reason)
+        failure = e
+    
+    # Special handling for page 6 (when page=5)
+    if page == 5:
+        # Try an alternative URL construction for page 6
+        alt_url = f"{BASE_URL}/register.php?cmd=mysearch&auswahl=alle&ap=5"
+        log_event('info', 'page_retry', f"This is the troublesome page 6. Trying alternative URL: {alt_url}",
+                  state=state_display, page=page, url=alt_url)
+        try:
+            return fetch_page(alt_url)
+        except FetchFailed:
+            log_event('error', 'page_failed', "Alternative URL also failed. Saving debug info.",
+                      state=state_display, page=page, url=alt_url)
+            save_blocked_page(alt_url, b"", None, get_headers(), 
+                         "Alternative URL for page 6 failed", force_save=True)
+    
+    raise failure
+
+# Decide which list page comes after the current one
+def get_next_page(pagination, page):
+    """Return the next page number to fetch, or None when the state is done."""
+    if pagination['next_page_url']:
+        return page + 1
+    
+    # Double-check if we should have more pages based on entry count
+    if pagination['total_entries'] > (page + 1) * 10:
+        log_event('warning', 'pagination_mismatch',
+                  f"Pagination suggests there are no more pages, but total entries "
+                  f"({pagination['total_entries']}) suggests there should be more.",
+                  page=page, total_entries=pagination['total_entries'])
+        
+        # Special handling for page 6 onwards
+        if page >= 5:
+            log_event('info', 'next_page', "Attempting to continue with direct URL construction...",
+                      page=page, next_page=page + 1, constructed=True)
+            return page + 1
+    
+    return None
+
+# Fetch company details, sending failures to the retry queue and the dead-letter list
+def fetch_with_retries(fetcher, company_ids, retries, dead_letters, state_of):
+    """Yield (company_id, company_data) for every company whose page was fetched.
+    
+    A company whose fetch failed is put on the dead-letter list at once and,
+    while it has attempts left and the failure may pass, on the retry queue;
+    the caller hands retries.due() back in later. Companies that got through
+    are resolved on the dead-letter list. state_of maps an ID to its state.
+    """
+    for company_id, (fetched, company_data, error) in fetcher.fetch_many(company_ids):
+        if fetched:
+            retries.succeeded(company_id)
+            dead_letters.resolve(company_id)
+            yield company_id, company_data
+            continue
+        
+        state = state_of(company_id)
+        state_display = STATE_DISPLAY_NAMES.get(state, state)
+        reason = getattr(error, 'reason', 'parse_error')
+        dead_letters.add(company_id, state, str(error))
+        delay = retries.schedule(company_id, error.retry_after) if getattr(error, 'retryable', False) else None
+        if delay is None:
+            DEAD_LETTERS.inc(state=state_display)
+            log_event('warning', 'dead_letter', f"Giving up on company {company_id} for now ({reason}), "
+                      "it stays on the dead-letter list", company_id=company_id, state=state_display, reason=reason)
+        else:
+            RETRIES.inc(url_class='detail', reason=reason)
+            log_event('info', 'retry_scheduled', f"Retrying company {company_id} in {delay:.0f} seconds ({reason})",
+                      company_id=company_id, state=state_display, seconds=round(delay), reason=reason)
+
+def scrape_company_details(company_id, state, processed_companies):
+    """Fetch and parse details for a single company."""
+    if company_id in processed_companies:
+        log_event('debug', 'company_skipped', f"Company {company_id} already processed, skipping",
+                  company_id=company_id, state=state)
         return None
+    
+    fetched, company_data, _ = fetch_company_details(company_id, state)
+    
+    # Mark as processed
+    if fetched:
+        processed_companies.add(company_id)
+    
+    return company_data
 
 # Function to get the state output filename
 def get_state_filename(state):
     """Get the output filename for a state, using the display name mapping."""
     if state in STATE_DISPLAY_NAMES:
-        return f"{STATE_DISPLAY_NAMES[state]}.csv"
+        name = STATE_DISPLAY_NAMES[state]
     else:
         # Clean up the URL encoded state name as fallback
         clean_state = state.replace('%FC', 'ü').replace('%C3%BC', 'ü')
-        return f"{clean_state.replace(' ', '_').lower()}.csv"
+        name = clean_state.replace(' ', '_').lower()
+    if OUTPUT_FORMAT == 'parquet':
+        # The state's partition directory, with 'part' naming the part files written to it
+        return os.path.join(PARQUET_DATASET_DIR, f"state={name}", 'part')
+    return f"{name}.{OUTPUT_FORMAT}"
+
+# Open an output sink in the configured format
+def open_output_sink(filename, progress=None):
+    """Open a sink for company records, rolling back to the last offset committed to it.
+
+    Every mode reads the offset recorded next to the file. progress is only
+    consulted for a file last committed before offsets were kept there.
+    """
+    offset = None
+    if progress is not None and committed_offset(OUTPUT_FORMAT, filename) is None:
+        offset = progress.get('output_offsets', {}).get(filename)
+    options = {}
+    if OUTPUT_FORMAT == 'parquet':
+        options = {
+            'field_types': COMPANY_FIELD_TYPES,
+            'dictionary_fields': PARQUET_DICTIONARY_FIELDS,
+            'row_group_size': PARQUET_ROW_GROUP_SIZE,
+        }
+    return open_sink(OUTPUT_FORMAT, filename, COMPANY_FIELDS, offset, SINK_BATCH_SIZE, **options)
 
 # Get state-specific fr_param based on the state code
 def get_fr_param_for_state(state):
@@ -845,12 +1560,86 @@ def get_fr_param_for_state(state):
     # This is a simplification - you may need to extract this from the first page
     return "Ojo6Ojo6Ojo6Ojo6Ojo6OjoOjo6Ojo6Ojo6" 
 
+# A list page, fetched and parsed ahead of its detail pages
+class ListPage:
+    __slots__ = ('page', 'company_ids', 'total_entries', 'next_page')
+    
+    def __init__(self, page, company_ids, total_entries, next_page):
+        self.page = page
+        self.company_ids = company_ids
+        self.total_entries = total_entries
+        self.next_page = next_page
+
+# Fetch and parse the list pages of a state, one after the other
+def iter_list_pages(state, start_page=0):
+    """Yield a ListPage for every list page of a state from start_page on.
+    
+    scrape_state runs this on a prefetch thread, ahead of the detail
+    fetches, so it only fetches and parses; the cursor and the checkpoints
+    stay with scrape_state.
+    """
+    state_display = STATE_DISPLAY_NAMES.get(state, state)
+    page = start_page
+    fr_param = None  # Will be set after first page
+    while True:
+        # Construct URL for the current page
+        if page > 0 and fr_param is None:
+            # Use the extracted fr_param from the previous page or get it based on state
+            fr_param = get_fr_param_for_state(state)
+        url = get_list_page_url(state, page, fr_param)
+        
+        log_event('debug', 'page_fetching', f"Fetching page {page+1} for state {state_display}: {url}",
+                  state=state_display, page=page, url=url)
+        
+        # Fetch the page; a failure ends the iteration with FetchFailed
+        content = fetch_list_page(url, page, state_display)
+        archive_page(url, content, 'list', state)
+            
+        # Parse the page once; every extractor below reads the same document
+        with PARSE_LATENCY.time(page_type='list'):
+            document = parse_document(content, HTML_PARSER)
+            
+            # Extract companies from this page
+            page_companies = get_companies_from_page(document, state_display)
+        log_event('info', 'page_fetched', f"Found {len(page_companies)} companies on page {page+1} of {state_display}",
+                  state=state_display, page=page, companies=len(page_companies))
+        
+        # Check if we need to extract the fr_param from the page
+        if page == 0 and fr_param is None:
+            # Try to extract fr_param from the pagination links
+            fr_param = extract_fr_param(document)
+            if fr_param:
+                log_event('debug', 'fr_param', f"Extracted fr_param: {fr_param}", state=state_display, fr=fr_param)
+            
+            # If still no fr_param, use the default
+            if fr_param is None:
+                fr_param = get_fr_param_for_state(state)
+                log_event('warning', 'fr_param', f"Using default fr_param: {fr_param}",
+                          state=state_display, fr=fr_param)
+        
+        # Get pagination information with the modified function that knows the current page
+        pagination = get_pagination_info(document, page, url)
+        next_page = get_next_page(pagination, page)
+        yield ListPage(page, [company['id'] for company in page_companies], pagination['total_entries'], next_page)
+        
+        if next_page is None:
+            log_event('info', 'state_last_page', f"No more pages found for state {state_display}",
+                      state=state_display, page=page)
+            return
+        page = next_page
+
 def scrape_state(state, start_page=0):
-    """Scrape all companies for a given state."""
-    print(f"\n{'='*50}")
+    """Scrape all companies for a given state. Returns how many were saved.
+    
+    The work is pipelined: a prefetch thread fetches and parses the list
+    pages, up to LIST_PREFETCH_PAGES ahead, the detail pages are fetched
+    and parsed on the DetailFetcher threads, and this thread writes the
+    records and owns the cursor and the checkpoints. The bounded queues
+    between the stages keep memory flat.
+    """
     state_display = STATE_DISPLAY_NAMES.get(state, state)
-    print(f"Starting scraper for state: {state_display}")
-    print(f"{'='*50}")
+    log_event('info', 'state_started', f"Starting scraper for state: {state_display}",
+              state=state_display, page=start_page)
     
     # Load progress and processed companies
     progress = load_progress()
@@ -859,178 +1648,990 @@ def scrape_state(state, start_page=0):
     # Prepare output filename
     state_filename = get_state_filename(state)
     
-    # Load existing data if available
-    companies_data = []
-    if os.path.exists(state_filename):
-        try:
-            existing_df = pd.read_csv(state_filename)
-            companies_data = existing_df.to_dict('records')
-            print(f"Loaded {len(companies_data)} existing companies from {state_filename}")
-        except Exception as e:
-            print(f"Error loading existing data: {str(e)}")
+    # Append to the existing output instead of reloading it, rolling back
+    # anything written after the last committed checkpoint
+    sink = open_output_sink(state_filename, progress)
+    log_event('info', 'output_opened', f"Appending to {state_filename} (offset {sink.offset()} already committed)",
+              state=state_display, file=state_filename, offset=sink.offset())
+    
+    # Companies scraped during this run; the records themselves only live
+    # in the sink until the next commit
+    companies_saved = 0
+    
+    # Resume inside the page if the cursor points at this state and page
+    start_position = 0
+    if progress.get('current_state_index') == STATES.index(state) and progress.get('current_page') == start_page:
+        start_position = progress.get('current_position', 0)
+    progress['current_state_index'] = STATES.index(state)
+    policy = CheckpointPolicy(CHECKPOINT_INTERVAL_SECONDS, CHECKPOINT_INTERVAL_RECORDS)
     
     # Initialize variables
     page = start_page
-    has_next_page = True
-    fr_param = None  # Will be set after first page
-    session = requests.Session()  # Create a session for connection pooling
+    page_size = 0  # Most companies seen on one page, to turn the cursor into an entry count
+    eta = EtaTracker()
+    seconds_left = None
+    # Detail pages are fetched concurrently; results come back to this thread,
+    # which is the only one that touches processed_companies and the sink.
+    # Each fetch is a single attempt: failures wait on the retry queue while
+    # the crawl goes on, and are on the dead-letter list until they get through
+    fetcher = DetailFetcher(
+        lambda company_id: fetch_company_details(company_id, state_display, max_retries=1),
+        max_workers=DETAIL_WORKERS
+    )
+    retries = RetryQueue(RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, DETAIL_MAX_ATTEMPTS, RETRY_JITTER)
+    dead_letters = open_dead_letters()
+    # The next list page is fetched while this one's details are
+    list_pages = Prefetcher(iter_list_pages(state, start_page), depth=LIST_PREFETCH_PAGES, name='list-pages')
     
-    try:
-        while has_next_page:
-            # Construct URL for the current page
-            if page == 0:
-                # First page URL
-                url = f"{BASE_URL}/register.php?cmd=search&stichwort=&firma=&branche=&vonplz=&ort=&strasse=&vorwahl=&bundesland={state}&Suchen=Suchen"
-            else:
-                # Use the extracted fr_param from the previous page or get it based on state
-                if fr_param is None:
-                    fr_param = get_fr_param_for_state(state)
-                url = f"{BASE_URL}/register.php?cmd=mysearch&fr={fr_param}&auswahl=alle&ap={page}"
-            
-            print(f"Fetching page {page+1} for state {state_display}: {url}")
+    def stop_stages():
+        # Drop queued list pages and detail fetches so an interrupted run exits promptly
+        list_pages.close()
+        fetcher.shutdown()
+    
+    def save_companies(company_ids):
+        # Write the companies fetched among company_ids, checkpointing as we go
+        nonlocal companies_saved
+        for company_id, company_data in fetch_with_retries(fetcher, company_ids, retries, dead_letters,
+                                                           lambda company_id: state):
+            processed_companies.add(company_id)
+            yield company_id
             
-            # Update progress
-            progress['current_state_index'] = STATES.index(state)
-            progress['current_page'] = page
-            save_progress(progress)
+            if company_data:
+                write_company(sink, company_data)
+                companies_saved += 1
+                policy.add()
             
-            # Fetch the page
-            content = fetch_page(url, session=session)
-            if not content:
-                print(f"Failed to fetch page {page+1} for state {state_display}")
-                
-                # Special handling for page 6 (when page=5)
-                if page == 5:
-                    print("This is the troublesome page 6. Trying with a modified URL...")
-                    # Try an alternative URL construction for page 6
-                    alt_url = f"{BASE_URL}/register.php?cmd=mysearch&auswahl=alle&ap=5"
-                    print(f"Trying alternative URL: {alt_url}")
-                    content = fetch_page(alt_url, session=session)
-                    if not content:
-                        print("Alternative URL also failed. Saving debug info.")
-                        save_blocked_page(alt_url, b"", None, get_headers(), 
-                                     "Alternative URL for page 6 failed", force_save=True)
-                        break
-                else:
-                    break
-                
-            # Extract companies from this page
-            page_companies = get_companies_from_page(content, state_display)
-            print(f"Found {len(page_companies)} companies on page {page+1}")
+            # Checkpoint once enough time or companies have gone by
+            if policy.due():
+                commit_checkpoint(sink, processed_companies, progress, policy, dead_letters)
+                log_event('info', 'checkpoint', f"Saved {companies_saved} companies to {state_filename}",
+                          state=state_display, page=page, companies=companies_saved)
+    
+    try:
+        for list_page in list_pages:
+            page = list_page.page
+            QUEUE_DEPTH.set(list_pages.waiting(), queue='list_pages')
+            if list_page.total_entries:
+                progress['total_entries'] = list_page.total_entries
             
-            # Check if we need to extract the fr_param from the page
-            if page == 0 and fr_param is None:
-                # Try to extract fr_param from the pagination links
-                soup = BeautifulSoup(content, 'html.parser')
-                pagination_links = soup.select(SELECTORS['pagination'])
-                for link in pagination_links:
-                    href = link.get('href', '')
-                    fr_match = re.search(r'fr=([^&]+)', href)
-                    if fr_match:
-                        fr_param = fr_match.group(1)
-                        print(f"Extracted fr_param: {fr_param}")
-                        break
-                
-                # If still no fr_param, use the default
-                if fr_param is None:
-                    fr_param = get_fr_param_for_state(state)
-                    print(f"Using default fr_param: {fr_param}")
+            # The cursor position is the number of companies at the start of the
+            # page that are all done, so a resume can jump straight past them
+            page_ids = list_page.company_ids
+            page_size = max(page_size, len(page_ids))
+            position = start_position if page == start_page else 0
+            if position:
+                log_event('info', 'page_resumed', f"Resuming page {page+1} at company {position+1}",
+                          state=state_display, page=page, position=position)
+            done_ids = set(page_ids[:position])
             
-            # Get pagination information with the modified function that knows the current page
-            pagination = get_pagination_info(content, page, url)
+            def advance_cursor():
+                nonlocal position, seconds_left
+                while position < len(page_ids) and page_ids[position] in done_ids:
+                    position += 1
+                progress['current_page'] = page
+                progress['current_position'] = position
+                policy.touch()
+                QUEUE_DEPTH.set(fetcher.in_flight(), queue='detail_fetches')
+                total = progress.get('total_entries')
+                if total:
+                    seconds_left = update_eta(state_display, eta, min(page * page_size + position, total), total)
             
-            # Process companies
-            for company in page_companies:
-                company_id = company['id']
-                
+            # Collect the companies that still need their details fetched
+            pending_ids = []
+            for company_id in page_ids[position:]:
                 # Skip already processed companies
                 if company_id in processed_companies:
-                    debug_print(f"Company {company_id} already processed, skipping")
+                    log_event('debug', 'company_skipped', f"Company {company_id} already processed, skipping",
+                              company_id=company_id, state=state_display, page=page)
+                    done_ids.add(company_id)
                     continue
                 
-                # Get complete company details
-                company_data = scrape_company_details(company_id, state_display, processed_companies)
-                
-                if company_data:
-                    companies_data.append(company_data)
-                    
-                    # Save progress after each company
-                    if len(companies_data) % 10 == 0:
-                        # Save to CSV
-                        df = pd.DataFrame(companies_data)
-                        df.to_csv(state_filename, index=False)
-                        print(f"Saved {len(companies_data)} companies to {state_filename}")
-                        
-                        # Update processed companies
-                        save_processed_companies(processed_companies, progress)
-                
-                # Random delay between companies
-                time.sleep(random.uniform(MIN_COMPANY_DELAY, MAX_COMPANY_DELAY))
+                pending_ids.append(company_id)
+            advance_cursor()
             
-            # Check if there's a next page
-            if pagination['next_page_url']:
-                has_next_page = True
-                page += 1
-            else:
-                # Double-check if we should have more pages based on entry count
-                if pagination['total_entries'] > (page + 1) * 10:
-                    print(f"WARNING: Pagination suggests there are no more pages, but total entries ({pagination['total_entries']}) suggests there should be more.")
-                    
-                    # Special handling for page 6 onwards
-                    if page >= 5:
-                        print("Attempting to continue with direct URL construction...")
-                        page += 1
-                        has_next_page = True
-                        continue
-                
-                has_next_page = False
-                print(f"No more pages found for state {state_display}")
+            # Get complete company details, handling each as soon as it finishes;
+            # companies from earlier pages whose retry is due go along
+            for company_id in save_companies(pending_ids + retries.due()):
+                done_ids.add(company_id)
+                advance_cursor()
             
-            # Save progress at the end of each page
-            progress['current_page'] = page
-            save_progress(progress)
+            # Companies that failed are on the dead-letter list, which keeps them from here on
+            done_ids.update(pending_ids)
+            advance_cursor()
             
-            # Save data at the end of each page
-            df = pd.DataFrame(companies_data)
-            df.to_csv(state_filename, index=False)
-            print(f"Saved {len(companies_data)} companies to {state_filename}")
+            # Move the cursor to the start of the next page
+            if list_page.next_page is not None:
+                page = list_page.next_page
+            progress['current_page'] = page
+            progress['current_position'] = 0
+            policy.touch()
+            if policy.due():
+                commit_checkpoint(sink, processed_companies, progress, policy, dead_letters)
+                log_event('info', 'checkpoint', f"Saved {companies_saved} companies to {state_filename}",
+                          state=state_display, page=page, companies=companies_saved)
             
-            # Random delay between pages
-            if has_next_page:
-                delay = random.uniform(MIN_PAGE_DELAY, MAX_PAGE_DELAY)
-                print(f"Waiting {delay:.2f} seconds before fetching next page...")
-                time.sleep(delay)
+            # Pacing between pages is left to the rate limiter
+            if list_page.next_page is not None:
+                http_stats = HTTP_CLIENT.stats()
+                rate = RATE_LIMITER.current_rate(BASE_URL)
+                eta_text = f", about {seconds_left / 60:.0f} minutes left" if seconds_left is not None else ""
+                log_event('info', 'crawl_status',
+                          f"Current request rate: {rate:.2f} requests/s, {http_stats['handshakes_saved']}/"
+                          f"{http_stats['requests']} requests reused a connection{eta_text}",
+                          state=state_display, page=page, rate=round(rate, 3), requests=http_stats['requests'],
+                          eta_seconds=None if seconds_left is None else round(seconds_left))
+        
+        # Every list page is done; only the companies waiting for a retry are left
+        while len(retries):
+            wait = retries.next_due()
+            if wait:
+                log_event('info', 'retry_wait', f"Waiting {wait:.0f} seconds for the next of {len(retries)} "
+                          "companies due a retry", state=state_display, seconds=round(wait), companies=len(retries))
+                time.sleep(wait)
+                SLEEP_SECONDS.inc(wait, reason='retry_backoff')
+            for _ in save_companies(retries.due()):
+                pass
     
     except KeyboardInterrupt:
-        print("\nScraper interrupted by user")
-        save_and_exit(progress, processed_companies, 0, "Scraper manually interrupted")
-    except ScraperError as e:
-        print(f"\nScraper error: {str(e)}")
-        save_and_exit(progress, processed_companies, 1, str(e))
+        log_event('warning', 'interrupted', "Scraper interrupted by user", state=state_display, page=page)
+        stop_stages()
+        save_and_exit(progress, processed_companies, 0, "Scraper manually interrupted", sink)
+    except FetchFailed as e:
+        # A list page that cannot be fetched stops the run with the cursor on
+        # it, so the next run picks the state up again there
+        log_event('error', 'list_page_failed', f"Stopping: a list page of {state_display} could not be fetched "
+                  f"({e.reason})", state=state_display, page=progress.get('current_page'), url=e.url,
+                  reason=e.reason)
+        stop_stages()
+        save_and_exit(progress, processed_companies, 1, str(e), sink)
     except Exception as e:
-        print(f"\nUnexpected error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        save_and_exit(progress, processed_companies, 1, f"Scraper crashed with error: {str(e)}")
+        log_event('error', 'crash', f"Unexpected error: {str(e)}", state=state_display, page=page, exc_info=True)
+        stop_stages()
+        save_and_exit(progress, processed_companies, 1, f"Scraper crashed with error: {str(e)}", sink)
+    finally:
+        stop_stages()
     
     # Final save
-    df = pd.DataFrame(companies_data)
-    df.to_csv(state_filename, index=False)
-    print(f"Completed scraping for state {state_display}. Saved {len(companies_data)} companies.")
+    commit_checkpoint(sink, processed_companies, progress, policy, dead_letters)
+    sink.close()
+    failed = len(dead_letters.entries(state))
+    dead_letters.close()
+    log_event('info', 'state_done', f"Completed scraping for state {state_display}. Saved {companies_saved} companies.",
+              state=state_display, companies=companies_saved, failed=failed)
+    if failed:
+        log_event('warning', 'dead_letters_left', f"{failed} companies of {state_display} could not be fetched and "
+                  "are on the dead-letter list; run with --drain-failed to try them again",
+                  state=state_display, companies=failed)
+    
+    return companies_saved
+
+# Progress files for one state in run-all mode
+def get_state_progress_files(state):
+    """Get the progress and backup filenames used for a state in run-all mode."""
+    name = STATE_DISPLAY_NAMES.get(state, state)
+    progress_file = os.path.join(STATE_PROGRESS_DIR, f"{name}.json")
+    backup_file = os.path.join(STATE_PROGRESS_DIR, f"{name}.backup.json")
+    return progress_file, backup_file
+
+# Expected size of a state, used to schedule the largest states first
+def get_state_size(state):
+    """Entry count recorded by an earlier run, or the static size hint."""
+    progress = load_progress(*get_state_progress_files(state))
+    return progress.get('total_entries') or STATE_SIZE_HINTS.get(state, 0)
+
+# Set up a run-all worker process
+def init_state_worker(budget, metrics_file=None, log_file=None, log_level=LOG_LEVEL, profile_mode=None):
+    """Make every request in this worker also draw from the shared budget.
+    
+    Each worker writes its metrics snapshot, event log and profile to its
+    own files, named after its pid.
+    """
+    RATE_LIMITER.shared_budget = budget
+    setup_event_log(get_process_filename(log_file), log_level, CONSOLE_LOG_LEVEL, LOG_SAMPLE_LIMITS)
+    if metrics_file:
+        start_metrics_export(snapshot_file=get_process_filename(metrics_file))
+    if profile_mode:
+        start_profiling(profile_mode, os.path.join(PROFILE_DIR, f"worker-{os.getpid()}"))
+
+# Crawl one state inside a run-all worker process
+def run_state_worker(state):
+    """Scrape a state with its own progress cursor and return the number of new companies."""
+    global PROGRESS_FILE, PROGRESS_BACKUP_FILE
+    PROGRESS_FILE, PROGRESS_BACKUP_FILE = get_state_progress_files(state)
+    
+    progress = load_progress()
+    try:
+        companies = scrape_state(state, progress.get('current_page', 0))
+    finally:
+        # Pool workers exit without running atexit handlers
+        flush_metrics()
+        flush_response_cache()
+        write_profile()
+        flush_event_log()
+    
+    # Mark the state as done in its own cursor
+    progress = load_progress()
+    progress['completed'] = True
+    progress['current_page'] = 0
+    progress['current_position'] = 0
+    save_progress(progress)
+    return companies
+
+# Merge a state's output into the combined output file
+def update_combined_file(state):
+    """Stream the state's records into the national file when ONE_FILE_PER_STATE is off.
+    
+    Companies already in the national file are skipped unless the state
+    file has a newer, changed version, so merging a state again (e.g. after
+    a resumed or incremental run) only adds what is new.
+    """
+    state_display = STATE_DISPLAY_NAMES.get(state, state)
+    with CombinedOutput(COMBINED_OUTPUT_FILE, COMBINED_INDEX_DB, COMPANY_FIELDS, 'csv', SINK_BATCH_SIZE) as combined:
+        added, skipped = combined.merge_files(OUTPUT_FORMAT, get_state_output_files(state))
+        total = len(combined)
+    
+    log_event('info', 'combined_file_updated', f"Updated combined data file: {COMBINED_OUTPUT_FILE} "
+              f"({added} added from {state_display}, {skipped} already there, {total} in total)",
+              file=COMBINED_OUTPUT_FILE, state=state_display, companies=added, skipped=skipped, total=total)
+
+# Crawl all states at once on a process pool
+def run_all_states(workers=STATE_WORKERS):
+    """Scrape every unfinished state in parallel, largest state first.
+    
+    Each worker writes its own state file and progress cursor. All workers
+    share the processed company store and one global request budget, so the
+    site sees the same total load as a single scraper at full speed.
+    """
+    os.makedirs(STATE_PROGRESS_DIR, exist_ok=True)
+    
+    pending = [state for state in STATES
+               if not load_progress(*get_state_progress_files(state)).get('completed')]
+    if not pending:
+        log_event('info', 'all_done', "All states have been processed!")
+        return
+    
+    # Biggest first so the longest crawl starts immediately
+    pending.sort(key=get_state_size, reverse=True)
+    log_event('info', 'states_scheduled', f"Scheduling {len(pending)} states on {workers} workers: "
+              f"{', '.join(STATE_DISPLAY_NAMES.get(state, state) for state in pending)}",
+              states=len(pending), workers=workers)
+    
+    budget = SharedRequestBudget(GLOBAL_MAX_REQUEST_RATE)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_state_worker,
+                                   initargs=(budget, METRICS_SNAPSHOT_FILE, EVENT_LOG_FILE, LOG_LEVEL, PROFILE_MODE))
+    try:
+        futures = {executor.submit(run_state_worker, state): state for state in pending}
+        for future in as_completed(futures):
+            state_display = STATE_DISPLAY_NAMES.get(futures[future], futures[future])
+            try:
+                companies = future.result()
+            except SystemExit as e:
+                # The worker already saved its progress in save_and_exit
+                log_event('warning', 'worker_stopped', f"Worker for {state_display} stopped with exit code {e.code}",
+                          state=state_display, exit_code=e.code)
+                continue
+            except Exception as e:
+                log_event('error', 'worker_failed', f"Worker for {state_display} failed: {str(e)}",
+                          state=state_display)
+                continue
+            
+            log_event('info', 'worker_done', f"Finished state {state_display}: {companies} new companies",
+                      state=state_display, companies=companies)
+            if not ONE_FILE_PER_STATE:
+                update_combined_file(futures[future])
+    except KeyboardInterrupt:
+        # Workers receive the same interrupt and save their own progress
+        log_event('warning', 'interrupted', "Scraper interrupted by user, waiting for workers to save progress...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        sys.exit(0)
+    executor.shutdown(wait=True)
+
+# Put the first list page of every state on the work queue
+def seed_work_queue(queue, states=None):
+    """Enqueue page 0 of each state. Returns the number of states added."""
+    added = 0
+    for state in states or STATES:
+        if queue.enqueue('list_page', f"{state}:0", state, {'page': 0}):
+            added += 1
+    return added
+
+# Progress file for one queue worker
+def get_worker_progress_files(worker_id):
+    """Get the progress and backup filenames used by a queue worker."""
+    progress_file = os.path.join(QUEUE_PROGRESS_DIR, f"{worker_id}.json")
+    backup_file = os.path.join(QUEUE_PROGRESS_DIR, f"{worker_id}.backup.json")
+    return progress_file, backup_file
+
+# Output file a queue worker writes a state's companies to
+def get_worker_filename(state, worker_id):
+    """State filename with the worker ID in it, so workers never share a file."""
+    base, extension = os.path.splitext(get_state_filename(state))
+    return f"{base}.{worker_id}{extension}"
+
+# Expand a list page task into company tasks and the next list page
+def process_list_task(queue, task):
+    """Fetch a list page and enqueue what it links to. Returns False if the fetch failed."""
+    state = task.state
+    state_display = STATE_DISPLAY_NAMES.get(state, state)
+    page = task.payload.get('page', 0)
+    fr_param = task.payload.get('fr')
+    
+    url = get_list_page_url(state, page, fr_param)
+    log_event('debug', 'page_fetching', f"Fetching page {page+1} for state {state_display}: {url}",
+              state=state_display, page=page, url=url)
+    try:
+        content = fetch_list_page(url, page, state_display)
+    except FetchFailed:
+        return False
+    archive_page(url, content, 'list', state)
+    
+    with PARSE_LATENCY.time(page_type='list'):
+        document = parse_document(content, HTML_PARSER)
+        companies = get_companies_from_page(document, state_display)
+    if page == 0:
+        fr_param = extract_fr_param(document) or fr_param
+    pagination = get_pagination_info(document, page, url)
+    
+    added = 0
+    for company in companies:
+        if queue.enqueue('company', company['id'], state):
+            added += 1
+    
+    next_page = get_next_page(pagination, page)
+    if next_page is not None:
+        queue.enqueue('list_page', f"{state}:{next_page}", state, {'page': next_page, 'fr': fr_param})
+    
+    log_event('info', 'page_queued', f"Queued {added} new companies from page {page+1} of {state_display}",
+              state=state_display, page=page, companies=added)
+    return True
+
+# Run one queue worker until the queue is drained
+def run_queue_worker(queue_file=WORK_QUEUE_DB, worker_id=None):
+    """Lease tasks from the work queue and process them until nothing is left.
+    
+    Company results are written to this worker's own output files. Tasks are
+    only completed on the queue after the output and the processed IDs have
+    been committed, so a worker that dies loses nothing: its leases expire
+    and another worker picks the tasks up again.
+    """
+    global PROGRESS_FILE, PROGRESS_BACKUP_FILE
+    worker_id = worker_id or socket.gethostname()
+    os.makedirs(QUEUE_PROGRESS_DIR, exist_ok=True)
+    PROGRESS_FILE, PROGRESS_BACKUP_FILE = get_worker_progress_files(worker_id)
+    
+    queue = SqliteWorkQueue(queue_file)
+    progress = load_progress()
+    processed_companies = load_processed_companies()
+    policy = CheckpointPolicy(CHECKPOINT_INTERVAL_SECONDS, CHECKPOINT_INTERVAL_RECORDS)
+    leased = {}  # Company ID -> leased company task
+    fetcher = DetailFetcher(
+        lambda company_id: fetch_company_details(
+            company_id, STATE_DISPLAY_NAMES.get(leased[company_id].state, leased[company_id].state)),
+        max_workers=DETAIL_WORKERS
+    )
+    heartbeat = LeaseHeartbeat(queue, worker_id, QUEUE_LEASE_SECONDS)
+    heartbeat.start()
+    
+    sinks = {}  # One output file per state this worker has seen
+    finished = []  # Tasks done locally but not yet committed
+    saved = 0
+    
+    def sink_for(state):
+        if state not in sinks:
+            filename = get_worker_filename(state, worker_id)
+            sinks[state] = open_output_sink(filename, progress)
+        return sinks[state]
+    
+    def checkpoint():
+        with CHECKPOINT_LATENCY.time():
+            for sink in sinks.values():
+                commit_output(sink, progress)
+            save_processed_companies(processed_companies, progress)
+            queue.complete(finished, worker_id)
+            finished.clear()
+            policy.committed()
+        profile_checkpoint()
+        for status, count in queue.counts().items():
+            QUEUE_DEPTH.set(count, queue=f"work_{status}")
+    
+    log_event('info', 'worker_started', f"Queue worker {worker_id} started on {queue_file}",
+              worker=worker_id, queue=queue_file)
+    try:
+        while True:
+            # Lease list pages one at a time, companies in batches for the fetcher
+            batch = []
+            while len(batch) < DETAIL_WORKERS:
+                task = queue.lease(worker_id, QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS)
+                if task is None:
+                    break
+                if task.kind == 'list_page':
+                    if process_list_task(queue, task):
+                        queue.complete([task.task_id], worker_id)
+                    else:
+                        queue.fail(task.task_id, worker_id, QUEUE_MAX_ATTEMPTS)
+                elif task.key in processed_companies:
+                    log_event('debug', 'company_skipped', f"Company {task.key} already processed, skipping",
+                              company_id=task.key, state=task.state)
+                    finished.append(task.task_id)
+                else:
+                    batch.append(task)
+            
+            if not batch and not finished:
+                if queue.is_drained():
+                    break
+                time.sleep(QUEUE_POLL_SECONDS)
+                continue
+            
+            leased.update((task.key, task) for task in batch)
+            for company_id, (fetched, company_data, _) in fetcher.fetch_many([task.key for task in batch]):
+                task = leased.pop(company_id)
+                if not fetched:
+                    queue.fail(task.task_id, worker_id, QUEUE_MAX_ATTEMPTS)
+                    continue
+                processed_companies.add(company_id)
+                if company_data:
+                    write_company(sink_for(task.state), company_data)
+                    saved += 1
+                finished.append(task.task_id)
+                policy.add()
+            
+            if policy.due() or not batch:
+                checkpoint()
     
-    return companies_data
+    except KeyboardInterrupt:
+        log_event('warning', 'interrupted', f"Queue worker {worker_id} interrupted, committing finished tasks",
+                  worker=worker_id)
+    finally:
+        fetcher.shutdown()
+        heartbeat.stop()
+        checkpoint()
+        for sink in sinks.values():
+            sink.close()
+        queue.close()
+        flush_metrics()
+        write_profile()
+        flush_event_log()
+    
+    log_event('info', 'worker_done', f"Queue worker {worker_id} finished. Saved {saved} companies.",
+              worker=worker_id, companies=saved)
+    return saved
+
+# Run several queue workers as local processes
+def run_queue_workers(queue_file=WORK_QUEUE_DB, workers=STATE_WORKERS):
+    """Start local queue workers sharing one request budget and wait for them."""
+    host = socket.gethostname()
+    budget = SharedRequestBudget(GLOBAL_MAX_REQUEST_RATE)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_state_worker,
+                                   initargs=(budget, METRICS_SNAPSHOT_FILE, EVENT_LOG_FILE, LOG_LEVEL, PROFILE_MODE))
+    try:
+        # Worker IDs are stable across restarts so each one reopens its own files
+        futures = [executor.submit(run_queue_worker, queue_file, f"{host}-{index}")
+                   for index in range(workers)]
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                log_event('error', 'worker_failed', f"Queue worker failed: {str(e)}")
+    except KeyboardInterrupt:
+        log_event('warning', 'interrupted', "Scraper interrupted by user, waiting for queue workers to commit...")
+        executor.shutdown(wait=True, cancel_futures=True)
+        sys.exit(0)
+    executor.shutdown(wait=True)
 
-def main():
+# Output files that may hold records for a state
+def get_state_output_files(state):
+    """The state file plus any per-worker shards written in queue mode."""
+    filename = get_state_filename(state)
+    if OUTPUT_FORMAT == 'parquet':
+        # Queue workers write their parts into the same partition directory
+        return [os.path.dirname(filename)]
+    base, extension = os.path.splitext(filename)
+    return [filename] + sorted(glob.glob(f"{base}.*{extension}"))
+
+# Start tracking companies that earlier runs wrote to the output files
+def backfill_freshness(freshness):
+    """Add every company found in the output files to the freshness store.
+    
+    The scrape_date of a record is taken as its last check. Companies that
+    are tracked already are left alone. Returns the number added.
+    """
+    def observations():
+        filenames = [name for state in STATES for name in get_state_output_files(state)]
+        if not ONE_FILE_PER_STATE:
+            filenames.append(COMBINED_OUTPUT_FILE)
+        for filename in filenames:
+            if not os.path.exists(filename):
+                continue
+            output_format = 'csv' if filename.endswith('.csv') else OUTPUT_FORMAT
+            for record in iter_records(output_format, filename):
+                try:
+                    checked_at = time.mktime(time.strptime(record['scrape_date'], '%Y-%m-%d %H:%M:%S'))
+                except (KeyError, TypeError, ValueError):
+                    checked_at = time.time()
+                yield (str(record['company_id']), record.get('state'), checked_at,
+                       record_digest(record, COMPANY_FIELDS))
+    
+    return freshness.backfill(observations())
+
+# Keep the dataset fresh within a daily request budget
+def run_incremental(daily_budget=RECRAWL_DAILY_BUDGET):
+    """Find new companies and revisit the stalest ones, within today's budget.
+    
+    Part of the budget walks the list pages (continuing where the last run
+    stopped and wrapping around after the last state) and fetches companies
+    that are not in the processed store yet. The rest re-checks the tracked
+    companies most likely to have changed, with conditional GETs. Changed
+    records are appended to the state files as a new version, so a company
+    can appear more than once; the row with the latest scrape_date wins.
+    """
+    progress = load_progress()
+    processed_companies = load_processed_companies()
+    freshness = FreshnessStore(FRESHNESS_DB, RECRAWL_PRIOR_CHANGES, RECRAWL_PRIOR_DAYS)
+    added = backfill_freshness(freshness)
+    if added:
+        log_event('info', 'freshness_backfilled', f"Tracking {added} companies from existing output files",
+                  companies=added)
+    
+    remaining = daily_budget - freshness.requests_used()
+    if remaining <= 0:
+        log_event('info', 'budget_used_up', f"Today's budget of {daily_budget} requests is used up",
+                  budget=daily_budget)
+        freshness.close()
+        return 0
+    log_event('info', 'incremental_started', f"Incremental run: {remaining} of {daily_budget} requests left for today, "
+              f"{len(freshness)} companies tracked", budget=daily_budget, remaining=remaining)
+    
+    # Budget accounting counts requests that actually went out, not cache hits
+    requests_at_start = HTTP_CLIENT.stats()['requests']
+    charged = 0
+    def used():
+        return HTTP_CLIENT.stats()['requests'] - requests_at_start
+    
+    policy = CheckpointPolicy(CHECKPOINT_INTERVAL_SECONDS, CHECKPOINT_INTERVAL_RECORDS)
+    company_states = {}  # Company ID -> state display name for the fetcher
+    revisit = set()  # IDs being re-checked, fetched past the cache TTL
+    fetcher = DetailFetcher(
+        lambda company_id: fetch_company_details(
+            company_id, company_states[company_id], 0 if company_id in revisit else None),
+        max_workers=DETAIL_WORKERS
+    )
+    sinks = {}
+    counts = {'new': 0, 'checked': 0, 'changed': 0}
+    
+    def sink_for(state):
+        if state not in sinks:
+            filename = get_state_filename(state)
+            sinks[state] = open_output_sink(filename, progress)
+        return sinks[state]
+    
+    def checkpoint():
+        nonlocal charged
+        with CHECKPOINT_LATENCY.time():
+            for sink in sinks.values():
+                commit_output(sink, progress)
+            save_processed_companies(processed_companies, progress)
+            freshness.add_requests(used() - charged)
+            charged = used()
+            freshness.commit()
+            policy.committed()
+        profile_checkpoint()
+    
+    def fetch(company_ids, state_of):
+        """Fetch and save the companies. Returns how many were fetched."""
+        fetched_count = 0
+        for company_id in company_ids:
+            company_states[company_id] = state_of(company_id)
+        for company_id, (fetched, company_data, _) in fetcher.fetch_many(company_ids):
+            state = company_states.pop(company_id)
+            is_revisit = company_id in revisit
+            revisit.discard(company_id)
+            if not fetched:
+                continue
+            fetched_count += 1
+            processed_companies.add(company_id)
+            if company_data is None:
+                # Still counts as a check, so a broken page is not retried every batch
+                freshness.observe(company_id, state, None)
+                continue
+            changed = freshness.observe(company_id, state, record_digest(company_data, COMPANY_FIELDS))
+            counts['checked' if is_revisit else 'new'] += 1
+            if changed:
+                if is_revisit:
+                    counts['changed'] += 1
+                write_company(sink_for(state), company_data)
+                policy.add()
+            else:
+                policy.touch()
+            if policy.due():
+                checkpoint()
+        return fetched_count
+    
+    try:
+        # Discovery: walk the list pages for companies we have never seen
+        cursor = progress.setdefault('incremental', {'state_index': 0, 'page': 0, 'fr': None})
+        discovery_budget = int(remaining * RECRAWL_DISCOVERY_SHARE)
+        states_walked = 0
+        while used() < discovery_budget and states_walked < len(STATES):
+            state = STATES[cursor['state_index'] % len(STATES)]
+            state_display = STATE_DISPLAY_NAMES.get(state, state)
+            page = cursor['page']
+            url = get_list_page_url(state, page, cursor.get('fr'))
+            log_event('info', 'page_checking', f"Checking page {page+1} of {state_display} for new companies",
+                      state=state_display, page=page, url=url)
+            
+            try:
+                content = fetch_list_page(url, page, state_display)
+            except FetchFailed as e:
+                # The cursor stays on the page, so the next run tries it again
+                log_event('warning', 'discovery_stopped', f"Stopping discovery at page {page+1} of {state_display} "
+                          f"({e.reason})", state=state_display, page=page, reason=e.reason)
+                break
+            archive_page(url, content, 'list', state)
+            with PARSE_LATENCY.time(page_type='list'):
+                document = parse_document(content, HTML_PARSER)
+                page_companies = get_companies_from_page(document, state_display)
+            if page == 0:
+                cursor['fr'] = extract_fr_param(document)
+            new_ids = [company['id'] for company in page_companies if company['id'] not in processed_companies]
+            fetch(new_ids, lambda company_id: state_display)
+            next_page = get_next_page(get_pagination_info(document, page, url), page)
+            
+            if next_page is None:
+                cursor.update({'state_index': (cursor['state_index'] + 1) % len(STATES), 'page': 0, 'fr': None})
+                states_walked += 1
+            else:
+                cursor['page'] = next_page
+            policy.touch()
+        
+        # Revisits: the stalest companies get whatever budget is left. They are
+        # ranked once, as ranking reads the whole freshness table, and re-checked
+        # in batches until the budget runs out; each company comes up once per run
+        ranked = freshness.most_stale(remaining - used(), RECRAWL_MIN_AGE_DAYS)
+        if not ranked:
+            log_event('info', 'revisits_done', "No tracked company is due for a re-check")
+        position = 0
+        while position < len(ranked) and used() < remaining:
+            candidates = ranked[position:position + min(DETAIL_WORKERS * 10, remaining - used())]
+            position += len(candidates)
+            log_event('info', 'revisiting', f"Re-checking {len(candidates)} companies "
+                      f"(chance of change {candidates[-1][2]:.0%} to {candidates[0][2]:.0%})",
+                      companies=len(candidates))
+            stale_states = {company_id: state for company_id, state, _ in candidates}
+            revisit.update(stale_states)
+            if not fetch(list(stale_states), lambda company_id: stale_states[company_id] or 'unknown'):
+                log_event('warning', 'revisits_failing', f"None of {len(candidates)} re-checks got through, "
+                          "stopping until the next run", companies=len(candidates))
+                break
+    
+    except KeyboardInterrupt:
+        log_event('warning', 'interrupted', "Incremental run interrupted by user")
+    finally:
+        fetcher.shutdown()
+        checkpoint()
+        for sink in sinks.values():
+            sink.close()
+        freshness.close()
+    
+    # New companies and changed records reach the national file as well
+    if not ONE_FILE_PER_STATE:
+        for state in sinks:
+            update_combined_file(state)
+    
+    log_event('info', 'incremental_done', f"Incremental run done: {counts['new']} new companies, "
+              f"{counts['checked']} re-checked, {counts['changed']} changed, {used()} requests",
+              requests=used(), **counts)
+    return counts['new'] + counts['changed']
+
+# Fetch the companies on the dead-letter list again
+def drain_dead_letters():
+    """Retry the companies earlier runs could not fetch. Returns how many were saved.
+    
+    Their records are appended to the state files. Companies that get through
+    come off the list; the others stay on it with their failures counted.
+    """
+    progress = load_progress()
+    processed_companies = load_processed_companies()
+    dead_letters = open_dead_letters()
+    company_states = {}  # Company ID -> state
+    for company_id, state, attempts, last_error in dead_letters.entries():
+        # Saved by a retry whose removal from the list was never committed
+        if company_id in processed_companies:
+            dead_letters.resolve(company_id)
+        else:
+            company_states[company_id] = state
+    log_event('info', 'drain_started', f"Retrying {len(company_states)} companies from the dead-letter list",
+              companies=len(company_states))
+    
+    policy = CheckpointPolicy(CHECKPOINT_INTERVAL_SECONDS, CHECKPOINT_INTERVAL_RECORDS)
+    retries = RetryQueue(RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, DETAIL_MAX_ATTEMPTS, RETRY_JITTER)
+    fetcher = DetailFetcher(
+        lambda company_id: fetch_company_details(
+            company_id, STATE_DISPLAY_NAMES.get(company_states[company_id], company_states[company_id]),
+            max_retries=1),
+        max_workers=DETAIL_WORKERS
+    )
+    sinks = {}
+    saved = 0
+    
+    def sink_for(state):
+        if state not in sinks:
+            filename = get_state_filename(state)
+            sinks[state] = open_output_sink(filename, progress)
+        return sinks[state]
+    
+    def checkpoint():
+        with CHECKPOINT_LATENCY.time():
+            for sink in sinks.values():
+                commit_output(sink, progress)
+            save_processed_companies(processed_companies, progress)
+            dead_letters.commit()
+            policy.committed()
+        profile_checkpoint()
+    
+    try:
+        pending = list(company_states)
+        while pending:
+            for company_id, company_data in fetch_with_retries(fetcher, pending, retries, dead_letters,
+                                                               company_states.get):
+                processed_companies.add(company_id)
+                if company_data:
+                    write_company(sink_for(company_states[company_id]), company_data)
+                    saved += 1
+                    policy.add()
+                if policy.due():
+                    checkpoint()
+            
+            wait = retries.next_due()
+            if wait:
+                log_event('info', 'retry_wait', f"Waiting {wait:.0f} seconds for the next of {len(retries)} "
+                          "companies due a retry", seconds=round(wait), companies=len(retries))
+                time.sleep(wait)
+                SLEEP_SECONDS.inc(wait, reason='retry_backoff')
+            pending = retries.due()
+    
+    except KeyboardInterrupt:
+        log_event('warning', 'interrupted', "Draining the dead-letter list interrupted by user")
+    finally:
+        fetcher.shutdown()
+        checkpoint()
+        for sink in sinks.values():
+            sink.close()
+        left = len(dead_letters)
+        dead_letters.close()
+    
+    if not ONE_FILE_PER_STATE:
+        for state in sinks:
+            update_combined_file(state)
+    
+    log_event('info', 'drain_done', f"Saved {saved} companies from the dead-letter list, {left} still on it",
+              companies=saved, left=left)
+    return saved
+
+# First re-parse pass over one archive shard
+def index_archive_shard(path):
+    """Find which state each company was listed under and where its detail pages are.
+    
+    Returns ({company_id: state}, {company_id: ((fetched_at, path, record_number), state)}).
+    """
+    company_states = {}
+    details = {}
+    for number, record in enumerate(iter_archive_records(path)):
+        if record.kind == 'list':
+            state = STATE_DISPLAY_NAMES.get(record.state, record.state)
+            document = parse_document(record.body, HTML_PARSER)
+            for company in get_companies_from_page(document, state):
+                company_states[company['id']] = state
+        elif record.kind == 'detail' and record.company_id:
+            # Later records in a shard are newer, so they replace earlier ones
+            details[record.company_id] = ((record.fetched_at, path, number), record.state)
+    return company_states, details
+
+# Second re-parse pass over one archive shard
+def reparse_archive_shard(path, wanted):
+    """Parse the chosen detail pages of a shard.
+    
+    wanted maps record numbers to (company_id, state). Returns the parsed companies.
+    """
+    companies = []
+    for number, record in enumerate(iter_archive_records(path)):
+        if number not in wanted:
+            continue
+        company_id, state = wanted[number]
+        soup = parse_document(record.body, HTML_PARSER).soup
+        company_data = parse_company_details(soup, company_id, state)
+        if company_data:
+            # Keep the time the page was actually downloaded
+            fetched_at = datetime.strptime(record.fetched_at, '%Y-%m-%dT%H:%M:%S.%fZ')
+            company_data['scrape_date'] = fetched_at.strftime('%Y-%m-%d %H:%M:%S')
+            companies.append(company_data)
+    return companies
+
+# Rebuild the state files from the raw archive without any network access
+def reparse_archive(archive_dir=ARCHIVE_DIR, output_dir=REPARSE_OUTPUT_DIR, workers=REPARSE_WORKERS):
+    """Replay archived pages through the current parsers on all CPU cores.
+    
+    The first pass reads list pages to learn each company's state and picks
+    the newest archived detail page per company. The second pass parses those
+    pages and writes one file per state into output_dir.
+    """
+    shards = list_archive_shards(archive_dir)
+    if not shards:
+        log_event('warning', 'reparse_empty', f"No archive shards found in {archive_dir}")
+        return 0
+    log_event('info', 'reparse_started', f"Re-parsing {len(shards)} archive shards from {archive_dir} on {workers} processes",
+              shards=len(shards), workers=workers)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Shards are in creation order, so newer listings and pages win
+        company_states = {}
+        latest = {}
+        for shard_states, shard_details in executor.map(index_archive_shard, shards):
+            company_states.update(shard_states)
+            for company_id, (position, state) in shard_details.items():
+                if company_id not in latest or position > latest[company_id][0]:
+                    latest[company_id] = (position, state)
+        log_event('info', 'reparse_indexed', f"Found {len(latest)} companies with archived detail pages",
+                  companies=len(latest))
+        
+        wanted = {}
+        for company_id, ((_, path, number), state) in latest.items():
+            state = company_states.get(company_id) or STATE_DISPLAY_NAMES.get(state, state) or 'unknown'
+            wanted.setdefault(path, {})[number] = (company_id, state)
+        
+        sinks = {}
+        written = 0
+        futures = [executor.submit(reparse_archive_shard, path, records) for path, records in wanted.items()]
+        try:
+            for future in as_completed(futures):
+                for company_data in future.result():
+                    state = company_data['state']
+                    if state not in sinks:
+                        filename = os.path.join(output_dir, get_state_filename(state))
+                        # Every re-parse starts the output from scratch
+                        remove_output(OUTPUT_FORMAT, filename)
+                        sinks[state] = open_output_sink(filename)
+                    sinks[state].write(company_data)
+                    written += 1
+        finally:
+            for sink in sinks.values():
+                sink.close()
+    
+    log_event('info', 'reparse_done', f"Re-parsed {written} companies into {len(sinks)} state files in {output_dir}",
+              companies=written, files=len(sinks))
+    return written
+
+# Parse command line arguments
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Firmenregister.de scraper")
+    parser.add_argument('--all-states', action='store_true',
+                        help="crawl every state in parallel worker processes")
+    parser.add_argument('--workers', type=int, default=STATE_WORKERS,
+                        help=f"worker processes for --all-states or --queue-worker (default: {STATE_WORKERS})")
+    parser.add_argument('--seed-queue', action='store_true',
+                        help="put the first list page of every state on the work queue")
+    parser.add_argument('--queue-worker', action='store_true',
+                        help="process tasks from the work queue until it is drained")
+    parser.add_argument('--queue-file', default=WORK_QUEUE_DB,
+                        help=f"SQLite work queue shared by the workers (default: {WORK_QUEUE_DB})")
+    parser.add_argument('--worker-id',
+                        help="run a single queue worker with this ID (default: run --workers local workers)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="find new companies and re-check stale ones within the daily request budget")
+    parser.add_argument('--budget', type=int, default=RECRAWL_DAILY_BUDGET,
+                        help=f"requests per day for --incremental (default: {RECRAWL_DAILY_BUDGET})")
+    parser.add_argument('--drain-failed', action='store_true',
+                        help=f"retry the companies earlier runs could not fetch (listed in {DEAD_LETTER_DB})")
+    parser.add_argument('--reparse', nargs='?', const=ARCHIVE_DIR, metavar='ARCHIVE_DIR',
+                        help=f"rebuild the state files from archived HTML, offline (default: {ARCHIVE_DIR})")
+    parser.add_argument('--output-dir', default=REPARSE_OUTPUT_DIR,
+                        help=f"where --reparse writes its files (default: {REPARSE_OUTPUT_DIR})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always download pages instead of using the response cache")
+    parser.add_argument('--proxy-file', default=PROXY_FILE,
+                        help="spread requests over the proxies listed in this file (a URL or host:port per "
+                             "line, or a working_proxies.json saved by the Node scraper)")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--metrics-file', default=METRICS_SNAPSHOT_FILE,
+                        help=f"write a JSON metrics snapshot every {METRICS_SNAPSHOT_SECONDS}s "
+                             f"(default: {METRICS_SNAPSHOT_FILE}, '' to disable)")
+    parser.add_argument('--log-level', default=LOG_LEVEL, choices=['debug', 'info', 'warning', 'error'],
+                        help=f"lowest level written to the event log (default: {LOG_LEVEL})")
+    parser.add_argument('--log-file', default=EVENT_LOG_FILE,
+                        help=f"JSON lines event log (default: {EVENT_LOG_FILE}, '' for the terminal only)")
+    parser.add_argument('--profile', nargs='?', const='sample', choices=['sample', 'cprofile'],
+                        help=f"profile the run into {PROFILE_DIR}/: stack sampling, or 'cprofile' for "
+                             f"deterministic profiling of the crawl loop on top")
+    parser.add_argument('--profile-dir', default=PROFILE_DIR,
+                        help=f"where --profile writes its files (default: {PROFILE_DIR})")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to run the scraper."""
+    global USE_RESPONSE_CACHE, PROXY_FILE, METRICS_SNAPSHOT_FILE, EVENT_LOG_FILE, LOG_LEVEL, PROFILE_MODE, PROFILE_DIR
+    args = parse_args(argv)
     start_time = time.time()
+    if args.no_cache:
+        USE_RESPONSE_CACHE = False
+    PROXY_FILE = args.proxy_file or None
+    EVENT_LOG_FILE = args.log_file or None
+    LOG_LEVEL = args.log_level
+    setup_event_log(EVENT_LOG_FILE, LOG_LEVEL, CONSOLE_LOG_LEVEL, LOG_SAMPLE_LIMITS)
+    METRICS_SNAPSHOT_FILE = args.metrics_file or None
+    start_metrics_export(args.metrics_port, METRICS_SNAPSHOT_FILE)
+    PROFILE_MODE, PROFILE_DIR = args.profile, args.profile_dir
+    if PROFILE_MODE:
+        start_profiling(PROFILE_MODE, PROFILE_DIR)
     
-    print(f"Starting Firmenregister.de scraper")
-    print(f"Output mode: {'One file per state' if ONE_FILE_PER_STATE else 'One combined file'}")
+    log_event('info', 'run_started', f"Starting Firmenregister.de scraper, output mode: "
+              f"{'one file per state' if ONE_FILE_PER_STATE else 'one combined file'}")
     
     # Create blocked pages directory if it doesn't exist
     if not os.path.exists(BLOCKED_PAGES_DIR):
         os.makedirs(BLOCKED_PAGES_DIR)
-        print(f"Created directory for blocked pages: {BLOCKED_PAGES_DIR}")
+        log_event('info', 'blocked_pages_dir', f"Created directory for blocked pages: {BLOCKED_PAGES_DIR}")
+    
+    if args.reparse:
+        reparse_archive(args.reparse, args.output_dir)
+        total_time = time.time() - start_time
+        log_event('info', 'run_done', f"Total execution time: {total_time:.1f}s", elapsed=round(total_time, 1))
+        return
+    
+    if args.incremental:
+        run_incremental(args.budget)
+        total_time = time.time() - start_time
+        log_event('info', 'run_done', f"Total execution time: {total_time:.1f}s", elapsed=round(total_time, 1))
+        return
+    
+    if args.drain_failed:
+        drain_dead_letters()
+        total_time = time.time() - start_time
+        log_event('info', 'run_done', f"Total execution time: {total_time:.1f}s", elapsed=round(total_time, 1))
+        return
+    
+    if args.seed_queue:
+        queue = SqliteWorkQueue(args.queue_file)
+        added = seed_work_queue(queue)
+        log_event('info', 'queue_seeded', f"Seeded {added} states into {args.queue_file}: {queue.counts()}",
+                  states=added, queue=args.queue_file)
+        queue.close()
+    
+    if args.all_states or args.queue_worker:
+        if args.all_states:
+            run_all_states(args.workers)
+        elif args.worker_id:
+            run_queue_worker(args.queue_file, args.worker_id)
+        else:
+            run_queue_workers(args.queue_file, args.workers)
+        total_time = time.time() - start_time
+        hours, remainder = divmod(total_time, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        log_event('info', 'run_done', f"Total execution time: {int(hours)}h {int(minutes)}m {int(seconds)}s",
+                  elapsed=round(total_time, 1))
+        return
+    if args.seed_queue:
+        return
     
     # Load previous progress
     progress = load_progress()
@@ -1041,59 +2642,50 @@ def main():
     
     # Validate index
     if current_state_index >= len(STATES):
-        print("All states have been processed!")
+        log_event('info', 'all_done', "All states have been processed!")
         return
     
     try:
         # Process current state
         state = STATES[current_state_index]
         state_display = STATE_DISPLAY_NAMES.get(state, state)
-        print(f"Processing state {current_state_index + 1}/{len(STATES)}: {state_display}")
+        log_event('info', 'state_selected', f"Processing state {current_state_index + 1}/{len(STATES)}: {state_display}",
+                  state=state_display)
         
         # Scrape the state
-        companies = scrape_state(state, current_page)
+        scrape_state(state, current_page)
         
-        # Move to next state
+        # Move to next state (reloading the cursor scrape_state left behind)
+        progress = load_progress()
         progress['current_state_index'] = current_state_index + 1
         progress['current_page'] = 0  # Reset page for next state
+        progress['current_position'] = 0
         save_progress(progress)
         
         # If using a combined file for all states, append data
-        if not ONE_FILE_PER_STATE and companies:
-            combined_filename = "all_companies.csv"
-            
-            if os.path.exists(combined_filename):
-                # Append to existing file
-                existing_df = pd.read_csv(combined_filename)
-                new_df = pd.DataFrame(companies)
-                combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                combined_df.to_csv(combined_filename, index=False)
-            else:
-                # Create new file
-                pd.DataFrame(companies).to_csv(combined_filename, index=False)
-            
-            print(f"Updated combined data file: {combined_filename}")
+        if not ONE_FILE_PER_STATE:
+            update_combined_file(state)
         
         # Calculate total execution time
         total_time = time.time() - start_time
         hours, remainder = divmod(total_time, 3600)
         minutes, seconds = divmod(remainder, 60)
-        print(f"\nTotal execution time: {int(hours)}h {int(minutes)}m {int(seconds)}s")
+        log_event('info', 'run_done', f"Total execution time: {int(hours)}h {int(minutes)}m {int(seconds)}s",
+                  elapsed=round(total_time, 1))
         
         if current_state_index + 1 < len(STATES):
             next_state = STATES[current_state_index + 1]
             next_state_display = STATE_DISPLAY_NAMES.get(next_state, next_state)
-            print(f"Next run will process state: {next_state_display}")
+            log_event('info', 'next_state', f"Next run will process state: {next_state_display}",
+                      state=next_state_display)
         else:
-            print("All states have been processed!")
+            log_event('info', 'all_done', "All states have been processed!")
     
     except KeyboardInterrupt:
-        print("\nScraper interrupted by user")
+        log_event('warning', 'interrupted', "Scraper interrupted by user")
         save_and_exit(progress, load_processed_companies(), 0, "Scraper manually interrupted")
     except Exception as e:
-        print(f"\nUnexpected error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log_event('error', 'crash', f"Unexpected error: {str(e)}", exc_info=True)
         save_and_exit(progress, load_processed_companies(), 1, f"Scraper crashed with error: {str(e)}")
 
 if __name__ == "__main__":
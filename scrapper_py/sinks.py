@@ -0,0 +1,517 @@
+import csv
+import glob
+import io
+import json
+import os
+import re
+from datetime import datetime
+
+from event_log import log_event
+
+# pyarrow, imported by the first Parquet sink - it is large and only that format needs it
+pa = pq = None
+
+#############################################
+# STREAMING OUTPUT SINKS
+#############################################
+
+# Base class for append-only record sinks
+class OutputSink:
+    """Append-only output file that writes every record exactly once.
+
+    Records are buffered and written in batches. commit() makes everything
+    written so far durable (fsync) and records the byte offset in a
+    '.committed' file next to the output, so every run appending to the
+    file sees the same offset whichever progress file it keeps. Opening the
+    sink truncates anything written after the last commit, e.g. by a run
+    that crashed.
+    """
+
+    extension = None
+
+    def __init__(self, path, fieldnames, batch_size=10):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.records_written = 0
+        self._buffer = []
+        self._file = None
+
+    @classmethod
+    def offset_path(cls, path):
+        """File the committed offset of the output at path is recorded in."""
+        return f"{path}.committed"
+
+    @classmethod
+    def read_committed_offset(cls, path):
+        """Offset recorded by the last commit() to path, or None if there is none."""
+        try:
+            with open(cls.offset_path(path), 'r', encoding='utf-8') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def _record_offset(self, offset):
+        """Atomically replace the recorded committed offset."""
+        offset_path = self.offset_path(self.path)
+        temp_path = f"{offset_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, offset_path)
+        _fsync_path(os.path.dirname(offset_path) or '.')
+        return offset
+
+    def open(self, committed_offset=None):
+        """Open the file for appending, rolling back to the last committed offset.
+
+        committed_offset overrides the recorded one, for callers that keep
+        the offset together with other state it has to agree with.
+        """
+        if committed_offset is None:
+            committed_offset = self.read_committed_offset(self.path)
+        self._file = open(self.path, 'ab')
+        size = os.fstat(self._file.fileno()).st_size
+        if committed_offset is not None and size > committed_offset:
+            log_event('warning', 'output_truncated',
+                      f"Truncating {self.path} from {size} to last committed offset {committed_offset}",
+                      path=self.path, size=size, committed_offset=committed_offset)
+            self._file.truncate(committed_offset)
+            self._file.seek(committed_offset)
+            size = committed_offset
+        if size == 0:
+            self._write_header()
+        return self
+
+    def _write_header(self):
+        pass
+
+    def _encode(self, records):
+        raise NotImplementedError
+
+    def write(self, record):
+        """Queue a record, writing the batch out once it is full."""
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records to the file (without forcing them to disk)."""
+        if not self._buffer:
+            return
+        self._file.write(self._encode(self._buffer))
+        self.records_written += len(self._buffer)
+        self._buffer = []
+
+    def offset(self):
+        """Current size of the file in bytes, including flushed records."""
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def commit(self):
+        """Flush, fsync and record the durable offset, which is returned."""
+        self.flush()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._record_offset(os.fstat(self._file.fileno()).st_size)
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @classmethod
+    def remove(cls, path):
+        """Delete the output written to path and its committed offset, if any."""
+        for file_path in (path, cls.offset_path(path)):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+# CSV sink - same layout as the DataFrame.to_csv output it replaces
+class CsvSink(OutputSink):
+    extension = 'csv'
+
+    def _encode_rows(self, rows):
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerows(rows)
+        return text.getvalue().encode('utf-8')
+
+    def _write_header(self):
+        self._file.write(self._encode_rows([self.fieldnames]))
+
+    def _encode(self, records):
+        return self._encode_rows(
+            [[record.get(field, '') for field in self.fieldnames] for record in records]
+        )
+
+    @staticmethod
+    def read_records(path):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+
+
+# JSON Lines sink - one JSON object per record
+class JsonLinesSink(OutputSink):
+    extension = 'jsonl'
+
+    def _encode(self, records):
+        lines = (json.dumps({field: record.get(field, '') for field in self.fieldnames},
+                            ensure_ascii=False)
+                 for record in records)
+        return ''.join(line + '\n' for line in lines).encode('utf-8')
+
+    @staticmethod
+    def read_records(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# Text layout of timestamps in the records, as written by the scraper
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_PART_PATTERN = re.compile(r'^(.+)-(\d{10})\.parquet$')
+_SPOOL_PATTERN = re.compile(r'^_(.+)\.pending\.jsonl$')
+
+
+def _import_pyarrow():
+    global pa, pq
+    if pq is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("The parquet output format needs pyarrow (pip install pyarrow)")
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def _partition_of(directory):
+    """(column, value) for a Hive-style 'column=value' directory, else None."""
+    name = os.path.basename(os.path.normpath(directory))
+    if '=' not in name:
+        return None
+    return tuple(name.split('=', 1))
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _arrow_type(type_name, dictionary=False):
+    if type_name == 'int64':
+        return pa.int64()
+    if type_name == 'timestamp':
+        return pa.timestamp('s')
+    if type_name != 'string':
+        raise ValueError(f"Unknown column type: {type_name}")
+    return pa.dictionary(pa.int32(), pa.string()) if dictionary else pa.string()
+
+
+def _to_arrow_value(value, type_name):
+    if type_name == 'string':
+        return '' if value is None else str(value)
+    if value in ('', None):
+        return None
+    if type_name == 'int64':
+        return int(value)
+    return value if isinstance(value, datetime) else datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _from_arrow_value(value):
+    """Back to the text form the other sinks write, so records compare equal across formats."""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return str(value)
+
+
+# Parquet sink - part files with one row group each, in a state partition directory
+class ParquetSink(OutputSink):
+    """Columnar output in a Hive-style partitioned Parquet dataset.
+
+    path is <dataset>/<column>=<value>/<writer>. The writer's records go to
+    <writer>-<first row>.parquet files next to it, and the partition column
+    is taken from the directory name instead of being stored, so
+    pyarrow.dataset, DuckDB or Spark read the whole dataset directly.
+
+    Parquet files cannot be appended to, so records are spooled to a hidden
+    JSON Lines file (readers skip names starting with '_') and commit() is
+    just an fsync of the spool. Once row_group_size committed records have
+    gathered they are written out as one part, typed by field_types
+    ('string', 'int64' or 'timestamp'), with dictionary_fields
+    dictionary-encoded. Offsets count records, not bytes, and are recorded
+    in a hidden _<writer>.committed file.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, path, fieldnames, batch_size=10, field_types=None, dictionary_fields=(),
+                 row_group_size=10000, compression='zstd'):
+        _import_pyarrow()
+        super().__init__(path, fieldnames, batch_size)
+        self.directory = os.path.dirname(path) or '.'
+        self.writer_name = os.path.basename(path)
+        self.partition = _partition_of(self.directory)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        field_types = field_types or {}
+        self.columns = [(field, field_types.get(field, 'string')) for field in self.fieldnames
+                        if self.partition is None or field != self.partition[0]]
+        self.dictionary_fields = [field for field, _ in self.columns if field in dictionary_fields]
+        self.schema = pa.schema([(field, _arrow_type(type_name, field in self.dictionary_fields))
+                                 for field, type_name in self.columns])
+        self._part_rows = 0
+        self._pending = []  # Spooled records that are not in a part file yet
+
+    def _part_path(self, first_row):
+        return os.path.join(self.directory, f"{self.writer_name}-{first_row:010d}.parquet")
+
+    def _spool_path(self):
+        return os.path.join(self.directory, f"_{self.writer_name}.pending.jsonl")
+
+    @classmethod
+    def offset_path(cls, path):
+        directory, writer_name = os.path.dirname(path) or '.', os.path.basename(path)
+        return os.path.join(directory, f"_{writer_name}.committed")
+
+    def open(self, committed_offset=None):
+        """Open the spool, rolling parts and spool back to the last committed record count."""
+        os.makedirs(self.directory, exist_ok=True)
+        if committed_offset is None:
+            committed_offset = self.read_committed_offset(self.path)
+        for temp_path in glob.glob(os.path.join(glob.escape(self.directory), f".{glob.escape(self.writer_name)}-*.tmp")):
+            os.remove(temp_path)
+
+        parts = _writer_parts(self.directory, self.writer_name)
+        self._part_rows = sum(rows for _, _, rows in parts)
+        first_row, pending = _read_spool(self._spool_path())
+        if first_row < self._part_rows:
+            # Written out as a part, but the crash came before the spool was cleared
+            pending = []
+
+        total = self._part_rows + len(pending)
+        if committed_offset is not None and total > committed_offset:
+            log_event('warning', 'output_rolled_back',
+                      f"Rolling {self.path} back from {total} records to last committed offset {committed_offset}",
+                      path=self.path, total=total, committed_offset=committed_offset)
+            for part_first_row, part_path, rows in parts:
+                # Parts only run past the offset if close() wrote out records that were never committed
+                if part_first_row >= committed_offset:
+                    os.remove(part_path)
+                elif part_first_row + rows > committed_offset:
+                    table = pq.read_table(part_path, schema=self.schema)
+                    self._write_table(table.slice(0, committed_offset - part_first_row), part_first_row)
+            self._part_rows = min(self._part_rows, committed_offset)
+            pending = pending[:max(0, committed_offset - self._part_rows)]
+
+        self._pending = pending
+        self._rewrite_spool()
+        return self
+
+    def _rewrite_spool(self):
+        """Replace the spool with a header and the pending records, then reopen it for appending."""
+        if self._file is not None:
+            self._file.close()
+        spool_path = self._spool_path()
+        temp_path = f"{spool_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write((json.dumps({'first_row': self._part_rows}) + '\n').encode('utf-8'))
+            f.write(self._encode(self._pending))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, spool_path)
+        _fsync_path(self.directory)
+        self._file = open(spool_path, 'ab')
+
+    def _encode(self, records):
+        lines = (json.dumps({field: record.get(field, '') for field in self.fieldnames},
+                            ensure_ascii=False)
+                 for record in records)
+        return ''.join(line + '\n' for line in lines).encode('utf-8')
+
+    def _to_table(self, records):
+        arrays = [
+            pa.array([_to_arrow_value(record.get(field), type_name) for record in records],
+                     type=self.schema.field(field).type)
+            for field, type_name in self.columns
+        ]
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    def _write_table(self, table, first_row):
+        """Write a part file atomically; the dot prefix hides it from readers until it is complete."""
+        part_path = self._part_path(first_row)
+        temp_path = os.path.join(self.directory, f".{os.path.basename(part_path)}.tmp")
+        pq.write_table(table, temp_path, row_group_size=self.row_group_size, compression=self.compression,
+                       use_dictionary=self.dictionary_fields)
+        _fsync_path(temp_path)
+        os.replace(temp_path, part_path)
+        _fsync_path(self.directory)
+
+    def _write_part(self):
+        """Move the pending records from the spool into a new part file."""
+        self._write_table(self._to_table(self._pending), self._part_rows)
+        self._part_rows += len(self._pending)
+        self._pending = []
+        self._rewrite_spool()
+
+    def flush(self):
+        """Append buffered records to the spool (without forcing them to disk)."""
+        if not self._buffer:
+            return
+        self._file.write(self._encode(self._buffer))
+        self._pending.extend(self._buffer)
+        self.records_written += len(self._buffer)
+        self._buffer = []
+
+    def offset(self):
+        """Number of records in the part files and the spool."""
+        return self._part_rows + len(self._pending)
+
+    def commit(self):
+        """Fsync the spool and write a part once a row group is full. Records and returns the record count."""
+        self.flush()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if len(self._pending) >= self.row_group_size:
+            self._write_part()
+        return self._record_offset(self.offset())
+
+    def close(self):
+        """Write the remaining records out as a last, smaller part so readers see them."""
+        if self._file is None:
+            return
+        self.flush()
+        if self._pending:
+            self._write_part()
+        self._file.close()
+        self._file = None
+        os.remove(self._spool_path())
+
+    @classmethod
+    def remove(cls, path):
+        """Delete the part files, spool and committed offset of the writer at path."""
+        _import_pyarrow()
+        directory, writer_name = os.path.dirname(path) or '.', os.path.basename(path)
+        if not os.path.isdir(directory):
+            return
+        for _, part_path, _ in _writer_parts(directory, writer_name):
+            os.remove(part_path)
+        for file_path in (os.path.join(directory, f"_{writer_name}.pending.jsonl"), cls.offset_path(path)):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    @staticmethod
+    def read_records(path):
+        """Records of one writer (the path a sink was opened with) or of a whole partition directory."""
+        _import_pyarrow()
+        if os.path.isdir(path):
+            directory = path
+            names = (_PART_PATTERN.match(name) or _SPOOL_PATTERN.match(name) for name in os.listdir(path))
+            writer_names = sorted({match.group(1) for match in names if match})
+        else:
+            directory, writer_names = os.path.dirname(path) or '.', [os.path.basename(path)]
+        partition = _partition_of(directory)
+
+        for writer_name in writer_names:
+            parts = _writer_parts(directory, writer_name)
+            for _, part_path, _ in parts:
+                for batch in pq.ParquetFile(part_path).iter_batches():
+                    for row in batch.to_pylist():
+                        record = {field: _from_arrow_value(value) for field, value in row.items()}
+                        if partition is not None:
+                            record[partition[0]] = partition[1]
+                        yield record
+            first_row, pending = _read_spool(os.path.join(directory, f"_{writer_name}.pending.jsonl"))
+            if first_row >= sum(rows for _, _, rows in parts):
+                yield from pending
+
+
+def _writer_parts(directory, writer_name):
+    """(first row, path, rows) of a writer's part files, in order."""
+    parts = []
+    for name in os.listdir(directory):
+        match = _PART_PATTERN.match(name)
+        if match and match.group(1) == writer_name:
+            path = os.path.join(directory, name)
+            parts.append((int(match.group(2)), path, pq.read_metadata(path).num_rows))
+    return sorted(parts)
+
+
+def _read_spool(path):
+    """(first row, records) of a spool file; records are only those fully written."""
+    if not os.path.exists(path):
+        return 0, []
+    with open(path, 'rb') as f:
+        lines = f.read().split(b'\n')
+    try:
+        first_row = json.loads(lines[0])['first_row']
+    except (ValueError, KeyError):
+        return 0, []
+    # The last element is '' after a complete line, or a record cut off by a crash
+    return first_row, [json.loads(line) for line in lines[1:-1] if line.strip()]
+
+
+SINK_TYPES = {
+    'csv': CsvSink,
+    'jsonl': JsonLinesSink,
+    'parquet': ParquetSink,
+}
+
+
+# Create a sink for one of the supported output formats
+def open_sink(output_format, path, fieldnames, committed_offset=None, batch_size=10, **options):
+    """Open an output sink of the given format ('csv', 'jsonl' or 'parquet').
+
+    options are passed on to the sink class, e.g. the column types of a ParquetSink.
+    """
+    try:
+        sink_class = SINK_TYPES[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return sink_class(path, fieldnames, batch_size=batch_size, **options).open(committed_offset)
+
+
+# Stream the records back out of an output file
+def iter_records(output_format, path):
+    """Yield the records of an output file written by a sink of the given format."""
+    try:
+        sink_class = SINK_TYPES[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return sink_class.read_records(path)
+
+
+# Offset an output file was last committed at
+def committed_offset(output_format, path):
+    """Offset recorded by the last commit of a sink of the given format to path, or None."""
+    try:
+        sink_class = SINK_TYPES[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}")
+    return sink_class.read_committed_offset(path)
+
+
+# Delete an output file before writing it from scratch
+def remove_output(output_format, path):
+    """Remove what a sink of the given format wrote to path."""
+    try:
+        sink_class = SINK_TYPES[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}")
+    sink_class.remove(path)
@@ -0,0 +1,221 @@
+import json
+import sqlite3
+import threading
+import time
+
+from event_log import log_event
+
+#############################################
+# LEASED WORK QUEUE
+#############################################
+
+# Task kinds, in the order workers should prefer them. Company details are
+# drained before more list pages are expanded, which keeps the frontier small.
+TASK_PRIORITIES = {
+    'company': 1,
+    'list_page': 0,
+}
+
+
+# A unit of work handed out by the queue
+class Task:
+    __slots__ = ('task_id', 'kind', 'key', 'state', 'payload', 'attempts')
+
+    def __init__(self, task_id, kind, key, state, payload, attempts):
+        self.task_id = task_id
+        self.kind = kind
+        self.key = key
+        self.state = state
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Task({self.task_id}, {self.kind}, {self.key}, attempt {self.attempts})"
+
+
+# Interface every queue backend implements
+class WorkQueue:
+    """Queue of crawl tasks handed out under time-limited leases.
+
+    A leased task belongs to one worker until the lease expires. Workers
+    extend their leases with heartbeats while they are alive; when a worker
+    dies its leases run out and the tasks are handed to someone else. Tasks
+    are unique per (kind, key), so enqueuing the same company twice is a no-op.
+    """
+
+    def enqueue(self, kind, key, state, payload=None):
+        """Add a task unless one with the same kind and key exists. Returns True if added."""
+        raise NotImplementedError
+
+    def lease(self, owner, lease_seconds, max_attempts=3):
+        """Lease the next available task (pending or with an expired lease), or None.
+
+        A task whose lease expired after max_attempts attempts is marked
+        failed instead: it most likely takes its worker down with it, so it
+        never gets to fail().
+        """
+        raise NotImplementedError
+
+    def heartbeat(self, owner, lease_seconds):
+        """Extend every lease held by owner. Returns the number of leases extended."""
+        raise NotImplementedError
+
+    def complete(self, task_ids, owner):
+        """Mark tasks done, if owner still holds them. Returns the number completed."""
+        raise NotImplementedError
+
+    def fail(self, task_id, owner, max_attempts=3):
+        """Release a task for another try, or give up after max_attempts."""
+        raise NotImplementedError
+
+    def counts(self):
+        """Number of tasks per status."""
+        raise NotImplementedError
+
+    def is_drained(self):
+        """True when nothing is pending or leased any more."""
+        counts = self.counts()
+        return not counts.get('pending') and not counts.get('leased')
+
+
+# Queue stored in an SQLite file shared by all local worker processes
+class SqliteWorkQueue(WorkQueue):
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Transactions are managed explicitly so leasing can take the write lock up front
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tasks ('
+            ' task_id INTEGER PRIMARY KEY,'
+            ' kind TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' state TEXT NOT NULL,'
+            ' payload TEXT,'
+            ' priority INTEGER NOT NULL DEFAULT 0,'
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            ' owner TEXT,'
+            ' lease_expires REAL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' updated_at REAL,'
+            ' UNIQUE (kind, key)'
+            ')'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS tasks_available ON tasks (status, priority, task_id)'
+        )
+
+    def enqueue(self, kind, key, state, payload=None):
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO tasks (kind, key, state, payload, priority, updated_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (kind, str(key), state, json.dumps(payload or {}),
+                 TASK_PRIORITIES.get(kind, 0), time.time())
+            )
+            return cursor.rowcount > 0
+
+    def lease(self, owner, lease_seconds, max_attempts=3):
+        now = time.time()
+        task = None
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                abandoned = self._conn.execute(
+                    "UPDATE tasks SET status = 'failed', owner = NULL, lease_expires = NULL, updated_at = ?"
+                    " WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, now, max_attempts)
+                ).rowcount
+                row = self._conn.execute(
+                    'SELECT task_id, kind, key, state, payload, attempts FROM tasks'
+                    " WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)"
+                    ' ORDER BY priority DESC, task_id LIMIT 1',
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    task_id, kind, key, state, payload, attempts = row
+                    self._conn.execute(
+                        "UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?,"
+                        ' attempts = attempts + 1, updated_at = ? WHERE task_id = ?',
+                        (owner, now + lease_seconds, now, task_id)
+                    )
+                    task = Task(task_id, kind, key, state, json.loads(payload or '{}'), attempts + 1)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        if abandoned:
+            log_event('warning', 'tasks_abandoned', f"Marked {abandoned} tasks failed whose lease ran out "
+                      f"on attempt {max_attempts}", tasks=abandoned, max_attempts=max_attempts)
+        return task
+
+    def heartbeat(self, owner, lease_seconds):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE status = 'leased' AND owner = ?",
+                (now + lease_seconds, now, owner)
+            )
+            return cursor.rowcount
+
+    def complete(self, task_ids, owner):
+        if not task_ids:
+            return 0
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                completed = 0
+                for task_id in task_ids:
+                    cursor = self._conn.execute(
+                        "UPDATE tasks SET status = 'done', owner = NULL, lease_expires = NULL,"
+                        " updated_at = ? WHERE task_id = ? AND status = 'leased' AND owner = ?",
+                        (now, task_id, owner)
+                    )
+                    completed += cursor.rowcount
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return completed
+
+    def fail(self, task_id, owner, max_attempts=3):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,"
+                " owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE task_id = ? AND status = 'leased' AND owner = ?",
+                (max_attempts, time.time(), task_id, owner)
+            )
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall()
+        return dict(rows)
+
+    def close(self):
+        self._conn.close()
+
+
+# Background thread that keeps a worker's leases alive
+class LeaseHeartbeat(threading.Thread):
+    """Extend all leases held by owner every interval until stopped."""
+
+    def __init__(self, queue, owner, lease_seconds, interval=None):
+        super().__init__(name='lease-heartbeat', daemon=True)
+        self.queue = queue
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.interval = interval or lease_seconds / 3
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.queue.heartbeat(self.owner, self.lease_seconds)
+            except sqlite3.Error as e:
+                log_event('error', 'heartbeat_failed', f"Lease heartbeat failed: {str(e)}", owner=self.owner)
+
+    def stop(self):
+        self._stopped.set()